@@ -71,8 +71,10 @@ def user_delete():
     if not user: return Msg.delete_error()
     logout_user()
     
-    user.delete_instance()
-    return Msg.delete_success(f'{str(user)} 성공적으로 탈퇴하였습니다.')
+    # 작성한 post, comment, file, message 까지 일괄 삭제
+    message = f'{str(user)} 성공적으로 탈퇴하였습니다.'
+    get_model('user').delete_all_by_ids([user.id])
+    return Msg.delete_success(message)
 
 # ------------------------------------------------ mypage, 이메일 인증 ------------------------------------------------
 @auth.route('/mypage', methods=['GET', 'POST'])
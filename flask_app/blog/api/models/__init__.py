@@ -1,12 +1,22 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 db = SQLAlchemy()
-migrate = Migrate()
+
+def include_name(name, type_, parent_names):
+    # search_index(FTS5 가상 테이블) + shadow 테이블 5개(_data, _idx, _content, _docsize, _config)
+    # = 모델이 아닌 metadata after_create 에서 생성 => autogenerate 가 DROP TABLE 을 만들지 않도록 비교에서 제외
+    return not (type_ == 'table' and name.startswith('search_index'))
+
+migrate = Migrate(include_name=include_name)
 
 def db_migrate_setup(app):
+    # SQLite 파일 = WAL, busy_timeout 등 pragma + pool 설정 (SQLITE_PROFILE_ENABLED)
+    from blog.api.utils.sqlite import SqliteProfile
+    SqliteProfile.set_engine_options(app.config)
     db.init_app(app)
     migrate.init_app(app, db)
     with app.app_context():
+        if SqliteProfile.enabled(app.config): SqliteProfile.apply(db.engine, app.config)
         # db.Model 상속한 모든 클래스 추적해서 테이블 생성
         db.create_all()
 
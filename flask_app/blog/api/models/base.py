@@ -1,8 +1,15 @@
-from sqlalchemy import String, or_, func
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy import String, or_, func, tuple_, inspect, update, select, bindparam
+from sqlalchemy.orm import selectinload, joinedload, defer, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 from json import dumps
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime
+from collections import OrderedDict
+from threading import Lock
+import time
 
 from blog.api.utils.etc import Msg, Etc
+from blog.api.utils.cache import PageCache
 
 # relationship(관계 맺는 모델 이름, back_populates=연결 필드 이름)
 # Cascade = 1:N 관계에서 1쪽에 설정
@@ -24,10 +31,145 @@ from blog.api.utils.etc import Msg, Etc
 from blog.api.models import get_db
 db = get_db()
 
+PER_PAGE = 10
+RECOUNT_CHUNK_SIZE = 1000
+
+class Page():
+    '''
+    keyset pagination 결과
+    items = 현재 페이지의 인스턴스 리스트
+    next_cursor, prev_cursor = 다음/이전 페이지 커서(없으면 None)
+    '''
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+class ObjectCache():
+    '''
+    primary key, filter 조회용 read-through 객체 캐시 (worker 프로세스 단위, LRU + TTL)
+    detached 스냅샷을 저장하고 조회 시 session.merge(load=False)로 현재 세션에 붙여서 반환 = 쿼리 X
+    변경(before_flush, update_instance, delete_instance) 시 인스턴스 태그로 무효화 + 모델 버전 스탬프 증가
+    DB 조회 도중 버전 스탬프가 바뀌었으면 조회한 값이 이미 오래된 값일 수 있으므로 저장 X
+    다른 worker의 변경은 TTL(OBJECT_CACHE_TIMEOUT) 안에서만 늦게 반영될 수 있음
+    => 페이지 캐시 렌더링 중에는 사용 X (다른 worker 에서 바뀐 값이 CacheTag 버전은 최신인 채로 페이지 캐시에 저장되는 것 방지)
+    '''
+    entries = OrderedDict()
+    tag_keys = {}                                                                   # 인스턴스 태그 -> 캐시 key 목록
+    versions = {}                                                                   # 테이블 이름 -> 버전 스탬프
+    lock = Lock()
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def enabled(model):
+        return model.object_cache and Etc.get_config().get('OBJECT_CACHE_ENABLED', False)
+
+    @classmethod
+    def get_or_load(cls, model, key, load, tag_version=None):
+        '''
+        tag_version = 인스턴스 태그의 CacheTag 버전 (모든 worker 공유)
+        => 지정하면 스냅샷에 저장된 버전과 다를 때(다른 worker 에서 변경, 삭제) TTL 과 상관없이 다시 조회
+        '''
+        instance = cls.get(model, key, tag_version)
+        if instance is not None: return instance
+        version = cls.get_version(model)
+        instance = load()
+        cls.set(model, key, instance, version, tag_version)
+        return instance
+
+    @classmethod
+    def get_version(cls, model):
+        return cls.versions.get(model.__tablename__, 0)
+
+    @classmethod
+    def get(cls, model, key, tag_version=None):
+        if not cls.enabled(model) or PageCache.rendering(): return None
+        now = time.time()
+        with cls.lock:
+            entry = cls.entries.get(key)
+            if entry and (entry['expire_time'] < now or tag_version is not None and entry['tag_version'] != tag_version):
+                cls.pop(key)
+                entry = None
+            if not entry:
+                cls.misses += 1
+                return None
+            cls.entries.move_to_end(key)
+            cls.hits += 1
+        PageCache.add_tags(entry['tag'])
+        # 이미 세션에 있는 객체는 변경 중일 수 있으므로 덮어쓰지 않고 그대로 사용
+        existing = db.session.identity_map.get(inspect(entry['snapshot']).key)
+        if existing is not None: return existing
+        return db.session.merge(entry['snapshot'], load=False)
+
+    @classmethod
+    def set(cls, model, key, instance, version, tag_version=None):
+        if not instance or not cls.enabled(model): return
+        # 현재 세션에서 변경 중인 객체는 캐시 X
+        if db.session.is_modified(instance) or inspect(instance).pending: return
+        entry = {
+            'snapshot': instance.make_snapshot(),
+            'tag': instance.get_cache_tag(),
+            'tag_version': tag_version,
+            'expire_time': time.time() + Etc.get_config().get('OBJECT_CACHE_TIMEOUT', 30),
+        }
+        with cls.lock:
+            if version != cls.get_version(model): return
+            cls.pop(key)
+            cls.entries[key] = entry
+            cls.tag_keys.setdefault(entry['tag'], set()).add(key)
+            while len(cls.entries) > Etc.get_config().get('OBJECT_CACHE_MAX_ENTRIES', 1000):
+                cls.pop(next(iter(cls.entries)))
+
+    @classmethod
+    def pop(cls, key):
+        # lock 안에서 호출
+        entry = cls.entries.pop(key, None)
+        if not entry: return
+        keys = cls.tag_keys.get(entry['tag'], set())
+        keys.discard(key)
+        if not keys: cls.tag_keys.pop(entry['tag'], None)
+
+    @classmethod
+    def invalidate(cls, *tags):
+        with cls.lock:
+            for tag in tags:
+                table = tag.split(':')[0]
+                cls.versions[table] = cls.versions.get(table, 0) + 1
+                for key in list(cls.tag_keys.get(tag, ())):
+                    cls.pop(key)
+
+    @classmethod
+    def clear(cls, model):
+        with cls.lock:
+            cls.versions[model.__tablename__] = cls.versions.get(model.__tablename__, 0) + 1
+            for key in [key for key in cls.entries if key[0] == model.__name__]:
+                cls.pop(key)
+
+    @classmethod
+    def stats(cls):
+        with cls.lock:
+            return {'hits': cls.hits, 'misses': cls.misses, 'size': len(cls.entries)}
+
 class BaseModel(db.Model):
     __abstract__ = True                                                             # 추상 클래스 설정
     id = db.Column(db.Integer, primary_key=True)                                    # primary key 설정
-    date_created = db.Column(db.DateTime, default=Etc.get_korea_time())
+    date_created = db.Column(db.DateTime, default=Etc.get_korea_time)
+    object_cache = False                                                            # ObjectCache 사용 여부
+    listing_deferred_columns = ()                                                   # 목록 조회(get_page_with) 시 로드하지 않을 컬럼
+    search_columns = ()                                                             # 검색 인덱스(SearchIndex)에 들어가는 컬럼
         
     @classmethod
     def get_query(cls, id, **kwargs):
@@ -52,29 +194,39 @@ class BaseModel(db.Model):
     @classmethod
     def get_instance_by_id_with(cls, id, *relationships):
         options = cls.get_options(joinedload, *relationships)
-        instance = cls.get_query(id, options=options)
+        # relationship 지정 = 같은 세션에 이미 있는 객체도 다시 조회 (populate_existing)
+        # => 만료된 컬럼만 새로 읽고 relationship 은 하나씩 lazy load 되는 것 방지 (JOIN 1번)
+        load = lambda: cls.get_query(id, options=options, populate_existing=bool(relationships))
+        # relationship 없는 조회만 ObjectCache 사용
+        instance = load() if relationships else ObjectCache.get_or_load(cls, cls.get_cache_key(id), load)
         cls.instance_check(instance)
         return instance
     
     @classmethod
     def get_instance_with(cls, *relationships, **filter_conditions):
         options = cls.get_options(selectinload, *relationships)
-        instance =  cls.query_with()\
-            .filter_by(**filter_conditions).options(*options).first()
+        load = lambda: cls.query_with().filter_by(**filter_conditions).options(*options).first()
+        cache_key = (cls.__name__, 'filter', tuple(sorted(filter_conditions.items())))
+        instance = load() if relationships else ObjectCache.get_or_load(cls, cache_key, load)
         cls.instance_check(instance)
         return instance
+
+    @classmethod
+    def get_cache_key(cls, id):
+        return (cls.__name__, 'id', id)
     
     @classmethod
     def get_all(cls):
         return cls.query_with().all() 
     
     @classmethod
-    def get_all_by_ids(cls, ids):
+    def get_all_by_ids(cls, ids, *relationships):
         """
         주어진 id 리스트에 해당하는 객체들을 반환
         """
         ids = map(int, ids)
-        return cls.query_with().filter(cls.id.in_(ids)).all()
+        options = cls.get_options(selectinload, *relationships)
+        return cls.query_with().filter(cls.id.in_(ids)).options(*options).all()
     
     @classmethod
     def get_all_with(cls, *relationships, **filter_conditions):
@@ -83,10 +235,57 @@ class BaseModel(db.Model):
             .filter_by(**filter_conditions).options(*options).all() 
 
     @classmethod
-    def count_all(cls, *relationships, **filter_conditions):
-        options = cls.get_options(selectinload, *relationships)
-        return cls.query_with(func.count(cls.id))\
-            .filter_by(**filter_conditions).options(*options).count()
+    def get_page_with(cls, *relationships, cursor=None, direction='next', per_page=PER_PAGE, **filter_conditions):
+        '''
+        (date_created, id) 기준 keyset pagination, 최신순 정렬
+        OFFSET 대신 커서 이후의 행만 인덱스로 찾아가므로 페이지 위치와 무관하게 일정한 비용
+        per_page + 1개를 조회해서 다음(이전) 페이지 존재 여부 확인
+        listing_deferred_columns 는 로드 X (큰 본문 컬럼 등)
+        '''
+        options = cls.get_options(selectinload, *relationships) + cls.get_options(defer, *cls.listing_deferred_columns)
+        query = cls.query_with().filter_by(**filter_conditions).options(*options)
+        key = cls.parse_cursor(cursor)
+        keyset = tuple_(cls.date_created, cls.id)
+
+        if key and direction == 'prev':
+            # 이전 페이지 = 커서보다 최신인 행을 오래된 순으로 가져온 뒤 뒤집기
+            items = query.filter(keyset > tuple_(*key))\
+                .order_by(cls.date_created.asc(), cls.id.asc()).limit(per_page + 1).all()
+            has_prev, has_next = len(items) > per_page, True
+            items = items[:per_page][::-1]
+        else:
+            if key: query = query.filter(keyset < tuple_(*key))
+            items = query.order_by(cls.date_created.desc(), cls.id.desc()).limit(per_page + 1).all()
+            has_prev, has_next = key is not None, len(items) > per_page
+            items = items[:per_page]
+
+        return Page(
+            items=items,
+            next_cursor=cls.make_cursor(items[-1]) if items and has_next else None,
+            prev_cursor=cls.make_cursor(items[0]) if items and has_prev else None,
+        )
+
+    @staticmethod
+    def make_cursor(instance):
+        key = f'{instance.date_created.isoformat()}|{instance.id}'
+        return urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def parse_cursor(cursor):
+        '''
+        잘못된 커서는 첫 페이지로 처리(None 반환)
+        '''
+        if not cursor: return None
+        try:
+            date_created, id = urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+            return datetime.fromisoformat(date_created), int(id)
+        except (ValueError, UnicodeError):
+            return None
+
+    @classmethod
+    def count_all(cls, **filter_conditions):
+        return db.session.query(func.count(cls.id)).select_from(cls)\
+            .filter_by(**filter_conditions).scalar()
 
     @classmethod
     def duplicate_check(cls, **kwargs):
@@ -113,6 +312,38 @@ class BaseModel(db.Model):
             return True
         return False
 
+    @classmethod
+    def increase_counts(cls, session, id, **deltas):
+        '''
+        카운터 컬럼 원자적 증가/감소 = UPDATE ... SET x = x + n
+        python 에서 읽고 더해서 쓰는 방식(read-modify-write)과 달리 동시 요청에도 증가분이 유실되지 않음
+        flush hook 에서 호출 = 같은 트랜잭션 안에서 실행
+        '''
+        if id is None: return
+        session.connection().execute(update(cls.__table__)
+            .where(cls.id == id)
+            .values({key: func.coalesce(getattr(cls, key), 0) + delta for key, delta in deltas.items()})
+        )
+        cls.invalidate_object_cache(session, id)
+
+    @classmethod
+    def increase_counts_by_groups(cls, session, key, deltas):
+        '''
+        deltas = {id: 증감량} => 행마다 다른 증감량을 UPDATE 1개 + executemany 로 반영 (일괄 삭제 등)
+        '''
+        if not deltas: return
+        session.connection().execute(update(cls.__table__)
+            .where(cls.id == bindparam('_id'))
+            .values({key: func.coalesce(getattr(cls, key), 0) + bindparam('_delta')}),
+            [{'_id': id, '_delta': delta} for id, delta in deltas.items()]
+        )
+        for id in deltas: cls.invalidate_object_cache(session, id)
+
+    @classmethod
+    def invalidate_object_cache(cls, session, id):
+        # ORM flush 를 거치지 않는 SQL 변경 = commit(rollback) 시 ObjectCache 무효화 예약
+        session.info.setdefault('object_cache_tags', set()).add(f'{cls.__tablename__}:{id}')
+
     def add_instance(self):
         db.session.add(self)
         self.commit()
@@ -123,16 +354,141 @@ class BaseModel(db.Model):
             if key in self.__table__.columns:
                 setattr(self, key, value)
         self.commit()
+        ObjectCache.invalidate(self.get_cache_tag())
 
     def delete_instance(self):
         db.session.delete(self)
         self.commit()
+        ObjectCache.invalidate(self.get_cache_tag())
 
     def fill_none_fields(self):
         none_fields = [field for field in self.__class__.__table__.columns if getattr(self, field.name) is None]
         for field in none_fields:
             setattr(self, field.name, field.default.arg)
+
+    # ---------------------- 일괄 재계산 (CLI, admin Update Model) ----------------------
+    # 카운터 컬럼 = (집계할 테이블, 이 모델의 id를 가리키는 컬럼)
+    # 예) User.posts_count = post 테이블에서 author_id 별 행 수
+    counter_columns = {}
+
+    @classmethod
+    def fill_none_columns(cls, ids=None):
+        '''
+        default 가 있는 컬럼의 NULL 값 채우기 = 컬럼마다 UPDATE ... WHERE col IS NULL 1번
+        '''
+        connection = db.session.connection()
+        for column in cls.__table__.columns:
+            if column.default is None or not (column.default.is_scalar or column.default.is_callable): continue
+            value = column.default.arg(None) if column.default.is_callable else column.default.arg
+            stmt = update(cls.__table__).where(column.is_(None)).values({column.name: value})
+            if ids is not None: stmt = stmt.where(cls.id.in_(ids))
+            connection.execute(stmt)
+        cls.commit()
+
+    @classmethod
+    def recount(cls, ids=None, chunk_size=RECOUNT_CHUNK_SIZE):
+        '''
+        counter_columns 재계산 = id 순서로 chunk_size 개씩
+        chunk 마다 카운터별 GROUP BY 집계 1번 + 값이 바뀐 행만 executemany UPDATE 1번 + commit
+        (인스턴스 로드 X, chunk 단위 commit 으로 SQLite 쓰기 lock 을 오래 잡지 않음)
+        ids = None 이면 전체, 반환 = 값이 바뀐 행 수
+        '''
+        if not cls.counter_columns: return 0
+        session = db.session
+        changed = 0
+        for rows in cls.get_recount_chunks(ids, chunk_size):
+            chunk_ids = [row.id for row in rows]
+            counts = {key: cls.count_by_ids(table, column, chunk_ids)
+                for key, (table, column) in cls.counter_columns.items()}
+            updates = {}                                                        # id -> 새 카운터 값들 (바뀐 행만)
+            for row in rows:
+                values = {key: counts[key].get(row.id, 0) for key in cls.counter_columns}
+                if any(getattr(row, key) != value for key, value in values.items()):
+                    updates[row.id] = values
+            changed += len(updates)
+            cls.apply_recount(session, updates, chunk_ids)
+            cls.commit()
+        return changed
+
+    @classmethod
+    def get_recount_chunks(cls, ids, chunk_size):
+        # (id, 현재 카운터 값들) 행을 chunk 단위로 = 전체는 id keyset, 지정한 ids 는 chunk_size 개씩 IN 조회
+        stmt = select(cls.id, *[getattr(cls, key) for key in cls.counter_columns]).order_by(cls.id)
+        if ids is not None:
+            ids = sorted(set(ids))
+            for i in range(0, len(ids), chunk_size):
+                yield db.session.execute(stmt.where(cls.id.in_(ids[i:i + chunk_size]))).all()
+            return
+        last_id = 0
+        while True:
+            rows = db.session.execute(stmt.where(cls.id > last_id).limit(chunk_size)).all()
+            if not rows: return
+            yield rows
+            last_id = rows[-1].id
+
+    @staticmethod
+    def count_by_ids(table, column, ids):
+        column = db.metadata.tables[table].c[column]
+        rows = db.session.execute(select(column, func.count()).where(column.in_(ids)).group_by(column))
+        return dict(rows.all())
+
+    @classmethod
+    def apply_recount(cls, session, updates, chunk_ids):
+        '''
+        재계산 결과 반영 + 캐시 무효화 (통계 컬럼이 더 있는 모델은 override)
+        '''
+        if not updates: return
+        # bindparam 이름은 컬럼 이름과 겹치면 안 됨 => '_' 접두사
+        session.connection().execute(update(cls.__table__)
+            .where(cls.id == bindparam('_id'))
+            .values({key: bindparam(f'_{key}') for key in cls.counter_columns}),
+            [{'_id': id, **{f'_{key}': value for key, value in values.items()}} for id, values in updates.items()]
+        )
+        for id in updates: cls.invalidate_object_cache(session, id)
+        tags = [f'{cls.__tablename__}:{id}' for id in updates]
+        if set(cls.counter_columns) - set(cls.cache_ignored_columns):
+            from blog.api.models.cache_tag import CacheTag
+            CacheTag.bump(session.connection(), [cls.__tablename__, *tags])
     
+    # ---------------------- cache 관련 ----------------------
+    # 변경되어도 캐시를 무효화하지 않는 컬럼(화면에 직접 출력되지 않는 카운터 등)
+    cache_ignored_columns = ()
+
+    def get_cache_tag(self):
+        return f'{self.__tablename__}:{self.id}'
+
+    def get_cache_tags(self):
+        '''
+        이 인스턴스가 추가, 수정, 삭제될 때 버전을 올릴 캐시 태그
+        테이블 태그 = 목록 페이지, 인스턴스 태그 = 이 인스턴스를 출력한 페이지
+        '''
+        tags = [self.__tablename__]
+        if self.id is not None: tags.append(self.get_cache_tag())
+        return tags
+
+    def make_snapshot(self):
+        '''
+        ObjectCache 저장용 detached 복사본 (로드된 컬럼 값만 복사, __init__ 호출 X)
+        '''
+        state = inspect(self)
+        snapshot = state.mapper.class_manager.new_instance()
+        for attr in state.mapper.column_attrs:
+            if attr.key in state.dict:
+                set_committed_value(snapshot, attr.key, state.dict[attr.key])
+        make_transient_to_detached(snapshot)
+        return snapshot
+
+    def is_modified_columns(self, *columns):
+        state = inspect(self)
+        return any(state.attrs[column].history.has_changes() for column in columns)
+
+    def is_cache_modified(self):
+        state = inspect(self)
+        return any(state.attrs[attr.key].history.has_changes()
+            for attr in state.mapper.column_attrs
+            if attr.key not in self.cache_ignored_columns
+        )
+
     def to_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
     
@@ -162,6 +518,59 @@ def before_flush(session, flush_context, instances):
         if hasattr(obj, 'before_new_flush'):
             obj.before_new_flush()
 
+    # 변경된 객체들의 캐시 태그 버전 올리기 = 해당 객체를 출력한 캐시 페이지 무효화
+    # hook에서 변경된 객체(카운터 등)까지 포함하도록 hook 실행 후에 수집
+    tags = set()
+    object_tags = session.info.setdefault('object_cache_tags', set())
+    for obj in [*session.new, *session.deleted, *session.dirty]:
+        if not isinstance(obj, BaseModel): continue
+        if obj.id is not None: object_tags.add(obj.get_cache_tag())
+        if obj in session.dirty and not obj.is_cache_modified(): continue
+        tags.update(obj.get_cache_tags())
+    if tags:
+        from blog.api.models.cache_tag import CacheTag
+        CacheTag.bump(session.connection(), tags)
+
+    # 객체 캐시 무효화, commit(rollback) 전에 다른 요청이 다시 캐시할 수 있으므로 종료 시 한번 더 무효화
+    ObjectCache.invalidate(*object_tags)
+
+@listens_for(db.session, 'after_flush')
+def after_flush(session, flush_context):
+    # id가 정해진 뒤 실행해야 하는 hook (다른 테이블 통계 등)
+    for obj in session.deleted:
+        if hasattr(obj, 'after_deleted_flush'):
+            obj.after_deleted_flush(session)
+
+    for obj in session.new:
+        if hasattr(obj, 'after_new_flush'):
+            obj.after_new_flush(session)
+
+    for obj in session.dirty:
+        if hasattr(obj, 'after_dirty_flush'):
+            obj.after_dirty_flush(session)
+
+    # 검색 인덱스 동기화 = 새 객체의 id가 정해진 뒤 같은 트랜잭션에서 실행
+    upserts = [obj.get_search_document() for obj in [*session.new, *session.dirty]
+        if isinstance(obj, BaseModel) and obj.search_columns 
+        and (obj in session.new or obj.is_modified_columns(*obj.search_columns))
+    ]
+    deletes = [(obj.__tablename__, obj.id) for obj in session.deleted 
+        if isinstance(obj, BaseModel) and obj.search_columns
+    ]
+    if upserts or deletes:
+        from blog.api.models.search import SearchIndex
+        SearchIndex.sync(session.connection(), upserts, deletes)
+
+@listens_for(db.session, 'after_commit')
+@listens_for(db.session, 'after_soft_rollback')
+def invalidate_object_cache(session, *args):
+    ObjectCache.invalidate(*session.info.pop('object_cache_tags', ()))
+
+@listens_for(BaseModel, 'load', propagate=True)
+def on_load(instance, context):
+    # 캐시 대상 요청에서 불러온 인스턴스 = 해당 페이지의 캐시 태그
+    PageCache.add_tags(instance.get_cache_tag())
+
 # ------------------------------------------ Admin ------------------------------------------
 from flask_admin import AdminIndexView, expose
 from flask_login import current_user
@@ -171,7 +580,7 @@ from blog.api.utils.error import Error
 
 class CustomAdminIndexView(AdminIndexView):
     def is_accessible(self):
-        if current_user.is_authenticated == True and current_user.admin_check == True:
+        if current_user.is_authenticated == True and current_user.refresh_permission().admin_check == True:
             return True
         else:
             return Error.error(403)
@@ -186,18 +595,29 @@ class AdminBase(ModelView):
     }
     
     def is_accessible(self):
-        if current_user.is_authenticated == True and current_user.admin_check == True:
+        if current_user.is_authenticated == True and current_user.refresh_permission().admin_check == True:
             return True
         else:
             return Error.error(403)
         
+    # 하위 객체가 있는 모델(category, post, user) = 일괄 삭제 경로 사용
+    def delete_model(self, model):
+        if not hasattr(self.model, 'delete_all_by_ids'): return super().delete_model(model)
+        try:
+            self.on_model_delete(model)
+            self.model.delete_all_by_ids([model.id])
+        except Exception as e:
+            db.session.rollback()
+            Msg.error_msg(f'삭제 실패: {str(e)}')
+            return False
+        self.after_model_delete(model)
+        return True
+
     # 사용자 지정 도구 추가
     from flask_admin.actions import action
     @action('update_model_instances', 'Update Model', 'Are you sure you want to update model for selected object?')
     def update_model_instances(self, ids):
-        instances = self.model.get_all_by_ids(ids)
-        for instance in instances:
-            instance.fill_none_fields()
-            if hasattr(instance, 'update_count'):
-                instance.update_count()
-        self.model.commit()
\ No newline at end of file
+        # 인스턴스 로드 X = NULL 채우기 + 카운터 GROUP BY 재계산
+        ids = [int(id) for id in ids]
+        self.model.fill_none_columns(ids)
+        self.model.recount(ids)
\ No newline at end of file
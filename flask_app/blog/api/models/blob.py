@@ -0,0 +1,149 @@
+from sqlalchemy import select, update, delete, bindparam
+from sqlalchemy.dialects.sqlite import insert
+
+from blog.api.models.base import BaseModel
+from blog.api.models import get_db
+
+db = get_db()
+
+class Blob(BaseModel):
+    '''
+    첨부 파일 내용 = SHA-256 digest 로 저장소에 1번만 저장 (저장소 key = digest)
+    file 행은 digest 로 blob 을 참조, ref_count = 참조하는 file 행 수
+    1. 업로드 = 전송 전에 참조부터 (add_refs, 없으면 uploading 상태로 추가) => drain 이 전송 중인 내용을 지우지 않음
+       전송, 확인(head)이 끝나면 uploading 해제 (mark_stored), 실패하면 참조 해제
+    2. 같은 내용을 다시 업로드 = 저장이 끝난 blob 이면 저장소 전송 X, ref_count 만 증가
+    3. file 삭제 = ref_count 감소, 0 이 되면 blob 행 삭제 + 저장소 객체(썸네일 포함) 삭제 예약 (StorageTombstone)
+    이미지 = 썸네일('<digest>_<너비>.jpg') + 흐린 미리보기(data uri) 를 백그라운드에서 생성 (Thumbnail)
+    '''
+    __tablename__ = 'blob'
+    __table_args__ = (
+        db.Index('ix_blob_thumbnail_status', 'thumbnail_status'),
+    )
+    digest = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.Float, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    uploading = db.Column(db.Boolean, default=False)                                # 참조만 추가되고 저장소 전송 전 (다른 요청도 전송)
+
+    thumbnail_status = db.Column(db.String(10), nullable=True)                      # None(이미지 X), pending, done, failed
+    thumbnail_widths = db.Column(db.String(50), nullable=True)                      # 생성된 썸네일 너비 목록 '480,1200'
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    preview = db.Column(db.Text, nullable=True)
+
+    def get_thumbnail_widths(self):
+        return [int(width) for width in self.thumbnail_widths.split(',')] if self.thumbnail_widths else []
+
+    @staticmethod
+    def get_thumbnail_keys(digest, thumbnail_widths):
+        from blog.api.utils.thumbnail import Thumbnail
+        widths = thumbnail_widths.split(',') if thumbnail_widths else []
+        return [Thumbnail.get_key(digest, width) for width in widths]
+
+    @classmethod
+    def get_existing(cls, digests):
+        if not digests: return set()
+        return set(db.session.execute(select(cls.digest).where(cls.digest.in_(set(digests)))).scalars())
+
+    @classmethod
+    def get_stored(cls, digests):
+        '''
+        저장소에 저장이 끝난 blob = {digest: 크기} (uploading 인 blob 제외)
+        '''
+        if not digests: return {}
+        return dict(db.session.execute(select(cls.digest, cls.size)
+            .where(cls.digest.in_(set(digests)), cls.uploading.is_not(True))).all())
+
+    @classmethod
+    def add_refs(cls, session, refs):
+        '''
+        refs = {digest: (참조 증가량, 크기)} => 없으면 uploading 상태로 추가, 있으면 ref_count 증가 (UPSERT executemany 1번)
+        '''
+        if not refs: return
+        stmt = insert(cls.__table__).values(digest=bindparam('_digest'), size=bindparam('_size'), ref_count=bindparam('_count'),
+            uploading=True)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.digest],
+            set_={'ref_count': cls.__table__.c.ref_count + stmt.excluded.ref_count},
+        )
+        session.connection().execute(stmt,
+            [{'_digest': digest, '_count': count, '_size': size} for digest, (count, size) in refs.items()])
+
+    @classmethod
+    def release_refs(cls, session, refs):
+        '''
+        refs = {digest: 참조 감소량} => ref_count 감소 후 0 이 된 blob 삭제
+        저장소 객체는 같은 트랜잭션에서 삭제 예약만 (rollback 되면 예약도 취소)
+        '''
+        refs = {digest: count for digest, count in refs.items() if digest}
+        if not refs: return
+        connection = session.connection()
+        connection.execute(update(cls.__table__)
+            .where(cls.digest == bindparam('_digest'))
+            .values(ref_count=cls.ref_count - bindparam('_count')),
+            [{'_digest': digest, '_count': count} for digest, count in refs.items()]
+        )
+        orphans = connection.execute(select(cls.digest, cls.thumbnail_widths)
+            .where(cls.digest.in_(refs), cls.ref_count <= 0)).all()
+        if not orphans: return
+        connection.execute(delete(cls.__table__).where(cls.digest.in_([digest for digest, _ in orphans])))
+        from blog.api.models.storage_tombstone import StorageTombstone
+        keys = set()
+        for digest, thumbnail_widths in orphans:
+            keys.add(digest)
+            keys.update(cls.get_thumbnail_keys(digest, thumbnail_widths))
+        StorageTombstone.add(session, keys)
+
+    @classmethod
+    def mark_stored(cls, session, sizes):
+        '''
+        sizes = {digest: 저장소 객체 크기} => 전송, 확인이 끝난 blob 의 uploading 해제 + 실제 크기 (executemany 1번)
+        '''
+        if not sizes: return
+        session.connection().execute(update(cls.__table__)
+            .where(cls.digest == bindparam('_digest'))
+            .values(uploading=False, size=bindparam('_size')),
+            [{'_digest': digest, '_size': size} for digest, size in sizes.items()]
+        )
+
+    @classmethod
+    def mark_thumbnails(cls, session, digests):
+        # 썸네일 생성 대기 = 처음 저장된 이미지 blob 만
+        if not digests: return
+        session.connection().execute(update(cls.__table__)
+            .where(cls.digest.in_(digests), cls.thumbnail_status.is_(None))
+            .values(thumbnail_status='pending'))
+
+    @classmethod
+    def get_pending_thumbnails(cls, digests=None, limit=100):
+        stmt = select(cls.digest).where(cls.thumbnail_status == 'pending')
+        if digests is not None: stmt = stmt.where(cls.digest.in_(digests))
+        return db.session.execute(stmt.limit(limit)).scalars().all()
+
+    @classmethod
+    def set_thumbnails(cls, digest, result):
+        '''
+        result = make_thumbnails 결과 / None = 실패 (다시 시도 X)
+        blob 을 출력한 페이지 캐시 무효화 (blob:<id> 태그)
+        '''
+        from blog.api.models.cache_tag import CacheTag
+        values = {'thumbnail_status': 'failed'}
+        if result:
+            values = {
+                'thumbnail_status': 'done',
+                'thumbnail_widths': ','.join(str(width) for width in sorted(result['thumbnails'])),
+                'width': result['width'], 'height': result['height'], 'preview': result['preview'],
+            }
+        connection = db.session.connection()
+        id = connection.execute(select(cls.id).where(cls.digest == digest)).scalar()
+        if id is None: return
+        connection.execute(update(cls.__table__).where(cls.id == id).values(values))
+        CacheTag.bump(connection, [cls.__tablename__, f'{cls.__tablename__}:{id}'])
+        cls.invalidate_object_cache(db.session, id)
+        cls.commit()
+
+    def __repr__(self):
+        return super().__repr__() + f'{self.digest} ({self.ref_count})'
+
+    def __str__(self):
+        return super().__str__() + f'{self.digest} ({self.ref_count})'
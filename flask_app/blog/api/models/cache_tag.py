@@ -0,0 +1,51 @@
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from blog.api.models.base import BaseModel
+from blog.api.models import get_db
+
+db = get_db()
+
+class CacheTag(BaseModel):
+    '''
+    캐시 무효화용 태그 버전 테이블
+    태그 = 'post'(테이블 태그) 또는 'post:1'(인스턴스 태그)
+    변경이 생긴 객체의 태그 버전을 같은 트랜잭션 안에서 올리기 때문에
+    rollback 되면 버전도 같이 rollback 되고, 모든 gunicorn worker가 같은 버전을 봄
+    GLOBAL_TAG = 모든 변경마다 버전이 올라가는 태그 (렌더링 도중 변경이 있었는지 확인용)
+    '''
+    GLOBAL_TAG = '*'
+    BUMP_CHUNK_SIZE = 500                                                           # INSERT 1번에 넣을 태그 수 (SQLite 변수 개수 제한)
+
+    __tablename__ = 'cache_tag'
+    name = db.Column(db.String(150), unique=True, nullable=False)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+    @classmethod
+    def bump(cls, connection, tags):
+        if not tags: return
+        tags = sorted({cls.GLOBAL_TAG, *tags})
+        for i in range(0, len(tags), cls.BUMP_CHUNK_SIZE):
+            stmt = insert(cls.__table__).values([{'name': tag, 'version': 1} for tag in tags[i:i + cls.BUMP_CHUNK_SIZE]])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[cls.name],
+                set_={'version': cls.__table__.c.version + 1},
+            )
+            connection.execute(stmt)
+
+    @classmethod
+    def get_versions(cls, tags):
+        '''
+        존재하지 않는 태그 = 버전 0
+        '''
+        if not tags: return {}
+        rows = db.session.execute(select(cls.name, cls.version).where(cls.name.in_(tags)))
+        versions = dict.fromkeys(tags, 0)
+        versions.update({name: version for name, version in rows})
+        return versions
+
+    def __repr__(self):
+        return super().__repr__() + f'{self.name}: {self.version}'
+
+    def __str__(self):
+        return super().__str__() + f'{self.name}: {self.version}'
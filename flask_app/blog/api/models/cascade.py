@@ -0,0 +1,103 @@
+from sqlalchemy import select, delete, func, or_, and_, inspect
+
+from blog.api.models import get_db
+
+db = get_db()
+
+class CascadeDelete():
+    '''
+    category, post, user 삭제 = 하위 객체(post, comment, file, message, upload_quota)까지 집합 단위 SQL 로 한 트랜잭션에서 삭제
+    ORM cascade(delete-orphan)는 하위 객체를 전부 로드한 뒤 객체마다 flush hook + DELETE 실행
+    => 댓글, 파일 수 만큼 쿼리 발생 + 그동안 SQLite 쓰기 lock 유지
+    여기서는 테이블마다 DELETE 1번 + 남는 행의 카운터는 GROUP BY 집계 후 executemany UPDATE 1번
+    저장소 파일은 blob 참조를 해제하고, 참조가 없어진 객체만 tombstone 에 기록 => 백그라운드에서 배치(delete_objects)로 정리
+    '''
+    @classmethod
+    def delete(cls, category_ids=(), post_ids=(), user_ids=()):
+        '''
+        반환 = 테이블별 삭제된 행 수
+        '''
+        from blog.api.models.get import get_model
+        User, Category, Post = get_model('user'), get_model('category'), get_model('post')
+        Comment, File, Message = get_model('comment'), get_model('file'), get_model('message')
+        UploadQuota = get_model('upload_quota')
+        SearchIndex, CacheTag = get_model('search'), get_model('cache_tag')
+
+        category_ids, post_ids, user_ids = set(category_ids), set(post_ids), set(user_ids)
+        session = db.session
+        connection = session.connection()
+
+        # 1. 삭제 범위 = 조건식 (post 는 마지막에 삭제하므로 하위 테이블 조건에 서브쿼리로 사용 가능)
+        post_scope = or_(Post.id.in_(post_ids), Post.category_id.in_(category_ids), Post.author_id.in_(user_ids))
+        post_select = select(Post.id).where(post_scope)
+        comment_scope = or_(Comment.post_id.in_(post_select), Comment.author_id.in_(user_ids))
+        file_scope = or_(File.post_id.in_(post_select), File.author_id.in_(user_ids))
+        deleted_post_ids = connection.execute(post_select).scalars().all()
+
+        # 2. 삭제 후에도 남는 행의 카운터 감소량 = GROUP BY 집계
+        user_posts = cls.count_by(connection, Post.author_id, post_scope, user_ids)
+        user_comments = cls.count_by(connection, Comment.author_id, comment_scope, user_ids)
+        post_comments = cls.count_by(connection, Comment.post_id, comment_scope, post_select)
+        category_posts = cls.count_by(connection, Post.category_id, post_scope, category_ids)
+        file_rows = connection.execute(select(File.digest, File.name).where(file_scope)).all()
+
+        # 3. 검색 인덱스 + 하위 테이블부터 삭제
+        SearchIndex.delete_where(connection, 'comment', Comment.id, comment_scope)
+        SearchIndex.delete_where(connection, 'post', Post.id, post_scope)
+        counts = {
+            'file': connection.execute(delete(File).where(file_scope)).rowcount,
+            'comment': connection.execute(delete(Comment).where(comment_scope)).rowcount,
+            'post': connection.execute(delete(Post).where(post_scope)).rowcount,
+            'message': connection.execute(delete(Message).where(Message.user_id.in_(user_ids))).rowcount,
+            'upload_quota': connection.execute(delete(UploadQuota).where(UploadQuota.user_id.in_(user_ids))).rowcount,
+            'category': connection.execute(delete(Category).where(Category.id.in_(category_ids))).rowcount,
+            'user': connection.execute(delete(User).where(User.id.in_(user_ids))).rowcount,
+        }
+
+        # 4. 남는 행 카운터 갱신 (그룹별 UPDATE 를 executemany 로 한번에)
+        User.increase_counts_by_groups(session, 'posts_count', {id: -n for id, n in user_posts.items()})
+        User.increase_counts_by_groups(session, 'comments_count', {id: -n for id, n in user_comments.items()})
+        Post.increase_counts_by_groups(session, 'comments_count', {id: -n for id, n in post_comments.items()})
+        Category.increase_counts_by_groups(session, 'posts_count', {id: -n for id, n in category_posts.items()})
+        Category.update_latest_posts(session, category_posts)
+        File.release_storage(session, file_rows)
+
+        # 5. 캐시 무효화 = 테이블 태그 + 삭제된 행, 카운터가 바뀐 post 의 인스턴스 태그
+        tags = {table for table, count in counts.items() if count}
+        if post_comments: tags.add('post')
+        tags |= {f'post:{id}' for id in [*deleted_post_ids, *post_comments]}
+        tags |= {f'category:{id}' for id in category_ids} | {f'user:{id}' for id in user_ids}
+        CacheTag.bump(connection, tags)
+        for model, ids in [(User, user_ids), (Category, category_ids), (Post, deleted_post_ids)]:
+            for id in ids: model.invalidate_object_cache(session, id)
+
+        # 6. 세션에 남아있는 삭제된 인스턴스 분리 = ORM 삭제처럼 commit 후에도 로드된 값 사용 가능 (expire X)
+        deleted_post_ids = set(deleted_post_ids)
+        cls.expunge_deleted(session, {
+            User: lambda values: values.get('id') in user_ids,
+            Category: lambda values: values.get('id') in category_ids,
+            Post: lambda values: values.get('id') in deleted_post_ids,
+            Comment: lambda values: values.get('post_id') in deleted_post_ids or values.get('author_id') in user_ids,
+            File: lambda values: values.get('post_id') in deleted_post_ids or values.get('author_id') in user_ids,
+            Message: lambda values: values.get('user_id') in user_ids,
+        })
+
+        # 참조가 없어진 저장소 객체는 tombstone 으로 예약 => commit 후 백그라운드 drain
+        session.commit()
+        return counts
+
+    @staticmethod
+    def expunge_deleted(session, is_deleted):
+        # 로드된 값(__dict__)으로만 확인 = 삭제된 행을 다시 조회하지 않음
+        for instance in list(session.identity_map.values()):
+            check = is_deleted.get(type(instance))
+            if check and check(inspect(instance).dict): session.expunge(instance)
+
+    @staticmethod
+    def count_by(connection, column, scope, excluded_ids):
+        '''
+        scope 에 해당하는 행 수를 column 별로 집계 (excluded_ids = 같이 삭제되는 행 id 집합 또는 서브쿼리, 제외)
+        '''
+        condition = and_(scope, column.notin_(excluded_ids))
+        rows = connection.execute(select(column, func.count()).where(condition).group_by(column))
+        return {id: count for id, count in rows if id is not None}
@@ -1,3 +1,5 @@
+from sqlalchemy import update, select, func
+
 from blog.api.models.base import BaseModel
 from blog.api.models import get_db
 
@@ -5,9 +7,90 @@ db = get_db()
 
 class Category(BaseModel):
     __tablename__ = 'category'                                                                      # 테이블 이름 명시적 선언
+    object_cache = True
     name = db.Column(db.String(150), unique=True)                                                   # 메뉴 이름       
     category_posts = db.relationship('Post', back_populates='category', cascade='delete, delete-orphan', lazy='dynamic')             
 
+    # post 통계 = post 추가, 삭제, 카테고리 변경 시 after_flush 에서 SQL UPDATE 로 갱신
+    posts_count = db.Column(db.Integer, default=0)
+    latest_post_id = db.Column(db.Integer)
+    latest_post_date = db.Column(db.DateTime)
+    # 통계는 목록 페이지 캐시('post' 태그)로 무효화 되므로 카테고리 캐시 태그 버전은 올리지 않음
+    cache_ignored_columns = ('posts_count', 'latest_post_id', 'latest_post_date')
+    counter_columns = {'posts_count': ('post', 'category_id')}
+
+    @classmethod
+    def add_post_stats(cls, session, post):
+        # 새 post = 가장 최신 post
+        session.connection().execute(update(cls.__table__)
+            .where(cls.id == post.category_id)
+            .values(
+                posts_count=func.coalesce(cls.posts_count, 0) + 1,
+                latest_post_id=post.id,
+                latest_post_date=post.date_created,
+            )
+        )
+        cls.invalidate_object_cache(session, post.category_id)
+
+    @classmethod
+    def remove_post_stats(cls, session, category_id, post_id):
+        session.connection().execute(update(cls.__table__)
+            .where(cls.id == category_id)
+            .values(posts_count=func.coalesce(cls.posts_count, 0) - 1)
+        )
+        cls.update_latest_post(session, category_id, post_id)
+        cls.invalidate_object_cache(session, category_id)
+
+    @classmethod
+    def update_latest_post(cls, session, category_id, post_id=None):
+        '''
+        최신 post 다시 찾기 = (category_id, date_created, id) 인덱스로 1행만 조회
+        post_id 지정 시 해당 post가 최신 post였을 때만 갱신
+        '''
+        stmt = cls.get_latest_post_stmt().where(cls.id == category_id)
+        if post_id is not None: stmt = stmt.where(cls.latest_post_id == post_id)
+        session.connection().execute(stmt)
+
+    @classmethod
+    def update_latest_posts(cls, session, category_ids):
+        # 여러 카테고리 한번에 (일괄 삭제 후)
+        if not category_ids: return
+        session.connection().execute(cls.get_latest_post_stmt().where(cls.id.in_(category_ids)))
+
+    @classmethod
+    def get_latest_post_stmt(cls):
+        from blog.api.models.post import Post
+        latest = select(Post.id, Post.date_created).where(Post.category_id == cls.id)\
+            .order_by(Post.date_created.desc(), Post.id.desc()).limit(1)
+        return update(cls.__table__).values(
+            latest_post_id=latest.with_only_columns(Post.id).scalar_subquery(),
+            latest_post_date=latest.with_only_columns(Post.date_created).scalar_subquery(),
+        )
+
+    @classmethod
+    def get_total_posts_count(cls):
+        # 전체 post 수 = 카테고리별 posts_count 합 (post 는 항상 카테고리에 속함), post 테이블 COUNT X
+        return db.session.execute(select(func.coalesce(func.sum(cls.posts_count), 0))).scalar()
+
+    @classmethod
+    def delete_all_by_ids(cls, ids):
+        # 카테고리 + 하위 post, comment, file 일괄 삭제
+        from blog.api.models.cascade import CascadeDelete
+        return CascadeDelete.delete(category_ids=ids)
+
+    @classmethod
+    def apply_recount(cls, session, updates, chunk_ids):
+        # 카운터 + 최신 post 도 chunk 단위로 다시 계산
+        super().apply_recount(session, updates, chunk_ids)
+        cls.update_latest_posts(session, chunk_ids)
+
+    def update_count(self):
+        from blog.api.models.post import Post
+        self.posts_count = self.category_posts.count()
+        latest = self.category_posts.order_by(Post.date_created.desc(), Post.id.desc()).first()
+        self.latest_post_id = latest.id if latest else None
+        self.latest_post_date = latest.date_created if latest else None
+
     def __repr__(self):
         return super().__repr__() + f'{self.name}'         
 
@@ -19,7 +102,7 @@ from blog.api.models.base import AdminBase
 
 class CategoryAdmin(AdminBase):
     # 1. 표시 할 열 설정
-    column_list = ('id', 'name')
+    column_list = ('id', 'name', 'posts_count', 'latest_post_id', 'latest_post_date')
 
     # 2. 폼 표시 X 열 설정
-    form_excluded_columns = {'category_posts'} 
\ No newline at end of file
+    form_excluded_columns = {'category_posts', 'posts_count', 'latest_post_id', 'latest_post_date'} 
\ No newline at end of file
@@ -6,7 +6,13 @@ db = get_db()
 
 class Comment(BaseModel):
     __tablename__ = 'comment'
+    __table_args__ = (
+        # post 상세 댓글 목록, 일괄 삭제 범위 조회용
+        db.Index('ix_comment_post_id', 'post_id'),
+        db.Index('ix_comment_author_id', 'author_id'),
+    )
     content = db.Column(db.Text(), nullable=False)                                                  # 댓글 내용
+    search_columns = ('content',)                                                                   # 검색 인덱스 대상
     
     author_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_comment_user', ondelete='CASCADE'), nullable=False)  
     user = db.relationship('User', back_populates="user_comments")
@@ -14,14 +20,29 @@ class Comment(BaseModel):
     post_id = db.Column(db.Integer, db.ForeignKey('post.id', name='fk_comment_post', ondelete='CASCADE'), nullable=False)  
     post = db.relationship('Post', back_populates='post_comments')
 
-    def before_new_flush(self):
-        self.user.comments_count += 1
-        post = Post.get_instance_by_id_with(self.post_id)
-        post.comments_count += 1
+    # ---------------------- 카운터 (원자적 SQL UPDATE) ----------------------
+    def after_new_flush(self, session):
+        self.get_user_model().increase_counts(session, self.author_id, comments_count=1)
+        Post.increase_counts(session, self.post_id, comments_count=1)
+        # post 작성자 알림 이벤트 (digest 이메일은 scheduler 가 모아서 전송)
+        from blog.api.models.comment_notification import CommentNotification
+        CommentNotification.add(session, self)
 
-    def before_deleted_flush(self):
-        self.user.comments_count -= 1
-        self.post.comments_count -= 1
+    def after_deleted_flush(self, session):
+        self.get_user_model().increase_counts(session, self.author_id, comments_count=-1)
+        Post.increase_counts(session, self.post_id, comments_count=-1)
+
+    @staticmethod
+    def get_user_model():
+        from blog.api.models.user import User
+        return User
+
+    def get_search_document(self):
+        return {'kind': 'comment', 'ref_id': self.id, 'post_id': self.post_id, 'title': '', 'content': self.content}
+
+    def get_cache_tags(self):
+        # 목록 페이지에 post 의 댓글 수가 출력되므로 'post' 태그도 포함
+        return super().get_cache_tags() + ['post', f'post:{self.post_id}']
 
     def __repr__(self):
         return super().__repr__() + f'post_id: {self.post_id}, {self.content}'       
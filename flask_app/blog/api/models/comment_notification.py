@@ -0,0 +1,148 @@
+from datetime import timedelta
+from itertools import groupby
+from sqlalchemy import select, update, delete, func, literal, false
+from sqlalchemy.orm import aliased
+
+from blog.api.utils.etc import Etc
+from blog.api.models.base import BaseModel
+from blog.api.models import get_db
+
+db = get_db()
+
+class CommentNotification(BaseModel):
+    '''
+    새 댓글 알림 이벤트 (post 작성자에게 보낼 댓글 목록)
+    1. 댓글 추가 = 같은 트랜잭션에서 이벤트 INSERT (post 작성자 본인 댓글 제외)
+    2. scheduler = 가장 오래된 이벤트가 COMMENT_DIGEST_WINDOW_SECONDS 지난 작성자만 골라서
+       작성자 당 digest 이메일 1개를 outbox 에 저장 + 처리한 이벤트 삭제 (같은 트랜잭션)
+       모든 worker 의 scheduler 가 실행 = 쓰기 lock 을 먼저 잡고 조회 => 다른 worker 는 처리된 이벤트 삭제 후에 조회 (중복 digest X)
+    3. outbox 전송 = MailSender 가 batch 로 같은 SMTP 연결에서 전송
+    => 이메일 수 = 댓글 수가 아니라 window 안에 댓글을 받은 작성자 수
+    그 사이 삭제된 댓글, 게시글, 사용자는 digest 에서 빠짐 (join)
+    '''
+    __tablename__ = 'comment_notification'
+    __table_args__ = (
+        db.Index('ix_comment_notification_recipient_id', 'recipient_id'),
+    )
+    recipient_id = db.Column(db.Integer, nullable=False)                            # post 작성자
+    post_id = db.Column(db.Integer, nullable=False)
+    comment_id = db.Column(db.Integer, nullable=False)
+
+    @classmethod
+    def add(cls, session, comment):
+        '''
+        post 작성자 id 를 조회하지 않고 INSERT ... SELECT 1번 (작성자 본인 댓글이면 INSERT X)
+        '''
+        from blog.api.models.post import Post
+        source = select(Post.author_id, literal(comment.post_id), literal(comment.id), literal(Etc.get_korea_time())) \
+            .where(Post.id == comment.post_id, Post.author_id != comment.author_id)
+        session.connection().execute(db.insert(cls.__table__).from_select(
+            ['recipient_id', 'post_id', 'comment_id', 'date_created'], source))
+
+    @staticmethod
+    def now():
+        # DB 에 저장된 시간과 비교 (SQLite DateTime = timezone 없음)
+        return Etc.get_korea_time().replace(tzinfo=None)
+
+    @classmethod
+    def send_digests(cls, window_seconds, max_comments=20, batch_size=500, site_url=''):
+        '''
+        window 가 지난 작성자 batch_size 명씩 digest 이메일을 outbox 에 저장
+        반환 = (digest 수, 포함된 댓글 수)
+        '''
+        from blog.api.models.user import User
+        from blog.api.models.post import Post
+        from blog.api.models.comment import Comment
+        from blog.api.models.email_outbox import EmailOutbox
+        Recipient, Commenter = aliased(User), aliased(User)
+        digests = comments = 0
+        while True:
+            # 보낼 작성자가 없으면 쓰기 lock X (scheduler 가 주기적으로 실행)
+            if not cls.get_due_recipients(window_seconds, 1): break
+
+            # 쓰기 lock 먼저 (조건이 거짓인 빈 UPDATE, pysqlite 는 첫 DML 에서 BEGIN)
+            # => 아래 조회 ~ outbox 저장, 이벤트 삭제까지 한 트랜잭션, 다른 worker 는 commit 뒤에 남은 이벤트만 조회
+            db.session.execute(update(cls.__table__).where(false()).values(recipient_id=cls.recipient_id))
+
+            # 처리 범위 = 지금까지 들어온 이벤트 (처리 중에 추가된 이벤트는 다음 digest 로)
+            max_id = db.session.execute(select(func.max(cls.id))).scalar()
+            recipient_ids = cls.get_due_recipients(window_seconds, batch_size, max_id)
+            if not recipient_ids:
+                db.session.rollback()
+                break
+
+            rows = db.session.execute(select(
+                    cls.recipient_id, Recipient.email, Recipient.username,
+                    Post.id.label('post_id'), Post.title, Commenter.username.label('commenter'), Comment.content,
+                ).join(Recipient, Recipient.id == cls.recipient_id)
+                .join(Post, Post.id == cls.post_id)
+                .join(Comment, Comment.id == cls.comment_id)
+                .join(Commenter, Commenter.id == Comment.author_id)
+                .where(cls.recipient_id.in_(recipient_ids), cls.id <= max_id)
+                .order_by(cls.recipient_id, Post.id, Comment.id)).all()
+
+            messages = []
+            for _, recipient_rows in groupby(rows, key=lambda row: row.recipient_id):
+                recipient_rows = list(recipient_rows)
+                messages.append(cls.make_digest(recipient_rows, max_comments, site_url))
+                comments += len(recipient_rows)
+            EmailOutbox.add(db.session, messages)
+            db.session.execute(delete(cls.__table__).where(cls.recipient_id.in_(recipient_ids), cls.id <= max_id))
+            cls.commit()
+            digests += len(messages)
+            if len(recipient_ids) < batch_size: break
+        return digests, comments
+
+    @classmethod
+    def get_due_recipients(cls, window_seconds, limit, max_id=None):
+        # 가장 오래된 이벤트가 window 를 지난 작성자 id
+        stmt = select(cls.recipient_id) \
+            .group_by(cls.recipient_id) \
+            .having(func.min(cls.date_created) <= cls.now() - timedelta(seconds=window_seconds)) \
+            .order_by(cls.recipient_id).limit(limit)
+        if max_id is not None: stmt = stmt.where(cls.id <= max_id)
+        return db.session.execute(stmt).scalars().all()
+
+    @staticmethod
+    def make_digest(rows, max_comments, site_url):
+        first = rows[0]
+        lines = [f'{first.username} 님의 게시글에 새 댓글 {len(rows)}개가 달렸습니다.']
+        for post_id, post_rows in groupby(rows, key=lambda row: row.post_id):
+            post_rows = list(post_rows)
+            lines.append('')
+            lines.append(f'[{post_rows[0].title}] 새 댓글 {len(post_rows)}개')
+            if site_url: lines.append(f'{site_url.rstrip("/")}/post/{post_id}')
+            for row in post_rows[:max_comments]:
+                content = ' '.join(row.content.split())
+                lines.append(f'- {row.commenter}: {content[:100]}{"..." if len(content) > 100 else ""}')
+            if len(post_rows) > max_comments: lines.append(f'- 외 {len(post_rows) - max_comments}개')
+        return {
+            'kind': 'comment_digest',
+            'recipient': first.email,
+            'subject': f'[MyBlog 새 댓글 {len(rows)}개]',
+            'body': '\n'.join(lines),
+        }
+
+    @classmethod
+    def run_digests(cls, app):
+        config = app.config
+        if not config.get('COMMENT_NOTIFICATION_ENABLED', True): return
+        from blog.api.utils.email import MailSender
+        with app.app_context():
+            try:
+                digests, _ = cls.send_digests(
+                    config.get('COMMENT_DIGEST_WINDOW_SECONDS', 600),
+                    config.get('COMMENT_DIGEST_MAX_COMMENTS', 20),
+                    site_url=config.get('SITE_URL') or '',
+                )
+                if digests: MailSender.wake(app)
+            except Exception:
+                app.logger.exception('댓글 알림 digest 전송 실패')
+            finally:
+                db.session.remove()
+
+    def __repr__(self):
+        return super().__repr__() + f'recipient_id: {self.recipient_id}, comment_id: {self.comment_id}'
+
+    def __str__(self):
+        return super().__str__() + f'recipient_id: {self.recipient_id}, comment_id: {self.comment_id}'
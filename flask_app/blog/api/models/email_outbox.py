@@ -0,0 +1,161 @@
+from datetime import timedelta
+from secrets import token_hex
+from sqlalchemy import select, update, delete, bindparam, case, or_, Boolean
+from sqlalchemy.dialects.sqlite import insert
+
+from blog.api.utils.etc import Etc
+from blog.api.models.base import BaseModel
+from blog.api.models import get_db
+
+db = get_db()
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+RETENTION_SECONDS = 7 * 24 * 60 * 60
+PURGE_BATCH_SIZE = 500
+SECRET_KINDS = ('otp',)                                                             # 전송이 끝나면(sent, failed) 본문을 지우는 종류
+class EmailOutbox(BaseModel):
+    '''
+    보낼 이메일 목록 (durable outbox)
+    1. 요청 = 행 INSERT 후 바로 반환 (SMTP 연결, 전송을 기다리지 않음)
+    2. MailSender = pending 행을 batch 로 가져가서(claim) 유지 중인 SMTP 연결로 전송
+       claim = status 'sending' + next_attempt_at 을 lease 만료 시간으로 (worker 가 죽으면 lease 만료 후 다시 전송)
+               + claim_token 을 새 값으로 => 같은 token 의 행 = 이번 claim 에서 가져간 행
+    3. 실패 = attempts 증가 + 지수 backoff 후 재시도, MAIL_MAX_ATTEMPTS 를 넘거나 영구 실패(수신 거부 등)면 failed
+    4. 정리 = 전송이 끝난 otp 본문은 바로 비움(인증번호를 DB 에 남기지 않음), 끝난 행은 EMAIL_OUTBOX_RETENTION_SECONDS 후 삭제
+    status = pending, sending, sent, failed
+    '''
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+        db.Index('ix_email_outbox_claim_token', 'claim_token'),
+    )
+    kind = db.Column(db.String(30), nullable=False)                                 # otp, comment_digest 등
+    recipient = db.Column(db.String(150), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), default='pending', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.String(500), nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True)                          # 마지막으로 가져간 claim
+
+    @staticmethod
+    def now():
+        # DB 에 저장된 시간과 비교 (SQLite DateTime = timezone 없음)
+        return Etc.get_korea_time().replace(tzinfo=None)
+
+    @classmethod
+    def add(cls, session, messages):
+        '''
+        messages = [{'kind', 'recipient', 'subject', 'body'}] => 현재 트랜잭션에 INSERT (executemany 1번)
+        '''
+        if not messages: return
+        now = Etc.get_korea_time()
+        session.connection().execute(insert(cls.__table__),
+            [dict(message, status='pending', attempts=0, date_created=now) for message in messages])
+
+    @classmethod
+    def claim(cls, batch_size, lease_seconds):
+        '''
+        전송할 행 batch_size 개를 원자적으로 가져감 (UPDATE 1문장 = 다른 스레드, worker 와 겹치지 않음)
+        UPDATE ... RETURNING 은 SQLite 3.35 이상만 가능 => claim_token 을 기록하고 commit 후 같은 token 의 행 조회
+        '''
+        now, token = cls.now(), token_hex(16)
+        due = select(cls.id).where(
+            cls.status.in_(('pending', 'sending')),
+            or_(cls.next_attempt_at.is_(None), cls.next_attempt_at <= now),
+        ).order_by(cls.id).limit(batch_size)
+        claimed = db.session.execute(update(cls.__table__)
+            .where(cls.id.in_(due.scalar_subquery()))
+            .values(status='sending', next_attempt_at=now + timedelta(seconds=lease_seconds), claim_token=token)
+        ).rowcount
+        cls.commit()
+        if not claimed: return []
+        return db.session.execute(select(cls.id, cls.kind, cls.recipient, cls.subject, cls.body, cls.attempts)
+            .where(cls.claim_token == token).order_by(cls.id)).all()
+
+    @classmethod
+    def record(cls, rows, errors, max_attempts):
+        '''
+        전송 결과 반영 = 성공 sent, 실패 재시도 예약 또는 failed (executemany 1번)
+        errors = {id: (에러 메세지, 영구 실패 여부)}
+        전송이 끝난 SECRET_KINDS 행 = 같은 UPDATE 에서 본문 비우기
+        '''
+        now = cls.now()
+        values = []
+        for row in rows:
+            if row.id not in errors:
+                values.append({'_id': row.id, '_status': 'sent', '_attempts': row.attempts + 1, '_next': None, '_error': None, '_sent': now,
+                    '_blank': row.kind in SECRET_KINDS})
+                continue
+            error, permanent = errors[row.id]
+            attempts = row.attempts + 1
+            status = 'failed' if permanent or attempts >= max_attempts else 'pending'
+            values.append({'_id': row.id, '_status': status, '_attempts': attempts, '_error': error[:500], '_sent': None,
+                '_next': now + cls.get_retry_delay(attempts) if status == 'pending' else None,
+                '_blank': status == 'failed' and row.kind in SECRET_KINDS})
+        if not values: return
+        outbox = cls.__table__.c
+        db.session.execute(update(cls.__table__)
+            .where(outbox.id == bindparam('_id'))
+            .values(status=bindparam('_status'), attempts=bindparam('_attempts'), next_attempt_at=bindparam('_next'),
+                last_error=bindparam('_error'), sent_at=bindparam('_sent'),
+                body=case((bindparam('_blank', type_=Boolean), ''), else_=outbox.body)),
+            values
+        )
+        cls.commit()
+
+    @classmethod
+    def purge(cls, max_age=RETENTION_SECONDS, batch_size=PURGE_BATCH_SIZE):
+        '''
+        전송이 끝나고(sent, failed) max_age 가 지난 행 삭제, 반환 = 삭제한 행 수
+        + 끝나지 않았어도 max_age 가 지난 SECRET_KINDS 행의 본문 비우기 (인증번호는 이미 만료)
+        '''
+        deleted = 0
+        while True:
+            cutoff = cls.now() - timedelta(seconds=max_age)
+            ids = db.session.execute(select(cls.id)
+                .where(cls.status.in_(('sent', 'failed')), cls.date_created < cutoff)
+                .order_by(cls.id).limit(batch_size)).scalars().all()
+            if ids: db.session.execute(delete(cls.__table__).where(cls.id.in_(ids)))
+            cls.commit()
+            deleted += len(ids)
+            if len(ids) < batch_size: break
+        db.session.execute(update(cls.__table__)
+            .where(cls.kind.in_(SECRET_KINDS), cls.date_created < cutoff, cls.body != '')
+            .values(body=''))
+        cls.commit()
+        return deleted
+
+    @classmethod
+    def run_purge(cls, app):
+        with app.app_context():
+            try:
+                cls.purge(app.config.get('EMAIL_OUTBOX_RETENTION_SECONDS', RETENTION_SECONDS))
+            except Exception:
+                app.logger.exception('email outbox 정리 실패')
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def get_retry_delay(attempts):
+        return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+    def __repr__(self):
+        return super().__repr__() + f'{self.kind} {self.recipient} ({self.status})'
+
+    def __str__(self):
+        return super().__str__() + f'{self.kind} {self.recipient} ({self.status})'
+
+# ------------------------------------------ Admin ------------------------------------------
+from blog.api.models.base import AdminBase
+
+class EmailOutboxAdmin(AdminBase):
+    # 1. 표시 할 열 설정
+    column_list = ('id', 'kind', 'recipient', 'subject', 'status', 'attempts', 'last_error', 'sent_at')
+
+    # 2. 전송 기록 = 읽기 전용 (생성, 수정 X)
+    can_create = False
+    can_edit = False
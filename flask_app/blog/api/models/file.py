@@ -1,16 +1,43 @@
+import re
 from os.path import splitext
-from datetime import datetime
+from hashlib import sha256
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from boto3.s3.transfer import TransferConfig
+from sqlalchemy import insert
+from itsdangerous import URLSafeTimedSerializer, BadData
 
 from blog.api.utils.etc import Etc
+from blog.api.utils.storage import Storage
+from blog.api.utils.thumbnail import Thumbnail
 from blog.api.models import get_db
 from blog.api.models.base import BaseModel
+from blog.api.models.blob import Blob
+from blog.api.models.cache_tag import CacheTag
+from blog.api.models.upload_quota import UploadQuota
+from blog.api.models.upload_ticket import UploadTicket, UPLOAD_TOKEN_MAX_AGE
+from blog.api.models.storage_tombstone import StorageTombstone
 
 db = get_db()
 
+MAX_DIRECT_UPLOAD_FILES = 10                                                        # presigned POST 한번에 발급할 최대 파일 수
+HASH_CHUNK_SIZE = 1024 * 1024
 class File(BaseModel):
+    '''
+    첨부 파일 = 원본 파일 이름 + 내용(blob) 참조
+    저장소 key = 내용의 SHA-256 digest => 같은 내용은 여러 post 에 첨부되어도 1번만 저장, 전송
+    digest 가 없는 행 = 이전 방식(name 이 저장소 key)으로 올라간 파일
+    '''
     __tablename__ = 'file'
+    __table_args__ = (
+        db.Index('ix_file_post_id', 'post_id'),
+        db.Index('ix_file_author_id', 'author_id'),
+        db.Index('ix_file_digest', 'digest'),
+    )
     name = db.Column(db.String(150), nullable=False)
     size = db.Column(db.Float, nullable=False)
+    digest = db.Column(db.String(64), nullable=True)
 
     author_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_file_user', ondelete='CASCADE'), nullable=False)                
     user = db.relationship('User', back_populates='files')             
@@ -18,50 +45,289 @@ class File(BaseModel):
     post_id = db.Column(db.Integer, db.ForeignKey('post.id', name='fk_file_post', ondelete='CASCADE'), nullable=False)
     post = db.relationship('Post', back_populates='files')
 
+    # 썸네일, 미리보기 정보 = file 조회 시 같이 로드 (JOIN)
+    blob = db.relationship('Blob', primaryjoin='foreign(File.digest) == Blob.digest', viewonly=True, lazy='joined')
+
+    @property
+    def key(self):
+        return self.digest or self.name
+
+    @staticmethod
+    def make_file_name(filename):
+        # 길이 제한 150자 (확장자 유지)
+        origin_file_name, extension = splitext(str(filename).replace(' ', '_'))
+        return origin_file_name[:150 - len(extension[:20])] + extension[:20]
+
     @staticmethod
-    def get_s3_config():
+    def is_digest(digest):
+        return isinstance(digest, str) and re.fullmatch('[0-9a-f]{64}', digest) is not None
+
+    @staticmethod
+    def get_file_digest(file):
+        '''
+        업로드 요청에서 받은 파일 = 본문을 읽으면서 계산한 digest 사용 (QuotaSpooledFile.sha256)
+        그 외 = chunk 단위로 다시 읽어서 계산
+        '''
+        stream = getattr(file, 'stream', file)
+        hasher = getattr(stream, 'sha256', None)
+        if hasher is not None: return hasher.hexdigest()
+
+        hasher, position = sha256(), stream.tell()
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+        stream.seek(position)
+        return hasher.hexdigest()
+    
+    # ---------------------- 업로드 ----------------------
+    upload_executor = None                                                          # worker 프로세스 당 1개, 처음 업로드 시 생성
+    upload_executor_lock = Lock()
+
+    @classmethod
+    def get_upload_executor(cls):
+        with cls.upload_executor_lock:
+            if cls.upload_executor is None:
+                cls.upload_executor = ThreadPoolExecutor(
+                    max_workers=Etc.get_config().get('S3_UPLOAD_WORKERS', 4), thread_name_prefix='s3-upload')
+            return cls.upload_executor
+
+    @staticmethod
+    def get_transfer_config():
+        '''
+        임시 파일(메모리/디스크)에서 chunk 단위로 읽어서 전송 = 파일 전체를 메모리에 올리지 않음
+        S3_MULTIPART_THRESHOLD 보다 큰 파일은 S3_MULTIPART_CHUNKSIZE 단위 multipart 업로드
+        병렬 처리는 파일 단위(upload_executor)로만 = 파일 내부 전송 스레드 X
+        '''
         config = Etc.get_config()
-        return config['S3'], config['S3_BUCKET_NAME'], config['S3_DEFAULT_DIRS'][config['mode']]
+        return TransferConfig(
+            multipart_threshold=config.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024),
+            multipart_chunksize=config.get('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024),
+            use_threads=False,
+        )
+
+    @staticmethod
+    def get_file_size(file):
+        # 메모리, 디스크 어느 쪽에 있어도 파일 내용을 읽지 않고 크기 확인 (getbuffer 는 BytesIO 에만 존재)
+        stream = getattr(file, 'stream', file)
+        position = stream.tell()
+        stream.seek(0, 2)
+        size = stream.tell()
+        stream.seek(position)
+        return size
 
     @classmethod
-    def make_new_file_name(cls, filename, s3_default_dir):
-        origin_file_name, extension = splitext(filename)
-        origin_file_name = origin_file_name.replace(' ', '_')
-        now = str(int(datetime.now().timestamp()*100000))
-        new_file_name = origin_file_name + '_' + now + extension
-        if len(new_file_name) + len(s3_default_dir) > 150: 
-            # 길이 제한 150자
-            new_file_name = new_file_name[-150 + len(s3_default_dir)]
-        return new_file_name
-    
+    def upload_to_storage(cls, storage, key, file, transfer_config):
+        storage.put(key, file, transfer_config)
+
+    @classmethod
+    def take_refs(cls, refs):
+        '''
+        refs = {digest: (참조 수, 크기)} => blob 참조 증가(없으면 uploading 상태로 추가) + 삭제 예약 취소를 commit 1번
+        => 이후 drain 은 이 내용을 지우지 않음 (참조를 잡기 전에 확인한 "이미 있는 내용" 은 그 사이 삭제될 수 있음)
+        삭제가 진행 중(lease)인 내용 = 삭제가 끝날 때까지 기다림 => 다시 올려야 하는 내용으로 처리
+        반환 = 저장이 끝난 내용 {digest: 크기} = 전송, 확인 생략 가능
+        '''
+        Blob.add_refs(db.session, refs)
+        stored = Blob.get_stored(refs)
+        deleting = StorageTombstone.cancel(db.session, refs)
+        cls.commit()
+        if deleting: StorageTombstone.wait_for_drain(deleting)
+        return {digest: size for digest, size in stored.items() if digest not in deleting}
+
+    @classmethod
+    def release_refs(cls, refs):
+        # 전송, 확인에 실패한 내용 = 잡아둔 참조 해제 (마지막 참조면 blob 삭제 + 저장소 객체 삭제 예약) + commit
+        if not refs: return
+        Blob.release_refs(db.session, refs)
+        cls.commit()
+
+    @classmethod
+    def upload_files(cls, files, post_id, author_id):
+        '''
+        참조를 먼저 잡은 뒤(take_refs) 저장이 끝나지 않은 내용(digest)만 스레드 풀에서 동시에 업로드
+        => 요청 시간 = 가장 큰 새 파일 업로드 시간, 이미 저장된 내용, 같은 요청 안의 중복 파일은 전송 X
+        업로드 성공한 파일만 file 행을 한번에 추가(executemany INSERT 1번 + commit 1번, flush 를 거치지 않으므로 캐시 태그는 직접 갱신)
+        업로드 실패한 내용은 참조 해제
+        반환 = (새로 저장된 용량 = 할당량 사용량, [(파일 이름, 에러 메세지)] 실패 목록)
+        '''
+        storage = Storage.get()
+        files = [(file, cls.get_file_digest(file), cls.get_file_size(file)) for file in files]
+        sizes = {digest: file_size for _, digest, file_size in files}
+        refs = Counter(digest for _, digest, _ in files)
+        stored = cls.take_refs({digest: (count, sizes[digest]) for digest, count in refs.items()})
+
+        executor = cls.get_upload_executor()
+        transfer_config = cls.get_transfer_config()
+        transfers = {}
+        for file, digest, _ in files:
+            if digest in stored or digest in transfers: continue
+            transfers[digest] = executor.submit(cls.upload_to_storage, storage, digest, file, transfer_config)
+
+        rows, failures, uploaded, failed = [], [], {}, Counter()
+        for file, digest, file_size in files:
+            try:
+                if digest in transfers: transfers[digest].result()
+            except Exception as e:
+                failures.append((file.filename, str(e)))
+                failed[digest] += 1
+                continue
+            if digest in transfers: uploaded[digest] = file_size
+            rows.append({'name': cls.make_file_name(file.filename), 'digest': digest, 'size': file_size,
+                'post_id': post_id, 'author_id': author_id})
+        for file, _, _ in files:
+            file.close()
+
+        cls.release_refs(failed)
+        if not rows: return 0.0, failures
+        cls.add_uploaded_files(rows, post_id, uploaded)
+        return sum(uploaded.values()), failures
+
     @classmethod
-    def upload_to_s3(cls, file, post_id, author_id):
+    def add_uploaded_files(cls, rows, post_id, uploaded=()):
         '''
-        file 인스턴스 추가 + s3에 업로드
+        file 행 추가 (blob 참조는 take_refs 에서 미리 증가), uploaded = 이번에 새로 저장소에 올린 {digest: 크기} => uploading 해제
+        썸네일이 없는 이미지 blob = commit 후 백그라운드 썸네일 생성 등록
         '''
-        s3, s3_bucket_name, s3_default_dir = cls.get_s3_config()
+        images = set()
+        if Thumbnail.enabled(Etc.get_config()):
+            images = {row['digest'] for row in rows if Thumbnail.is_image(row['name'])}
+        try:
+            db.session.execute(insert(cls), rows)
+            Blob.mark_stored(db.session, uploaded)
+            Blob.mark_thumbnails(db.session, images)
+            CacheTag.bump(db.session.connection(), [cls.__tablename__, f'post:{post_id}'])
+            cls.commit()
+        except Exception:
+            # DB 반영 실패 = 잡아둔 참조 해제 (이번에 올린 내용이 마지막 참조면 저장소 객체 삭제 예약)
+            db.session.rollback()
+            cls.release_refs(Counter(row['digest'] for row in rows))
+            raise
+        if images: Thumbnail.enqueue(Etc.app, Blob.get_pending_thumbnails(digests=images))
 
-        new_file_name = cls.make_new_file_name(file.filename, s3_default_dir)
-        file_size = file.getbuffer().nbytes
-        
-        cls(
-            name=new_file_name,
-            size=file_size,
-            post_id=post_id,
-            author_id=author_id,
-        ).add_instance()
-        
-        s3.upload_fileobj(file, s3_bucket_name, s3_default_dir + new_file_name)
-        file.close()
-        return file_size
+    # ---------------------- 브라우저 직접 업로드 (presigned POST) ----------------------
+    @staticmethod
+    def get_upload_serializer():
+        return URLSafeTimedSerializer(Etc.app.secret_key, salt='file-upload')
 
-    def before_deleted_flush(self):
-        s3, s3_bucket_name, s3_default_dir = self.get_s3_config()
+    @classmethod
+    def create_upload_urls(cls, user_id, files, post_id=None):
+        '''
+        브라우저가 저장소(s3, 로컬 업로드 url)로 직접 올릴 수 있도록 파일마다 presigned POST 발급
+        files = [{'name': 파일 이름, 'size': 바이트, 'sha256': 브라우저에서 계산한 digest}]
+        저장이 끝난 내용은 발급 X (업로드 생략), 새 내용의 용량만큼만 일일 할당량 예약
+        (confirm 까지 그 내용이 삭제되면 confirm 에서 업로드되지 않은 파일로 처리)
+        파일마다 content-length-range + checksum 조건 = 신고한 크기보다 크거나 digest 와 다른 내용은 저장소에서 거절
+        예약 정보는 발급 기록(UploadTicket)에 저장, 토큰 = 1번만 사용 가능한 nonce + post_id(작성 중이면 None)
+        반환 = {'token': confirm 용 서명 토큰, 'uploads': [{'index', 'filename', 'url', 'fields'}]} / 실패 시 에러 메세지(str)
+        '''
+        try:
+            files = [(str(file['name']), int(file['size']), str(file['sha256']).lower()) for file in files]
+        except (KeyError, TypeError, ValueError):
+            return '잘못된 파일 정보입니다.'
+        if not files or len(files) > MAX_DIRECT_UPLOAD_FILES or any(size <= 0 for _, size, _ in files):
+            return f'파일은 1 ~ {MAX_DIRECT_UPLOAD_FILES}개까지 업로드 가능합니다.'
+        if not all(cls.is_digest(digest) for _, _, digest in files): return '잘못된 파일 정보입니다.'
+
+        existing = Blob.get_stored(digest for _, _, digest in files)
+        new_files = {}
+        for index, (filename, size, digest) in enumerate(files):
+            if digest not in existing: new_files.setdefault(digest, (index, filename, size))
+
+        reserved_size = sum(size for _, _, size in new_files.values())
+        day = UploadQuota.reserve(user_id, reserved_size) if reserved_size else UploadQuota.get_today()
+        if day is None: return '일일 파일 업로드 할당량을 초과하였습니다.'
 
+        storage = Storage.get()
+        expiration = Etc.get_config()['S3_URL_EXPIRATION_SECONDS']
+        uploads = []
+        for digest, (index, filename, size) in new_files.items():
+            presigned = storage.presign_post(digest, size, expiration, digest)
+            uploads.append({'index': index, 'filename': filename, 'url': presigned['url'], 'fields': presigned['fields']})
+
+        nonce = UploadTicket.issue(user_id, post_id, day, reserved_size, new_files)
+        token = cls.get_upload_serializer().dumps({
+            'nonce': nonce, 'user_id': user_id, 'post_id': post_id,
+            'files': [[cls.make_file_name(filename), size, digest] for filename, size, digest in files],
+        })
+        return {'token': token, 'uploads': uploads}
+
+    @classmethod
+    def confirm_uploads(cls, token, post_id, author_id):
+        '''
+        브라우저 직접 업로드 완료 확인 = 저장소에 실제로 있는 내용만 file 행 추가 + 예약한 할당량 정산
+        참조를 먼저 잡은 뒤(take_refs) 저장이 끝나지 않은 내용만 저장소 객체 크기(head)를 스레드 풀에서 동시에 확인
+        토큰은 1번만 사용 가능 (UploadTicket.consume), 발급 시 post 를 지정했으면 해당 post 에만 사용 가능
+        => 같은 토큰을 같은 post, 다른 post 에 다시 보내도 file 추가, 할당량 정산 X
+        반환 = (새로 저장된 용량, [(파일 이름, 에러 메세지)] 실패 목록) / 잘못된, 이미 사용한 토큰은 None
+        '''
+        try:
+            data = cls.get_upload_serializer().loads(token, max_age=UPLOAD_TOKEN_MAX_AGE)
+        except BadData:
+            return None
+        if data.get('user_id') != author_id or data.get('post_id') not in (None, post_id): return None
+        # 사용 처리 + 참조, 삭제 예약 취소 = 한 트랜잭션 (take_refs 에서 commit)
+        ticket = UploadTicket.consume(data.get('nonce'), author_id, post_id)
+        if ticket is None:
+            db.session.rollback()
+            return None
+        day, reserved = ticket
+
+        files = data['files']
+        declared = {}
+        for _, size, digest in files:
+            declared[digest] = max(size, declared.get(digest, 0))
+        refs = Counter(digest for _, _, digest in files)
+        sizes = cls.take_refs({digest: (count, declared[digest]) for digest, count in refs.items()})
+
+        storage = Storage.get()
+        executor = cls.get_upload_executor()
+        heads = {digest: executor.submit(storage.head, digest) for digest in set(refs) - set(sizes)}
+
+        uploaded, errors = {}, {}
+        for digest, future in heads.items():
+            try:
+                size = future.result()
+            except Exception as e:
+                errors[digest] = str(e)
+                continue
+            if size is None:
+                errors[digest] = '업로드되지 않은 파일입니다.'
+            elif size > declared[digest]:
+                errors[digest] = '신고한 크기보다 큰 파일입니다.'
+            else:
+                uploaded[digest] = sizes[digest] = size
+
+        rows, failures = [], []
+        for name, _, digest in files:
+            if digest in errors:
+                failures.append((name, errors[digest]))
+                continue
+            rows.append({'name': name, 'digest': digest, 'size': sizes[digest], 'post_id': post_id, 'author_id': author_id})
+
+        upload_size = sum(uploaded.values())
         try:
-            s3.delete_object(Bucket=s3_bucket_name, Key=s3_default_dir + self.name)
-        except Exception as e:
-            print('에러가 발생했습니다: ', str(e))
+            # 확인 실패 = 참조 해제 (마지막 참조면 올라간 객체 삭제 예약)
+            cls.release_refs({digest: refs[digest] for digest in errors})
+            if rows: cls.add_uploaded_files(rows, post_id, uploaded)
+        finally:
+            if reserved: UploadQuota.commit_reservation(author_id, day, reserved, upload_size)
+        return upload_size, failures
+
+    def after_deleted_flush(self, session):
+        # blob 참조 해제 = 마지막 참조면 저장소 객체 삭제 예약, 이전 방식 파일은 바로 삭제 예약
+        if self.digest: Blob.release_refs(session, {self.digest: 1})
+        else: StorageTombstone.add(session, [self.name])
+
+    @classmethod
+    def release_storage(cls, session, rows):
+        '''
+        일괄 삭제되는 file 들 (digest, name) => blob 참조 해제 + 저장소 객체 삭제 예약 (StorageTombstone)
+        '''
+        Blob.release_refs(session, Counter(digest for digest, _ in rows if digest))
+        StorageTombstone.add(session, [name for digest, name in rows if not digest])
+
+    def get_cache_tags(self):
+        return super().get_cache_tags() + [f'post:{self.post_id}']
 
     def __repr__(self):
         return super().__repr__() + f'{self.name}'         
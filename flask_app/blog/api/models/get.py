@@ -4,6 +4,14 @@ from .file import File, FileAdmin
 from .category import Category, CategoryAdmin
 from .comment import Comment, CommentAdmin
 from .message import Message, MessageAdmin
+from .cache_tag import CacheTag
+from .search import SearchIndex
+from .upload_quota import UploadQuota
+from .upload_ticket import UploadTicket
+from .blob import Blob
+from .storage_tombstone import StorageTombstone
+from .email_outbox import EmailOutbox, EmailOutboxAdmin
+from .comment_notification import CommentNotification
 
 def get_model(arg):
     models = {
@@ -13,6 +21,14 @@ def get_model(arg):
         'category': Category,
         'comment': Comment,
         'message': Message,
+        'cache_tag': CacheTag,
+        'search': SearchIndex,
+        'upload_quota': UploadQuota,
+        'upload_ticket': UploadTicket,
+        'blob': Blob,
+        'storage_tombstone': StorageTombstone,
+        'email_outbox': EmailOutbox,
+        'comment_notification': CommentNotification,
     }
     return models[arg]
 
@@ -24,9 +40,10 @@ def get_admin_model(arg):
         'category': CategoryAdmin,
         'comment': CommentAdmin,
         'message': MessageAdmin,
+        'email_outbox': EmailOutboxAdmin,
     }
     return models[arg]
 
 def get_all_admin_models():
-    arg_list = ['user', 'post', 'file', 'category', 'comment', 'message']
+    arg_list = ['user', 'post', 'file', 'category', 'comment', 'message', 'email_outbox']
     return [[get_admin_model(arg), get_model(arg)] for arg in arg_list]
\ No newline at end of file
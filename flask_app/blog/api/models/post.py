@@ -1,31 +1,112 @@
+from sqlalchemy import inspect, select, update, bindparam
+from sqlalchemy.orm import validates, column_property
+
 from blog.api.models.base import BaseModel
 from blog.api.models import get_db
 
 db = get_db()
 
+EXCERPT_LENGTH = 150
 class Post(BaseModel):
     __tablename__ = 'post'                                                                          
+    __table_args__ = (
+        # keyset pagination 용 인덱스 = (date_created, id) 순서로 바로 찾아감
+        db.Index('ix_post_date_created_id', 'date_created', 'id'),
+        db.Index('ix_post_category_date_created_id', 'category_id', 'date_created', 'id'),
+        db.Index('ix_post_author_date_created_id', 'author_id', 'date_created', 'id'),
+    )
     title = db.Column(db.String(150), nullable=False)                                               # 제목
     content = db.Column(db.Text, nullable=False)                                                    # 본문 내용
+    excerpt = db.Column(db.String(EXCERPT_LENGTH))                                                  # 목록 페이지용 본문 요약
+    listing_deferred_columns = ('content',)                                                         # 목록 조회 시 로드 X
+    search_columns = ('title', 'content')                                                           # 검색 인덱스 대상
     
     author_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_post_user', ondelete='CASCADE'), nullable=False)                
     user = db.relationship('User', back_populates='user_posts')             
         
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id', name='fk_post_category', ondelete='CASCADE'), nullable=False)   
+    category_id = column_property(                                                                  # active_history = 변경 전 카테고리 기록(통계 갱신용)
+        db.Column(db.Integer, db.ForeignKey('category.id', name='fk_post_category', ondelete='CASCADE'), nullable=False), active_history=True)
     category = db.relationship('Category', back_populates='category_posts')    
 
     comments_count = db.Column(db.Integer, default=0)
+    counter_columns = {'comments_count': ('comment', 'post_id')}
     post_comments = db.relationship('Comment', back_populates='post', cascade='delete, delete-orphan', lazy='dynamic')
     files = db.relationship('File', back_populates='post', cascade='delete, delete-orphan', lazy='dynamic')
+    # post 페이지용 첨부 파일 목록 = post 조회 시 JOIN 으로 같이 로드 (읽기 전용, 변경은 files 로)
+    attachments = db.relationship('File', viewonly=True, order_by='File.id')
+
+    @staticmethod
+    def make_excerpt(content):
+        '''
+        공백 정리 후 EXCERPT_LENGTH 글자 이하로 자르기
+        '''
+        excerpt = ' '.join((content or '').split())
+        if len(excerpt) > EXCERPT_LENGTH: excerpt = excerpt[:EXCERPT_LENGTH - 3] + '...'
+        return excerpt
+
+    @validates('content')
+    def validate_content(self, key, content):
+        # content 가 바뀔 때마다(views, admin 모두) excerpt 같이 갱신
+        self.excerpt = self.make_excerpt(content)
+        return content
+
+    def fill_none_fields(self):
+        if self.excerpt is None: self.excerpt = self.make_excerpt(self.content)
+        super().fill_none_fields()
+
+    @classmethod
+    def fill_none_columns(cls, ids=None):
+        # excerpt 는 python 으로 만들어야 하므로 NULL 인 행만 (id, content) 조회 후 executemany
+        super().fill_none_columns(ids)
+        stmt = select(cls.id, cls.content).where(cls.excerpt.is_(None))
+        if ids is not None: stmt = stmt.where(cls.id.in_(ids))
+        rows = db.session.execute(stmt).all()
+        if not rows: return
+        db.session.connection().execute(update(cls.__table__)
+            .where(cls.id == bindparam('_id')).values(excerpt=bindparam('_excerpt')),
+            [{'_id': id, '_excerpt': cls.make_excerpt(content)} for id, content in rows]
+        )
+        cls.commit()
+
+    def get_search_document(self):
+        return {'kind': 'post', 'ref_id': self.id, 'post_id': self.id, 'title': self.title, 'content': self.content}
 
     def update_count(self):
         self.comments_count = self.post_comments.count()
 
-    def before_new_flush(self):
-        self.user.posts_count += 1
+    # ---------------------- user 카운터 (원자적 SQL UPDATE) + category 통계 ----------------------
+    def after_new_flush(self, session):
+        self.get_user_model().increase_counts(session, self.author_id, posts_count=1)
+        self.get_category_model().add_post_stats(session, self)
+
+    def after_deleted_flush(self, session):
+        self.get_user_model().increase_counts(session, self.author_id, posts_count=-1)
+        self.get_category_model().remove_post_stats(session, self.category_id, self.id)
+
+    def after_dirty_flush(self, session):
+        history = inspect(self).attrs.category_id.history
+        if not history.has_changes(): return
+        category = self.get_category_model()
+        for old_category_id in history.deleted:
+            if old_category_id is not None: category.remove_post_stats(session, old_category_id, self.id)
+        category.add_post_stats(session, self)
+        category.update_latest_post(session, self.category_id)
+
+    @classmethod
+    def delete_all_by_ids(cls, ids):
+        # post + 하위 comment, file 일괄 삭제
+        from blog.api.models.cascade import CascadeDelete
+        return CascadeDelete.delete(post_ids=ids)
+
+    @staticmethod
+    def get_user_model():
+        from blog.api.models.user import User
+        return User
 
-    def before_deleted_flush(self):
-        self.user.posts_count -= 1
+    @staticmethod
+    def get_category_model():
+        from blog.api.models.category import Category
+        return Category
 
     def __repr__(self):
         return super().__repr__() + f'{self.title}'         
@@ -41,10 +122,10 @@ from blog.api.forms import PostForm
 
 class PostAdmin(AdminBase):
     # 1. 표시 할 열 설정
-    column_list = ('id', 'title', 'content', 'date_created', 
+    column_list = ('id', 'title', 'excerpt', 'date_created', 
         'user', 'category', 'comments_count')
     
-    # 2. 폼 데이터 설정
+    # 2. 폼 데이터 설정 (excerpt 는 content 로부터 자동 생성)
     form = PostForm
 
     # 3. 현재 사용자 아이디 모델에 추가하기
@@ -0,0 +1,129 @@
+import re
+from markupsafe import escape, Markup
+from sqlalchemy import text, table, column, select, delete
+from sqlalchemy.event import listens_for
+
+from blog.api.models import get_db
+
+db = get_db()
+
+SEARCH_PER_PAGE = 10
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'                                        # 하이라이트 구분자(본문에 나올 수 없는 제어 문자)
+
+class SearchIndex():
+    '''
+    SQLite FTS5 가상 테이블 기반 전문 검색 인덱스 (post 제목/본문, comment 본문)
+    rowid = 문서 종류 + id 로 결정 (post = id*2, comment = id*2+1) => rowid 로 바로 갱신, 삭제
+    after_flush 에서 변경된 Post, Comment 를 같은 트랜잭션 안에서 반영
+    '''
+    __tablename__ = 'search_index'
+    KINDS = {'post': 0, 'comment': 1}
+
+    @classmethod
+    def create_table(cls, connection):
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {cls.__tablename__} USING fts5("
+            "title, content, kind UNINDEXED, ref_id UNINDEXED, post_id UNINDEXED, "
+            "tokenize='unicode61')"
+        ))
+
+    @classmethod
+    def drop_table(cls, connection):
+        connection.execute(text(f'DROP TABLE IF EXISTS {cls.__tablename__}'))
+
+    @classmethod
+    def get_rowid(cls, kind, id):
+        return id * len(cls.KINDS) + cls.KINDS[kind]
+
+    # ---------------------- 인덱스 갱신 ----------------------
+    @classmethod
+    def sync(cls, connection, upserts, deletes):
+        '''
+        upserts = search_document() 리스트, deletes = (kind, id) 리스트
+        '''
+        for kind, id in deletes:
+            connection.execute(text(f'DELETE FROM {cls.__tablename__} WHERE rowid = :rowid'),
+                {'rowid': cls.get_rowid(kind, id)})
+        if upserts:
+            connection.execute(text(
+                f'INSERT OR REPLACE INTO {cls.__tablename__}(rowid, title, content, kind, ref_id, post_id) '
+                'VALUES (:rowid, :title, :content, :kind, :ref_id, :post_id)'
+            ), [dict(document, rowid=cls.get_rowid(document['kind'], document['ref_id'])) for document in upserts])
+
+    @classmethod
+    def delete_where(cls, connection, kind, id_column, condition):
+        '''
+        조건에 해당하는 문서 일괄 삭제 = DELETE ... WHERE rowid IN (SELECT id*2+kind ...)
+        '''
+        index = table(cls.__tablename__, column('rowid'))
+        connection.execute(delete(index).where(index.c.rowid.in_(
+            select(id_column * len(cls.KINDS) + cls.KINDS[kind]).where(condition)
+        )))
+
+    @classmethod
+    def rebuild(cls):
+        '''
+        post, comment 테이블로부터 인덱스 전체 재생성 (INSERT ... SELECT 로 일괄 처리)
+        '''
+        size = len(cls.KINDS)
+        connection = db.session.connection()
+        connection.execute(text(f'DELETE FROM {cls.__tablename__}'))
+        connection.execute(text(
+            f"INSERT INTO {cls.__tablename__}(rowid, title, content, kind, ref_id, post_id) "
+            f"SELECT id * {size} + {cls.KINDS['post']}, title, content, 'post', id, id FROM post"
+        ))
+        connection.execute(text(
+            f"INSERT INTO {cls.__tablename__}(rowid, title, content, kind, ref_id, post_id) "
+            f"SELECT id * {size} + {cls.KINDS['comment']}, '', content, 'comment', id, post_id FROM comment"
+        ))
+        connection.execute(text(f"INSERT INTO {cls.__tablename__}({cls.__tablename__}) VALUES ('optimize')"))
+        count = connection.execute(text(f'SELECT count(*) FROM {cls.__tablename__}')).scalar()
+        db.session.commit()
+        return count
+
+    # ---------------------- 검색 ----------------------
+    @staticmethod
+    def make_match_query(q):
+        '''
+        사용자 입력을 FTS5 문법 오류가 나지 않도록 단어별 prefix 검색으로 변환
+        예) 플라스크 블로그 => "플라스크"* "블로그"*  (AND 검색)
+        '''
+        words = re.findall(r'\w+', q or '')
+        return ' '.join(f'"{word}"*' for word in words)
+
+    @staticmethod
+    def highlight(snippet):
+        # 본문은 escape 한 뒤 하이라이트 구분자만 <mark> 로 변환
+        return Markup(str(escape(snippet)).replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>'))
+
+    @classmethod
+    def search(cls, q, page=1, per_page=SEARCH_PER_PAGE):
+        '''
+        bm25 점수순(제목 가중치 10배) 결과 + 하이라이트 snippet
+        per_page + 1개를 조회해서 다음 페이지 존재 여부 확인
+        반환 = (결과 dict 리스트, 다음 페이지 존재 여부)
+        '''
+        match_query = cls.make_match_query(q)
+        if not match_query: return [], False
+
+        rows = db.session.execute(text(
+            f"SELECT kind, ref_id, post_id, "
+            f"snippet({cls.__tablename__}, -1, :start, :end, '...', 16) AS snippet "
+            f"FROM {cls.__tablename__} WHERE {cls.__tablename__} MATCH :q "
+            f"ORDER BY bm25({cls.__tablename__}, 10.0, 1.0) LIMIT :limit OFFSET :offset"
+        ), {
+            'q': match_query, 'start': SNIPPET_START, 'end': SNIPPET_END,
+            'limit': per_page + 1, 'offset': (page - 1) * per_page,
+        }).mappings().all()
+
+        results = [dict(row, snippet=cls.highlight(row['snippet'])) for row in rows[:per_page]]
+        return results, len(rows) > per_page
+
+# db.create_all(), db.drop_all() 시 가상 테이블도 같이 생성, 삭제
+@listens_for(db.metadata, 'after_create')
+def create_search_index(target, connection, **kwargs):
+    SearchIndex.create_table(connection)
+
+@listens_for(db.metadata, 'after_drop')
+def drop_search_index(target, connection, **kwargs):
+    SearchIndex.drop_table(connection)
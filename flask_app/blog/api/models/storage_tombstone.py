@@ -0,0 +1,206 @@
+import time
+from datetime import timedelta
+from secrets import token_hex
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, update, delete, bindparam, or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.event import listens_for
+
+from blog.api.utils.etc import Etc
+from blog.api.models.base import BaseModel
+from blog.api.models import get_db
+
+db = get_db()
+
+DRAIN_BATCH_SIZE = 1000                                                             # 1번에 처리할 key 수 = s3 delete_objects 최대 key 수
+DRAIN_LEASE_SECONDS = 5 * 60                                                        # 저장소 삭제 최대 시간((connect 5초 + read 30초) x 3번)보다 길게
+DRAIN_WAIT_SECONDS = 0.2
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+class StorageTombstone(BaseModel):
+    '''
+    삭제할 저장소 객체 목록 (durable 삭제 큐)
+    1. file, blob 삭제 = 같은 트랜잭션에서 key 만 기록 => 삭제 commit 은 저장소 네트워크 호출을 기다리지 않음
+    2. drain = 1000개씩 배치 삭제(delete_objects), 성공한 key 만 행 삭제
+       실패한 key = attempts 증가 + 지수 backoff 후 다시 시도 (last_error 에 마지막 에러)
+    3. drain 은 저장소 호출 전에 행을 lease (claim_token + next_attempt_at = lease 만료 시간) 후 commit
+       => 저장소 삭제 중에는 트랜잭션(SQLite 쓰기 lock)을 잡지 않음
+       lease 할 때 blob 행이 있는 key(썸네일 포함) = 다시 참조되는 내용이므로 저장소에서 삭제하지 않고 행만 삭제
+       confirm 대기 중인 직접 업로드 발급(UploadTicket)의 내용 = 업로드 중일 수 있으므로 lease 하지 않고 다음 drain 에서 다시 확인
+    4. 같은 내용을 다시 올리는 요청 = blob 참조를 먼저 잡고 같은 트랜잭션에서 삭제 예약 취소(cancel) + commit
+       lease 중(삭제 진행 중)인 key 는 취소 X => 삭제가 끝날 때까지 기다린 뒤(wait_for_drain) 다시 올림
+    commit 후 바로 백그라운드 drain + 남은 행은 scheduler 가 주기적으로 drain
+    '''
+    __tablename__ = 'storage_tombstone'
+    __table_args__ = (
+        db.Index('ix_storage_tombstone_next_attempt', 'next_attempt_at'),
+    )
+    key = db.Column(db.String(200), unique=True, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)                         # 다음 시도 시간 / lease 중이면 lease 만료 시간
+    last_error = db.Column(db.String(500), nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True)                          # lease 한 drain (끝나면 None)
+
+    drain_executor = None                                                           # commit 후 drain 스레드 (worker 프로세스 당 1개)
+    drain_lock = Lock()
+
+    @classmethod
+    def add(cls, session, keys):
+        '''
+        삭제 예약 = 현재 트랜잭션에 INSERT (rollback 되면 같이 취소), 이미 예약된 key 는 무시
+        '''
+        keys = sorted({key for key in keys if key})
+        if not keys: return
+        stmt = insert(cls.__table__).values(key=bindparam('_key'), attempts=0, date_created=Etc.get_korea_time())
+        session.connection().execute(stmt.on_conflict_do_nothing(index_elements=[cls.key]), [{'_key': key} for key in keys])
+        session.info['storage_tombstones_added'] = True
+
+    @classmethod
+    def cancel(cls, session, keys):
+        '''
+        같은 내용을 다시 올리기 전 삭제 예약 취소 = 현재 트랜잭션에서 DELETE, 저장소에 올리기 전에 commit 해야 함
+        lease 중인 행은 취소 X, 반환 = lease 중(저장소 삭제 진행 중)인 key => 삭제가 끝난 뒤 올려야 함
+        (DELETE 가 쓰기 lock 을 잡은 뒤 조회 = 그 사이 새로 lease 되는 행 X)
+        '''
+        keys = sorted({key for key in keys if key})
+        if not keys: return set()
+        now = cls.now()
+        connection = session.connection()
+        connection.execute(delete(cls.__table__).where(cls.key.in_(keys), ~cls.is_leased(now)))
+        return set(connection.execute(select(cls.key).where(cls.key.in_(keys))).scalars())
+
+    @classmethod
+    def wait_for_drain(cls, keys):
+        '''
+        lease 중인 key 의 저장소 삭제가 끝날 때까지 대기 => 예약 취소 + commit
+        drain 이 끝나면(행 삭제, 재시도 예약) 또는 lease 가 만료되면 취소 가능 = 그 뒤에 올린 객체는 삭제되지 않음
+        '''
+        keys = set(keys)
+        while keys:
+            time.sleep(DRAIN_WAIT_SECONDS)
+            keys = cls.cancel(db.session, keys)
+            cls.commit()
+
+    @staticmethod
+    def now():
+        # DB 에 저장된 시간과 비교 (SQLite DateTime = timezone 없음)
+        return Etc.get_korea_time().replace(tzinfo=None)
+
+    @classmethod
+    def is_due(cls, now):
+        return or_(cls.next_attempt_at.is_(None), cls.next_attempt_at <= now)
+
+    @classmethod
+    def is_leased(cls, now):
+        return cls.claim_token.is_not(None) & (cls.next_attempt_at > now)
+
+    @classmethod
+    def get_retry_delay(cls, attempts):
+        return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+    @classmethod
+    def drain(cls, batch_size=DRAIN_BATCH_SIZE, max_batches=None, lease_seconds=DRAIN_LEASE_SECONDS):
+        '''
+        시도할 시간이 된 tombstone 을 batch_size 씩 저장소에서 삭제
+        lease + commit => 저장소 삭제(트랜잭션 X) => lease 가 그대로인 행만 결과 반영 + commit
+        반환 = (삭제된 key 수, 실패한 key 수)
+        '''
+        from blog.api.utils.storage import Storage
+        storage = Storage.get()
+        deleted = failed = batches = 0
+        last_id = 0
+        while max_batches is None or batches < max_batches:
+            ids = db.session.execute(select(cls.id)
+                .where(cls.id > last_id, cls.is_due(cls.now()))
+                .order_by(cls.id).limit(batch_size)).scalars().all()
+            if not ids: break
+            batches += 1
+            last_id = ids[-1]
+
+            token, rows = cls.lease(ids, lease_seconds)
+            errors = storage.delete([row.key for row in rows]) if rows else {}
+            cls.finish(token, rows, errors)
+            deleted += len(rows) - len(errors)
+            failed += len(errors)
+            if len(ids) < batch_size: break
+        return deleted, failed
+
+    @classmethod
+    def lease(cls, ids, lease_seconds):
+        '''
+        ids 중 아직 시도할 시간인 행을 lease + commit, 반환 = (claim_token, 저장소에서 삭제할 행)
+        lease 한 트랜잭션 안에서 확인 (쓰기 lock) = 취소된 예약 제외, 다시 참조되는 내용(blob 존재) = 행만 삭제,
+        confirm 대기 중인 발급의 내용 = lease 해제 (다음 drain 에서 다시 확인)
+        '''
+        from blog.api.models.blob import Blob
+        from blog.api.models.upload_ticket import UploadTicket
+        now, token = cls.now(), token_hex(16)
+        connection = db.session.connection()
+        connection.execute(update(cls.__table__)
+            .where(cls.id.in_(ids), cls.is_due(now))
+            .values(claim_token=token, next_attempt_at=now + timedelta(seconds=lease_seconds)))
+        rows = connection.execute(select(cls.id, cls.key, cls.attempts).where(cls.claim_token == token).order_by(cls.id)).all()
+        digests = {row.key[:64] for row in rows}
+        existing = Blob.get_existing(digests)
+        uploading = UploadTicket.get_live_digests(digests) - existing
+        kept = [row.id for row in rows if row.key[:64] in existing]
+        waiting = [row.id for row in rows if row.key[:64] in uploading]
+        if kept: connection.execute(delete(cls.__table__).where(cls.id.in_(kept)))
+        if waiting: connection.execute(update(cls.__table__).where(cls.id.in_(waiting)).values(claim_token=None, next_attempt_at=None))
+        cls.commit()
+        return token, [row for row in rows if row.key[:64] not in existing and row.key[:64] not in uploading]
+
+    @classmethod
+    def finish(cls, token, rows, errors):
+        '''
+        저장소 삭제 결과 반영 = 성공한 행 삭제, 실패한 행은 lease 해제 + 재시도 예약
+        '''
+        if not rows: return
+        now = cls.now()
+        done = [row.id for row in rows if row.key not in errors]
+        retries = [row for row in rows if row.key in errors]
+        connection = db.session.connection()
+        if done: connection.execute(delete(cls.__table__).where(cls.id.in_(done), cls.claim_token == token))
+        if retries:
+            connection.execute(update(cls.__table__)
+                .where(cls.id == bindparam('_id'), cls.claim_token == token)
+                .values(attempts=bindparam('_attempts'), next_attempt_at=bindparam('_next'), last_error=bindparam('_error'),
+                    claim_token=None),
+                [{'_id': row.id, '_attempts': row.attempts + 1, '_next': now + cls.get_retry_delay(row.attempts + 1),
+                  '_error': str(errors[row.key])[:500]} for row in retries]
+            )
+        cls.commit()
+
+    @classmethod
+    def drain_in_background(cls, app):
+        with cls.drain_lock:
+            if cls.drain_executor is None:
+                cls.drain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage-drain')
+        cls.drain_executor.submit(cls.run_drain, app)
+
+    @classmethod
+    def run_drain(cls, app):
+        with app.app_context():
+            try:
+                cls.drain()
+            except Exception:
+                app.logger.exception('저장소 삭제 예약 drain 실패')
+            finally:
+                db.session.remove()
+
+    def __repr__(self):
+        return super().__repr__() + f'{self.key} ({self.attempts})'
+
+    def __str__(self):
+        return super().__str__() + f'{self.key} ({self.attempts})'
+
+@listens_for(db.session, 'after_commit')
+def drain_storage_tombstones(session):
+    # 삭제가 commit 된 뒤 요청과 별개로 저장소 정리 시작
+    if session.info.pop('storage_tombstones_added', False) and Etc.app.config.get('STORAGE_DRAIN_AFTER_COMMIT', True):
+        StorageTombstone.drain_in_background(Etc.app)
+
+@listens_for(db.session, 'after_soft_rollback')
+def discard_storage_tombstones(session, previous_transaction):
+    session.info.pop('storage_tombstones_added', None)
@@ -0,0 +1,102 @@
+from sqlalchemy import select, update, and_, func, bindparam
+from sqlalchemy.dialects.sqlite import insert
+
+from blog.api.utils.etc import Etc
+from blog.api.models.base import BaseModel
+from blog.api.models import get_db
+
+db = get_db()
+
+FILE_UPLOAD_LIMIT = 5 * 1024 * 1024
+class UploadQuota(BaseModel):
+    '''
+    일일 파일 업로드 할당량 장부 = (user, 날짜) 마다 1행
+    used = 업로드 완료된 용량, reserved = 업로드 진행 중(예약)인 용량
+    1. reserve = 업로드 전 예약, used + reserved + 요청 용량 <= FILE_UPLOAD_LIMIT 일 때만 성공 (UPSERT 1번, 원자적)
+    2. commit = 업로드 끝난 뒤 예약 해제 + 실제 업로드된 용량만 used 에 반영
+    3. release = 업로드 실패 시 예약만 해제
+    날짜가 바뀌면 새 행을 사용하므로 자정 초기화 작업 필요 X
+    '''
+    __tablename__ = 'upload_quota'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', name='uq_upload_quota_user_day'),
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_upload_quota_user', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    used = db.Column(db.Float, default=0.0, nullable=False)
+    reserved = db.Column(db.Float, default=0.0, nullable=False)
+
+    @staticmethod
+    def get_today():
+        return Etc.get_korea_time().date()
+
+    @classmethod
+    def get_used(cls, user_id, day=None):
+        # 오늘 사용(+ 예약)한 용량
+        row = db.session.execute(select(cls.used + cls.reserved)
+            .where(cls.user_id == user_id, cls.day == (day or cls.get_today()))).scalar()
+        return row or 0.0
+
+    @classmethod
+    def get_remaining(cls, user_id):
+        return max(FILE_UPLOAD_LIMIT - cls.get_used(user_id), 0.0)
+
+    @classmethod
+    def reserve(cls, user_id, size):
+        '''
+        size 만큼 예약, 성공 시 예약한 날짜 반환(commit, release 에 사용) / 할당량 초과 시 None
+        조건 검사 + 증가를 UPSERT 1문장으로 처리 = 동시 요청이 같이 통과할 수 없음
+        '''
+        if size > FILE_UPLOAD_LIMIT: return None
+        day = cls.get_today()
+        stmt = insert(cls.__table__).values(
+            user_id=user_id, day=day, used=0.0, reserved=size,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.user_id, cls.day],
+            set_={'reserved': cls.__table__.c.reserved + stmt.excluded.reserved},
+            where=cls.__table__.c.used + cls.__table__.c.reserved + stmt.excluded.reserved <= FILE_UPLOAD_LIMIT,
+        )
+        reserved = db.session.connection().execute(stmt).rowcount == 1
+        # 다른 worker 도 예약을 볼 수 있도록 바로 commit
+        cls.commit()
+        return day if reserved else None
+
+    @classmethod
+    def commit_reservation(cls, user_id, day, reserved_size, used_size):
+        cls.update_reservation(user_id, day, reserved=cls.get_released(reserved_size), used=cls.used + used_size)
+
+    @classmethod
+    def release(cls, user_id, day, reserved_size):
+        cls.update_reservation(user_id, day, reserved=cls.get_released(reserved_size))
+
+    @classmethod
+    def release_many(cls, session, reservations):
+        '''
+        reservations = [(user_id, 날짜, 예약 용량)] => executemany UPDATE 1번으로 예약 해제 (commit 은 호출한 쪽 트랜잭션에서)
+        '''
+        if not reservations: return
+        session.connection().execute(update(cls.__table__)
+            .where(and_(cls.user_id == bindparam('_user_id'), cls.day == bindparam('_day')))
+            .values(reserved=cls.get_released(bindparam('_reserved'))),
+            [{'_user_id': user_id, '_day': day, '_reserved': size} for user_id, day, size in reservations]
+        )
+
+    @classmethod
+    def get_released(cls, reserved_size):
+        # 같은 예약이 두 번 정산되어도 음수(= 추가 할당량)가 되지 않도록
+        return func.max(cls.reserved - reserved_size, 0.0)
+
+    @classmethod
+    def update_reservation(cls, user_id, day, **values):
+        db.session.connection().execute(update(cls.__table__)
+            .where(and_(cls.user_id == user_id, cls.day == day))
+            .values(**values)
+        )
+        cls.commit()
+
+    def __repr__(self):
+        return super().__repr__() + f'user {self.user_id} {self.day}: {self.used} (+{self.reserved})'
+
+    def __str__(self):
+        return super().__str__() + f'user {self.user_id} {self.day}: {self.used} (+{self.reserved})'
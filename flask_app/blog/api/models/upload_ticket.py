@@ -0,0 +1,121 @@
+from datetime import timedelta
+from secrets import token_hex
+from sqlalchemy import select, update, delete, or_
+
+from blog.api.utils.etc import Etc
+from blog.api.models.base import BaseModel
+from blog.api.models import get_db
+
+db = get_db()
+
+UPLOAD_TOKEN_MAX_AGE = 24 * 60 * 60                                                 # 예약은 날짜 단위이므로 하루 안에만 confirm 가능
+EXPIRE_BATCH_SIZE = 500
+class UploadTicket(BaseModel):
+    '''
+    브라우저 직접 업로드 발급 기록 (presigned POST 토큰 1개 = 1행)
+    1. 발급 = nonce, 예약한 할당량, 새로 올릴 digest 저장 (토큰에는 nonce 만, 예약 정보는 서버에)
+    2. confirm = nonce 가 아직 사용되지 않았고 post 가 같을 때만 UPDATE 1번으로 사용 처리 => 할당량 정산은 1번만
+       (같은 토큰을 다른 post 에 다시 보내도 정산 X)
+    3. UPLOAD_TOKEN_MAX_AGE 가 지난 행 정리 = confirm 되지 않은 발급은 예약 해제 + 올라간 저장소 객체 삭제 예약
+    '''
+    __tablename__ = 'upload_ticket'
+    __table_args__ = (
+        db.Index('ix_upload_ticket_date_created', 'date_created'),
+    )
+    nonce = db.Column(db.String(32), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_upload_ticket_user', ondelete='CASCADE'), nullable=False)
+    post_id = db.Column(db.Integer, nullable=True)                                  # 발급 시 post 가 없으면(작성 중) confirm 할 때 정해짐
+    day = db.Column(db.Date, nullable=False)
+    reserved = db.Column(db.Float, default=0.0, nullable=False)
+    digests = db.Column(db.Text, default='', nullable=False)                        # 새로 올릴 digest 목록 (공백 구분)
+    confirmed_at = db.Column(db.DateTime, nullable=True)
+
+    @staticmethod
+    def now():
+        # DB 에 저장된 시간과 비교 (SQLite DateTime = timezone 없음)
+        return Etc.get_korea_time().replace(tzinfo=None)
+
+    @classmethod
+    def issue(cls, user_id, post_id, day, reserved, digests):
+        '''
+        발급 기록 추가 + commit, 반환 = nonce
+        '''
+        nonce = token_hex(16)
+        db.session.execute(db.insert(cls.__table__).values(
+            nonce=nonce, user_id=user_id, post_id=post_id, day=day, reserved=reserved,
+            digests=' '.join(sorted(digests)), date_created=cls.now(),
+        ))
+        cls.commit()
+        return nonce
+
+    @classmethod
+    def consume(cls, nonce, user_id, post_id):
+        '''
+        사용 처리 = 조건 검사 + 변경을 UPDATE 1문장으로 (동시에 같은 토큰을 보내도 1요청만 성공, rowcount 로 확인)
+        commit X = 호출한 쪽이 같은 트랜잭션에서 참조, 삭제 예약 취소까지 commit (File.take_refs)
+        => ticket 이 confirm 된 뒤 참조를 잡기 전에 drain 이 올라간 내용을 지우지 않음
+        반환 = (예약 날짜, 예약 용량) / 이미 사용, 만료, 다른 사용자, 다른 post 면 None
+        '''
+        ticket = cls.__table__.c
+        consumed = db.session.execute(update(cls.__table__)
+            .where(ticket.nonce == nonce, ticket.user_id == user_id, ticket.confirmed_at.is_(None),
+                or_(ticket.post_id.is_(None), ticket.post_id == post_id))
+            .values(post_id=post_id, confirmed_at=cls.now())).rowcount == 1
+        if not consumed: return None
+        # UPDATE ... RETURNING = SQLite 3.35 이상 => 같은 트랜잭션(쓰기 lock 유지)에서 다시 조회
+        result = db.session.execute(select(ticket.day, ticket.reserved).where(ticket.nonce == nonce)).first()
+        return result.day, result.reserved
+
+    @classmethod
+    def get_live_digests(cls, digests=None, max_age=UPLOAD_TOKEN_MAX_AGE):
+        '''
+        만료 전, confirm 전 발급의 digest = 브라우저가 아직 올리는 중일 수 있는 내용
+        digests 지정 시 그 중에서만 (StorageTombstone.drain)
+        '''
+        cutoff = cls.now() - timedelta(seconds=max_age)
+        live = {digest for value in db.session.execute(select(cls.digests)
+            .where(cls.date_created >= cutoff, cls.confirmed_at.is_(None))).scalars() for digest in value.split()}
+        return live if digests is None else live & set(digests)
+
+    @classmethod
+    def expire(cls, max_age=UPLOAD_TOKEN_MAX_AGE, batch_size=EXPIRE_BATCH_SIZE):
+        '''
+        max_age 가 지난 발급 기록 정리 (토큰도 만료되어 더 이상 confirm 불가)
+        confirm 되지 않은 발급 = 예약 해제 + 올라갔을 수 있는 객체 삭제 예약
+        (drain 시 blob 이 있는 내용 = 다른 file 이 참조 중이므로 유지, confirm 대기 중인 다른 발급의 digest 는 제외)
+        반환 = 정리한 confirm 되지 않은 발급 수
+        '''
+        from blog.api.models.upload_quota import UploadQuota
+        from blog.api.models.storage_tombstone import StorageTombstone
+        expired = 0
+        while True:
+            cutoff = cls.now() - timedelta(seconds=max_age)
+            rows = db.session.execute(select(cls.id, cls.user_id, cls.day, cls.reserved, cls.digests, cls.confirmed_at)
+                .where(cls.date_created < cutoff).order_by(cls.id).limit(batch_size)).all()
+            if not rows: break
+            pending = [row for row in rows if row.confirmed_at is None]
+            if pending:
+                live = cls.get_live_digests(max_age=max_age)
+                UploadQuota.release_many(db.session, [(row.user_id, row.day, row.reserved) for row in pending if row.reserved])
+                StorageTombstone.add(db.session, {digest for row in pending for digest in row.digests.split()} - live)
+            db.session.execute(delete(cls.__table__).where(cls.id.in_([row.id for row in rows])))
+            cls.commit()
+            expired += len(pending)
+            if len(rows) < batch_size: break
+        return expired
+
+    @classmethod
+    def run_expire(cls, app):
+        with app.app_context():
+            try:
+                cls.expire()
+            except Exception:
+                app.logger.exception('업로드 발급 기록 정리 실패')
+            finally:
+                db.session.remove()
+
+    def __repr__(self):
+        return super().__repr__() + f'user {self.user_id} post {self.post_id} ({self.nonce})'
+
+    def __str__(self):
+        return super().__str__() + f'user {self.user_id} post {self.post_id} ({self.nonce})'
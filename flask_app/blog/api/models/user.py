@@ -1,18 +1,24 @@
-from flask_login import UserMixin
+from flask import g
+from flask_login import UserMixin, logout_user
+from sqlalchemy.exc import InvalidRequestError
 from werkzeug.security import generate_password_hash, check_password_hash
 from random import randint
 
 from blog.api.utils.etc import Msg
+from blog.api.utils.error import Error
+from blog.api.utils.query import QueryCounter
 from blog.api.models import get_db
-from blog.api.models.base import BaseModel
+from blog.api.models.base import BaseModel, ObjectCache
+from blog.api.models.cache_tag import CacheTag
 from blog.api.models.file import File
+from blog.api.models.upload_quota import UploadQuota
 
 db = get_db()
 
-FILE_UPLOAD_LIMIT = 5 * 1024 * 1024
 # flask-login 사용하기 위해 UserMixin 상속
 class User(BaseModel, UserMixin):
     __tablename__ = 'user'                                                          
+    object_cache = True
     username = db.Column(db.String(150), unique=True)                               # username unique
     email = db.Column(db.String(150), unique=True)                                  # email unique
     password = db.Column(db.String(150))                                            # password 
@@ -27,7 +33,11 @@ class User(BaseModel, UserMixin):
     user_messages = db.relationship('Message', back_populates='user', cascade='delete, delete-orphan', lazy='dynamic')     
 
     files = db.relationship('File', back_populates='user', cascade='delete, delete-orphan', lazy='dynamic')
-    file_upload_limit = db.Column(db.Float, default=0.0)
+    upload_quotas = db.relationship('UploadQuota', cascade='delete, delete-orphan', lazy='dynamic')
+
+    counter_columns = {'posts_count': ('post', 'author_id'), 'comments_count': ('comment', 'author_id')}
+    # 카운터는 목록/게시글 페이지에 출력되지 않거나 post, comment 변경으로 무효화 됨
+    cache_ignored_columns = ('posts_count', 'comments_count')
 
     def __init__(self, password, **kwargs):
         self.set_password(password)
@@ -61,6 +71,56 @@ class User(BaseModel, UserMixin):
         self.posts_count = self.user_posts.count()
         self.comments_count = self.user_comments.count()
     
+    @classmethod
+    def delete_all_by_ids(cls, ids):
+        # user + 작성한 post, comment, file, message 일괄 삭제
+        from blog.api.models.cascade import CascadeDelete
+        return CascadeDelete.delete(user_ids=ids)
+
+    # ---------------------- session user 관련 ----------------------
+    @classmethod
+    def get_session_user(cls, id):
+        '''
+        flask-login user_loader 용
+        ObjectCache 스냅샷 사용 = 로그인 사용자의 페이지 요청마다 발생하던 user 쿼리 X
+        User 변경(update_instance, 카운터, admin) 시 flush 에서 버전 스탬프가 올라가고 스냅샷 무효화
+        다른 worker 의 변경(권한 수정, 삭제) = 스냅샷의 CacheTag 'user:<id>' 버전과 비교해서 바뀌었으면 다시 조회
+        => 스냅샷 사용 시 쿼리 1번(태그 버전 조회, overhead_queries)
+        '''
+        load = lambda: cls.get_query(id)
+        # 권한 확인(refresh_permission)에서 갱신한 스냅샷에도 같은 버전 사용 = 요청당 태그 버전 조회 1번
+        g.session_user_tag_version = cls.get_tag_version(id)
+        instance = ObjectCache.get_or_load(cls, cls.get_cache_key(id), load, g.session_user_tag_version)
+        cls.instance_check(instance)
+        return instance
+
+    @classmethod
+    def get_tag_version(cls, id):
+        # 스냅샷 검증용 CacheTag 버전 (ObjectCache 사용 X = 조회 X)
+        if not ObjectCache.enabled(cls): return None
+        tag = f'{cls.__tablename__}:{id}'
+        with QueryCounter.overhead_queries():
+            return CacheTag.get_versions([tag])[tag]
+
+    def refresh_permission(self):
+        '''
+        권한 확인이 필요한 요청에서만 DB 최신 값으로 갱신 = 다른 worker 에서 변경된 권한도 즉시 반영
+        admin 메뉴처럼 한 요청에서 여러 번 확인하는 경우를 위해 요청당 1번만 갱신
+        '''
+        if g.get('permission_refreshed'): return self
+        g.permission_refreshed = True
+        version = ObjectCache.get_version(self.__class__)
+        tag_version = g.get('session_user_tag_version')
+        try:
+            db.session.refresh(self)
+        except InvalidRequestError:
+            # 스냅샷을 불러온 뒤 다른 worker 에서 삭제된 사용자 = 로그아웃 + 401
+            ObjectCache.invalidate(self.get_cache_tag())
+            logout_user()
+            Error.error(401)
+        ObjectCache.set(self.__class__, self.get_cache_key(self.id), self, version, tag_version)
+        return self
+
     def have_create_permission(self):
         return self.create_permission
     
@@ -68,43 +128,32 @@ class User(BaseModel, UserMixin):
         return self.admin_check
     
     # ---------------------- file 관련 ----------------------
-    @classmethod
-    def reset_all_limit(cls):
-        cls.query_with().update({'file_upload_limit': 0.0})
-        cls.commit()
-
     def get_limit(self):
-        if self.can_upload():
-            return FILE_UPLOAD_LIMIT - self.file_upload_limit
-        else:
-            return 0.0
-    
-    def can_upload(self):
-        return self.file_upload_limit < FILE_UPLOAD_LIMIT
-    
-    def update_limit(self, upload_size):
-        self.file_upload_limit += upload_size
-        self.commit()
+        # 오늘 남은 업로드 할당량 (UploadQuota 장부 기준)
+        return UploadQuota.get_remaining(self.id)
 
     def upload_files(self, files, post_id):
         '''
         파일들 객체 생성 + s3에 업로드 + 일일 할당량 업데이트
+        업로드 전 전체 용량 예약 => 업로드 후 새로 저장된 용량만 반영 (실패, 이미 있는 내용의 파일 용량은 반환)
         '''
-        if self.get_limit() < sum(file.getbuffer().nbytes for file in files):
-            Msg.error_msg('일일 파일 업로드 할당량을 초과하였습니다.')
-            files = None
-
         if not files or not files[0]: return
 
+        user_id = self.id                                                           # commit 마다 사용자를 다시 로드하지 않도록
+        reserved_size = sum(File.get_file_size(file) for file in files)
+        day = UploadQuota.reserve(user_id, reserved_size)
+        if day is None:
+            Msg.error_msg('일일 파일 업로드 할당량을 초과하였습니다.')
+            return
+
         upload_size = 0.0
-        for file in files:
-            try:
-                upload_size += File.upload_to_s3(file, post_id, self.id)
-            except Exception as e:
-                Msg.error_msg(str(e) + f'{file.filename} upload 실패')
-
-        if upload_size == 0.0: return
-        self.update_limit(upload_size)
+        try:
+            upload_size, failures = File.upload_files(files, post_id, user_id)
+            for filename, error in failures:
+                Msg.error_msg(error + f'{filename} upload 실패')
+        finally:
+            if upload_size: UploadQuota.commit_reservation(user_id, day, reserved_size, upload_size)
+            else: UploadQuota.release(user_id, day, reserved_size)
     
     def __repr__(self):
         return super().__repr__() + f'{self.username}'         
@@ -123,7 +172,7 @@ class UserAdmin(AdminBase):
     # 1. 표시 할 열 설정
     column_list = ('id', 'username', 'email', 
         'create_permission', 'admin_check', 'posts_count', 'comments_count', 
-        'auth_type', 'file_upload_limit',
+        'auth_type',
     )
 
     # 2. 폼 데이터 설정
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock
+import time
+
+from flask import Response, g, has_request_context, make_response, request, session
+from flask_login import current_user
+
+from blog.api.utils.query import QueryCounter
+
+class PageCache():
+    '''
+    비로그인 사용자용 전체 페이지 응답 캐시 (worker 프로세스 단위 메모리 캐시)
+    key = 요청 url(쿼리스트링 포함)
+    렌더링 중 불러온 인스턴스들의 태그 + 데코레이터로 지정한 테이블 태그를 저장하고,
+    캐시 조회 시 CacheTag 버전과 비교해서 하나라도 바뀌었으면 다시 렌더링
+    => 캐시 히트 시 쿼리 1번(태그 버전 조회)
+    태그 버전 조회 = QueryCounter.overhead_queries (view 의 query budget 에서 제외)
+    '''
+    entries = OrderedDict()
+    lock = Lock()
+    key_locks = {}                                          # key -> [Lock, 사용 중인 요청 수]
+
+    @classmethod
+    def init_app(cls, app):
+        cls.app = app
+        cls.config = app.config
+        cls.clear()
+
+    @classmethod
+    def enabled(cls):
+        return cls.config.get('PAGE_CACHE_ENABLED', False)
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.entries.clear()
+
+    @staticmethod
+    def cacheable():
+        # 로그인 사용자, flash 메세지가 남아있는 요청은 사용자마다 화면이 다름
+        return request.method == 'GET' and not current_user.is_authenticated and not session.get('_flashes')
+
+    @classmethod
+    def cached(cls, *table_tags):
+        '''
+        table_tags = 해당 테이블에 행이 추가, 삭제되면 무효화 (목록 페이지 용)
+        '''
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if not cls.enabled() or not cls.cacheable(): return f(*args, **kwargs)
+
+                key = request.full_path
+                response = cls.get(key)
+                if response is not None: return response
+
+                # single-flight = 같은 key는 한 요청만 렌더링, 나머지는 기다렸다가 캐시 사용
+                with cls.key_lock(key):
+                    response = cls.get(key)
+                    if response is not None: return response
+
+                    try:
+                        global_version = cls.get_global_version()
+                        g.page_cache_tags = set(table_tags)
+                        response = make_response(f(*args, **kwargs))
+                        tags = g.pop('page_cache_tags')
+                        if response.status_code == 200: cls.set(key, response, tags, global_version)
+                        return response
+                    finally:
+                        g.pop('page_cache_tags', None)
+            return decorated_function
+        return decorator
+
+    @staticmethod
+    def rendering():
+        # 캐시할 페이지를 렌더링 중인지 = 결과가 모든 비로그인 사용자에게 공유됨
+        return has_request_context() and 'page_cache_tags' in g
+
+    @classmethod
+    def add_tags(cls, *tags):
+        if cls.rendering():
+            g.page_cache_tags.update(tags)
+
+    @classmethod
+    @contextmanager
+    def key_lock(cls, key):
+        # 기다리는 요청까지 같은 Lock 을 쓰도록 참조 수를 세고, 마지막 요청이 끝날 때만 삭제
+        with cls.lock:
+            entry = cls.key_locks.setdefault(key, [Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with cls.lock:
+                entry[1] -= 1
+                if not entry[1]: cls.key_locks.pop(key, None)
+
+    @staticmethod
+    def get_versions(tags):
+        from blog.api.models.get import get_model
+        with QueryCounter.overhead_queries():
+            return get_model('cache_tag').get_versions(tags)
+
+    @classmethod
+    def get_global_version(cls):
+        from blog.api.models.get import get_model
+        global_tag = get_model('cache_tag').GLOBAL_TAG
+        return cls.get_versions([global_tag])[global_tag]
+
+    @classmethod
+    def get(cls, key):
+        with cls.lock:
+            entry = cls.entries.get(key)
+            if entry: cls.entries.move_to_end(key)
+        if not entry: return None
+        if entry['expire_time'] < time.time() or \
+            cls.get_versions(list(entry['versions'])) != entry['versions']:
+            cls.delete(key)
+            return None
+        return Response(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+
+    @classmethod
+    def set(cls, key, response, tags, global_version):
+        from blog.api.models.get import get_model
+        global_tag = get_model('cache_tag').GLOBAL_TAG
+        versions = cls.get_versions([global_tag, *sorted(tags)])
+
+        # 렌더링 도중 다른 요청이 변경사항을 commit 했으면 렌더링 결과와 버전이 어긋날 수 있으므로 저장 X
+        if versions.pop(global_tag) != global_version: return
+
+        entry = {
+            'body': response.get_data(),
+            'status': response.status_code,
+            'mimetype': response.mimetype,
+            'versions': versions,
+            'expire_time': time.time() + cls.config.get('PAGE_CACHE_TIMEOUT', 60),
+        }
+        with cls.lock:
+            cls.entries[key] = entry
+            cls.entries.move_to_end(key)
+            while len(cls.entries) > cls.config.get('PAGE_CACHE_MAX_ENTRIES', 500):
+                cls.entries.popitem(last=False)
+
+    @classmethod
+    def delete(cls, key):
+        with cls.lock:
+            cls.entries.pop(key, None)
@@ -4,6 +4,7 @@ from functools import wraps
 
 from blog.api.utils.etc import Msg
 from blog.api.utils.error import Error
+from blog.api.utils.query import QueryCounter, StrictLoading
 
 class Deco():
     @staticmethod
@@ -11,7 +12,7 @@ class Deco():
         @wraps(f)
         @login_required
         def decorated_function(*args, **kwargs):
-            if not current_user.have_admin_check(): return Error.error(403)
+            if not current_user.refresh_permission().have_admin_check(): return Error.error(403)
             return f(*args, **kwargs)
         return decorated_function
 
@@ -30,7 +31,7 @@ class Deco():
         @wraps(f)
         @login_required
         def decorated_function(*args, **kwargs):
-            if not current_user.have_create_permission(): return Error.error(403)
+            if not current_user.refresh_permission().have_create_permission(): return Error.error(403)
             return f(*args, **kwargs)
         return decorated_function
 
@@ -39,13 +40,33 @@ class Deco():
         @wraps(f)
         @login_required
         def decorated_function(*args, **kwargs):
-            if current_user.have_create_permission(): 
+            if current_user.refresh_permission().have_create_permission(): 
                 Msg.error_msg('이미 인증된 사용자입니다.')
                 return redirect(url_for('views.home'))
             return f(*args, **kwargs)
         return decorated_function
 
+    @staticmethod
+    def query_budget(max_queries):
+        '''
+        view 실행(인증 확인, 템플릿 렌더링 포함) 중 SQL 실행 수 예산
+        페이지 캐시 자체 쿼리(태그 버전 조회) = 제외 => 캐시 사용 여부와 관계없이 같은 예산
+        초과 = 경고 로그 (개발 모드 = 에러), 테스트 = TestBase.assert_query_budget 으로 확인
+        '''
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                with QueryCounter.measure(exclude_overhead=True) as stats:
+                    response = f(*args, **kwargs)
+                QueryCounter.check_budget(f.__name__, stats, max_queries)
+                return response
+            decorated_function.query_budget = max_queries
+            return decorated_function
+        return decorator
+
     @staticmethod
     def render_template_with_user(**context):
         context['user'] = current_user
-        return render_template(**context)
\ No newline at end of file
+        # strict 모드 = 렌더링 중 relationship lazy load 금지 (StrictLoading)
+        with StrictLoading.rendering(context['template_name_or_list']):
+            return render_template(**context)
\ No newline at end of file
@@ -1,8 +1,10 @@
 import time
 from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
 from random import randint
+from threading import Event, Lock, Thread
+from smtplib import SMTP, SMTPException, SMTPServerDisconnected, SMTPResponseException, SMTPRecipientsRefused, SMTPAuthenticationError
 from flask_login import current_user
-import asyncio
 
 class Email():
     @classmethod
@@ -13,46 +15,46 @@ class Email():
 
     @classmethod
     def send_mail(cls):
+        '''
+        otp 이메일 = outbox 에 저장 후 바로 반환 (전송은 MailSender 가 백그라운드에서)
+        '''
         otp = str(randint(100000, 999999))
-        msg = MIMEText(f'MyBlog 회원가입 \n인증번호를 입력하여 이메일 인증을 완료해 주세요.\n인증번호 :{otp}')
-        msg['Subject'] = '[MyBlog 이메일 인증]'
-
-        asyncio.gather(cls.smtp_send_mail_async(msg))
+        cls.enqueue([{
+            'kind': 'otp',
+            'recipient': current_user.email,
+            'subject': '[MyBlog 이메일 인증]',
+            'body': f'MyBlog 회원가입 \n인증번호를 입력하여 이메일 인증을 완료해 주세요.\n인증번호 :{otp}',
+        }])
         print('otp 이메일 전송 요청 완료!')
 
         cls.session[f'otp_{current_user.email}'] = otp  # 세션에 인증번호 저장
         cls.session[f'time_{current_user.email}'] = int(time.time()) + cls.config['MAIL_LIMIT_TIME']  # 인증번호 제한 시간
 
     @classmethod
-    async def smtp_send_mail_async(cls, msg):
-        from smtplib import SMTP
-        config = cls.config
-        smtp = SMTP(host=config['MAIL_SERVER'], port=config['MAIL_PORT'])
-        await smtp.starttls() # TLS 암호화 보안 연결 설정
-        await smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
-        await smtp.sendmail(config['MAIL_USERNAME'], current_user.email, msg.as_string())
-        smtp.quit()
-        print('otp 이메일 전송 처리 완료!')
+    def enqueue(cls, messages):
+        '''
+        messages = [{'kind', 'recipient', 'subject', 'body'}] => outbox 저장 + commit 후 sender 깨우기
+        '''
+        from blog.api.models import get_db
+        from blog.api.models.get import get_model
+        db = get_db()
+        get_model('email_outbox').add(db.session, messages)
+        db.session.commit()
+        MailSender.wake(cls.app)
 
     @classmethod
     def delete_error_email(cls, app):
-        with app.app_context():
-            asyncio.gather(cls.imap_delete_error_mail())
-            print('쌓인 에러 메세지 삭제 요청 완료!')
-
-    @classmethod
-    async def imap_delete_error_mail(cls):
         from imaplib import IMAP4_SSL
-        config = cls.config
+        config = app.config
         imap = IMAP4_SSL('imap.gmail.com')
-        await imap.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
-        await imap.select('inbox')
-        status, email_ids = await imap.search(None, '(FROM "mailer-daemon@googlemail.com")')
+        imap.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        imap.select('inbox')
+        status, email_ids = imap.search(None, '(FROM "mailer-daemon@googlemail.com")')
         if status == 'OK':
             email_ids = email_ids[0].split()
             for email_id in email_ids:
-                await imap.store(email_id, '+FLAGS', '\\Deleted')
-        await imap.expunge() # deleted 플래그 모두 삭제
+                imap.store(email_id, '+FLAGS', '\\Deleted')
+        imap.expunge() # deleted 플래그 모두 삭제
 
         imap.close() # 세션 종료
         imap.logout() # 연결 해제
@@ -84,4 +86,150 @@ class Email():
     def get_remain_time(cls):
         session_time = cls.get_time()
         if not session_time: return None
-        return session_time - int(time.time())
\ No newline at end of file
+        return session_time - int(time.time())
+class SmtpConnection():
+    '''
+    재사용하는 SMTP 연결 1개 (sender 스레드 당 1개)
+    메세지마다 connect + starttls + login 하지 않고 한 번 연 연결로 계속 전송
+    오래 쉰 연결은 NOOP 으로 확인 후 사용, 서버가 끊은 연결은 다시 열어서 1번 더 전송
+    '''
+    def __init__(self, config):
+        self.config = config
+        self.smtp = None
+        self.last_used = 0
+
+    def open(self):
+        config = self.config
+        smtp = SMTP(host=config['MAIL_SERVER'], port=config['MAIL_PORT'], timeout=config.get('MAIL_TIMEOUT', 10))
+        try:
+            if config.get('MAIL_USE_TLS', True): smtp.starttls() # TLS 암호화 보안 연결 설정
+            if config.get('MAIL_PASSWORD'): smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        except Exception:
+            smtp.close()
+            raise
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.smtp is None: return
+        try:
+            self.smtp.quit()
+        except Exception:
+            self.smtp.close()
+        self.smtp = None
+
+    def close_if_idle(self):
+        if self.smtp is not None and time.monotonic() - self.last_used > self.config.get('MAIL_SMTP_IDLE_SECONDS', 60):
+            self.close()
+
+    def get(self):
+        if self.smtp is not None and time.monotonic() - self.last_used > self.config.get('MAIL_SMTP_NOOP_AFTER_SECONDS', 10):
+            try:
+                alive = self.smtp.noop()[0] == 250
+            except (SMTPException, OSError):
+                alive = False
+            if not alive: self.close()
+        if self.smtp is None: self.open()
+        return self.smtp
+
+    def send(self, recipient, subject, body):
+        sender = self.config['MAIL_USERNAME']
+        msg = MIMEText(body, 'plain', 'utf-8')
+        msg['Subject'] = subject
+        msg['From'] = sender
+        msg['To'] = recipient
+        msg['Date'] = formatdate(localtime=True)
+        msg['Message-ID'] = make_msgid()
+        for retry in (False, True):
+            smtp = self.get()
+            try:
+                smtp.sendmail(sender, recipient, msg.as_string())
+                self.last_used = time.monotonic()
+                return
+            except SMTPServerDisconnected:
+                self.close()
+                if retry: raise
+            except SMTPException:
+                raise                                                               # 응답 에러 = 연결은 그대로 사용
+            except OSError:
+                self.close()
+                raise
+
+class MailSender():
+    '''
+    email outbox 전송 worker (worker 프로세스 당 MAIL_SENDER_THREADS 개 스레드)
+    1. 스레드마다 SMTP 연결 1개 유지 (SmtpConnection)
+    2. outbox 에서 MAIL_BATCH_SIZE 개씩 claim => 같은 연결로 전송 => 결과를 한 번에 기록
+    3. 보낼 메세지가 없으면 wake(enqueue, scheduler) 또는 MAIL_SENDER_POLL_SECONDS 까지 대기
+    연결 자체가 실패하면(접속, 로그인, 끊김) 남은 메세지는 전송 시도 없이 같은 에러로 재시도 예약
+    '''
+    threads = []
+    wake_event = Event()
+    lock = Lock()
+
+    @staticmethod
+    def enabled(config):
+        return config.get('MAIL_SENDER_ENABLED', True)
+
+    @classmethod
+    def start(cls, app):
+        if not cls.enabled(app.config): return
+        with cls.lock:
+            cls.threads = [thread for thread in cls.threads if thread.is_alive()]
+            for i in range(len(cls.threads), app.config.get('MAIL_SENDER_THREADS', 2)):
+                thread = Thread(target=cls.run, args=(app,), name=f'mail-sender-{i}', daemon=True)
+                thread.start()
+                cls.threads.append(thread)
+
+    @classmethod
+    def wake(cls, app):
+        cls.start(app)
+        cls.wake_event.set()
+
+    @classmethod
+    def run(cls, app):
+        connection = SmtpConnection(app.config)
+        while True:
+            try:
+                sent = cls.send_batch(app, connection)
+            except Exception:
+                app.logger.exception('email outbox 전송 실패')
+                sent = 0
+            if sent: continue
+            connection.close_if_idle()
+            if cls.wake_event.wait(timeout=app.config.get('MAIL_SENDER_POLL_SECONDS', 30)):
+                cls.wake_event.clear()
+
+    @staticmethod
+    def is_permanent(e):
+        # 5xx 응답 = 다시 보내도 실패 (수신 거부 등), 로그인 실패는 설정 문제라 재시도
+        if isinstance(e, SMTPRecipientsRefused):
+            return all(code >= 500 for code, _ in e.recipients.values())
+        return isinstance(e, SMTPResponseException) and e.smtp_code >= 500 and not isinstance(e, SMTPAuthenticationError)
+
+    @classmethod
+    def send_batch(cls, app, connection):
+        '''
+        claim 한 메세지 batch 전송, 반환 = 처리한 메세지 수
+        '''
+        from blog.api.models import get_db
+        from blog.api.models.get import get_model
+        EmailOutbox, db = get_model('email_outbox'), get_db()
+        config = app.config
+        with app.app_context():
+            try:
+                rows = EmailOutbox.claim(config.get('MAIL_BATCH_SIZE', 50), config.get('MAIL_CLAIM_LEASE_SECONDS', 300))
+                if not rows: return 0
+                errors = {}
+                for i, row in enumerate(rows):
+                    try:
+                        connection.send(row.recipient, row.subject, row.body)
+                    except Exception as e:
+                        errors[row.id] = (str(e) or type(e).__name__, cls.is_permanent(e))
+                        if connection.smtp is None:
+                            for rest in rows[i + 1:]: errors[rest.id] = (errors[row.id][0], False)
+                            break
+                EmailOutbox.record(rows, errors, config.get('MAIL_MAX_ATTEMPTS', 5))
+                return len(rows)
+            finally:
+                db.session.remove()
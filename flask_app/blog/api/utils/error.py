@@ -32,6 +32,11 @@ class Error():
             Msg.error_msg('허용되지 않은 HTTP 메소드입니다.')
             return redirect(url_for('views.home'))
 
+        @app.errorhandler(413)
+        def handle_request_entity_too_large_error(e):
+            Msg.error_msg('업로드 용량이 남은 일일 할당량 또는 최대 요청 크기를 초과하였습니다.')
+            return redirect(url_for('views.home'))
+
         @app.errorhandler(500)
         def handle_internal_server_error(e):
             Msg.error_msg('서버에서 오류가 발생했습니다.')
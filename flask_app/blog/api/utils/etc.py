@@ -51,24 +51,41 @@ class Etc():
     @classmethod
     def generate_download_urls(cls, files):
         if not files or not files[0]: return
-        config = cls.config
-        s3, s3_bucket_name = config['S3'], config['S3_BUCKET_NAME']
-        s3_default_dir = config['S3_DEFAULT_DIRS'][config['mode']]
+        from blog.api.utils.storage import Storage
+        storage = Storage.get()
+        return [storage.get_download_url(file.key, file.name) for file in files]
 
-        download_urls = []
-        for file in files:
-            presigned_url = s3.generate_presigned_url(
-                ClientMethod='get_object',
-                Params={
-                    'Bucket': s3_bucket_name,
-                    'Key': s3_default_dir + file.name
-                },
-                ExpiresIn=3600,
-            )
-            download_urls.append(presigned_url)
-        
-        return download_urls
+    @classmethod
+    def generate_attachments(cls, files):
+        '''
+        post 페이지 첨부 파일 = 원본 다운로드 url + 썸네일이 생성된 이미지는 썸네일 url(srcset), 크기, 흐린 미리보기
+        '''
+        if not files or not files[0]: return []
+        from blog.api.utils.storage import Storage
+        from blog.api.utils.thumbnail import Thumbnail
+        storage = Storage.get()
+        attachments = []
+        for file, url in zip(files, cls.generate_download_urls(files)):
+            attachment = {'name': file.name, 'url': url, 'thumbnails': []}
+            blob = file.blob
+            if blob is not None and blob.thumbnail_status == 'done':
+                attachment.update(width=blob.width, height=blob.height, preview=blob.preview, thumbnails=[
+                    (width, storage.get_download_url(Thumbnail.get_key(blob.digest, width)))
+                    for width in blob.get_thumbnail_widths()
+                ])
+            attachments.append(attachment)
+        return attachments
     
+    @staticmethod
+    def get_page_args():
+        '''
+        keyset pagination 쿼리스트링(cursor, direction) 추출
+        '''
+        return dict(
+            cursor=request.args.get('cursor'),
+            direction=request.args.get('direction', 'next'),
+        )
+
     @staticmethod
     def is_owner(id):
         return id == current_user.id
\ No newline at end of file
@@ -0,0 +1,175 @@
+from time import perf_counter
+from contextvars import ContextVar
+from contextlib import contextmanager
+from flask import g, request
+from sqlalchemy import event
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+class QueryStats():
+    '''
+    측정 범위(요청, query_budget view) 안에서 실행된 SQL 통계
+    exclude_overhead = QueryCounter.overhead_queries() 안의 SQL(페이지 캐시 태그 버전 조회 등)은 세지 않음
+    '''
+    def __init__(self, exclude_overhead=False):
+        self.exclude_overhead = exclude_overhead
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+
+    def add(self, statement, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed >= self.slowest:
+            self.slowest = elapsed
+            self.slowest_statement = ' '.join(statement.split())[:200]
+
+    def as_dict(self):
+        return {
+            'sql_count': self.count,
+            'sql_time_ms': round(self.total * 1000, 2),
+            'sql_slowest_ms': round(self.slowest * 1000, 2),
+            'sql_slowest': self.slowest_statement,
+        }
+
+class QueryCounter():
+    '''
+    SQL 실행 수, 시간 측정 (engine cursor 이벤트)
+    1. 측정 범위 = contextvar 에 QueryStats 를 쌓음 => 요청 스레드에서 실행된 SQL 만 (백그라운드 스레드 X), 중첩 가능
+    2. 요청 범위 (SQL_STATS_MODES) = 응답 헤더 X-SQL-* + 로그 필드
+    3. Deco.query_budget(n) = view 실행 중 SQL 이 n 개를 넘으면 경고 로그, QUERY_BUDGET_RAISE_MODES 에서는 에러
+       결과는 X-SQL-Budget, X-SQL-Budget-Count 헤더로 테스트에서 확인 (TestBase.assert_query_budget)
+       페이지 캐시 자체 쿼리(overhead_queries) = 예산에서 제외, 요청 범위(X-SQL-Count)에는 포함
+    '''
+    active = ContextVar('query_stats', default=())
+    overhead = ContextVar('query_overhead', default=False)
+
+    @classmethod
+    def init_app(cls, app, engine):
+        cls.app = app
+        cls.config = app.config
+        event.listen(engine, 'before_cursor_execute', cls.before_execute)
+        event.listen(engine, 'after_cursor_execute', cls.after_execute)
+        if cls.stats_enabled():
+            app.before_request(cls.start_request)
+            app.after_request(cls.finish_request)
+            app.teardown_request(cls.teardown_request)
+
+    @classmethod
+    def stats_enabled(cls):
+        return cls.config['mode'] in cls.config.get('SQL_STATS_MODES', ())
+
+    @classmethod
+    def before_execute(cls, conn, cursor, statement, parameters, context, executemany):
+        if cls.active.get(): conn.info.setdefault('query_start', []).append(perf_counter())
+
+    @classmethod
+    def after_execute(cls, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start')
+        if not starts: return
+        elapsed = perf_counter() - starts.pop()
+        overhead = cls.overhead.get()
+        for stats in cls.active.get():
+            if overhead and stats.exclude_overhead: continue
+            stats.add(statement, elapsed)
+
+    @classmethod
+    @contextmanager
+    def measure(cls, exclude_overhead=False):
+        stats = QueryStats(exclude_overhead)
+        token = cls.active.set(cls.active.get() + (stats,))
+        try:
+            yield stats
+        finally:
+            cls.active.reset(token)
+
+    @classmethod
+    @contextmanager
+    def overhead_queries(cls):
+        # view 가 아닌 인프라(페이지 캐시 등)가 실행하는 SQL = query budget 에서 제외
+        token = cls.overhead.set(True)
+        try:
+            yield
+        finally:
+            cls.overhead.reset(token)
+
+    # ------------------------------------------ 요청 범위 ------------------------------------------
+    @classmethod
+    def start_request(cls):
+        g.query_stats = QueryStats()
+        g.query_stats_token = cls.active.set(cls.active.get() + (g.query_stats,))
+
+    @classmethod
+    def finish_request(cls, response):
+        stats = g.get('query_stats')
+        if stats is None: return response
+        fields = stats.as_dict()
+        response.headers['X-SQL-Count'] = str(fields['sql_count'])
+        response.headers['X-SQL-Time-Ms'] = str(fields['sql_time_ms'])
+        response.headers['X-SQL-Slowest-Ms'] = str(fields['sql_slowest_ms'])
+        budget = g.get('query_budget')
+        if budget:
+            response.headers['X-SQL-Budget'] = str(budget[0])
+            response.headers['X-SQL-Budget-Count'] = str(budget[1])
+        cls.app.logger.info('%s %s %s', request.method, request.path,
+            ' '.join(f'{key}={value}' for key, value in fields.items() if key != 'sql_slowest'),
+            extra=fields)
+        return response
+
+    @classmethod
+    def teardown_request(cls, exception=None):
+        token = g.pop('query_stats_token', None)
+        if token is not None: cls.active.reset(token)
+
+    # ------------------------------------------ query budget ------------------------------------------
+    @classmethod
+    def check_budget(cls, name, stats, max_queries):
+        # 중첩된 budget view 는 가장 바깥 결과만 헤더에 남김
+        g.query_budget = (max_queries, stats.count)
+        if stats.count <= max_queries: return
+        message = f'{name}: 쿼리 {stats.count}번 > 예산 {max_queries}번 (가장 느린 쿼리: {stats.slowest_statement})'
+        cls.app.logger.warning(message)
+        if cls.config['mode'] in cls.config.get('QUERY_BUDGET_RAISE_MODES', ()):
+            raise QueryBudgetExceeded(message)
+
+class StrictLoadingError(Exception):
+    pass
+
+class StrictLoading():
+    '''
+    N+1 방지 strict 모드 (STRICT_LOADING_MODES = 개발, 테스트)
+    템플릿 렌더링(Deco.render_template_with_user) 중 relationship lazy load = SQL 실행 전에 에러
+    => 행마다 post.user 등을 읽는 템플릿은 조회할 때 로드 옵션(get_all_with('user') 등)이 있어야 함
+    joinedload, selectinload, identity map 에서 찾는 many-to-one (SQL X) 은 허용
+    에러 = 500 응답 + X-Strict-Loading-Error 헤더 (view, 템플릿, relationship)
+    '''
+    template = ContextVar('strict_loading_template', default=None)
+
+    @classmethod
+    def init_app(cls, app, session):
+        if app.config['mode'] not in app.config.get('STRICT_LOADING_MODES', ()): return
+        if not event.contains(session, 'do_orm_execute', cls.check_lazy_load):
+            event.listen(session, 'do_orm_execute', cls.check_lazy_load)
+
+        @app.errorhandler(StrictLoadingError)
+        def handle_strict_loading_error(e):
+            app.logger.error(str(e))
+            return str(e), 500, {'X-Strict-Loading-Error': str(e).encode('unicode_escape').decode('ascii')}
+
+    @classmethod
+    @contextmanager
+    def rendering(cls, template_name):
+        token = cls.template.set(template_name)
+        try:
+            yield
+        finally:
+            cls.template.reset(token)
+
+    @classmethod
+    def check_lazy_load(cls, orm_execute_state):
+        template = cls.template.get()
+        if template is None or orm_execute_state.lazy_loaded_from is None: return
+        relationship = orm_execute_state.loader_strategy_path[-1]
+        raise StrictLoadingError(f'{request.endpoint}: {template} 렌더링 중 {relationship} lazy load (N+1), 조회할 때 로드 옵션에 추가하세요')
@@ -0,0 +1,98 @@
+from threading import Lock
+from sqlalchemy import event
+
+READ_STATEMENTS = {'SELECT', 'PRAGMA', 'EXPLAIN', 'SAVEPOINT', 'RELEASE', 'ROLLBACK'}
+
+class SqliteProfile():
+    '''
+    여러 gunicorn worker 가 SQLite 파일 1개를 같이 쓸 때 engine 설정 (db_migrate_setup 에서 적용)
+    1. 연결마다 pragma = WAL(읽기가 쓰기를 기다리지 않음), busy_timeout(쓰기 lock 을 바로 실패 대신 대기),
+       synchronous=NORMAL(WAL 에서 commit 마다 fsync X), cache_size, mmap_size, temp_store
+    2. pool = worker 당 스레드(요청, scheduler, 메일, 썸네일 등) 수에 맞춘 pool_size, max_overflow
+    3. write lane (선택) = 같은 프로세스의 쓰기 트랜잭션은 첫 쓰기 ~ commit/rollback 동안 lock 보유
+       => 프로세스 안의 writer 는 SQLite busy handler 의 sleep 재시도 대신 순서대로 대기
+       lock 을 SQLITE_WRITE_LANE_TIMEOUT 안에 못 얻으면 lane 없이 진행 (busy_timeout 으로 대기)
+    '''
+    @staticmethod
+    def is_file_database(uri):
+        return uri.startswith('sqlite') and ':memory:' not in uri and uri.rstrip('/') not in ('sqlite:', 'sqlite+pysqlite:')
+
+    @classmethod
+    def enabled(cls, config):
+        return config.get('SQLITE_PROFILE_ENABLED', False) and cls.is_file_database(config.get('SQLALCHEMY_DATABASE_URI', ''))
+
+    @classmethod
+    def set_engine_options(cls, config):
+        '''
+        db.init_app 전에 호출 = pool, 연결 옵션 (설정에 직접 지정한 값이 우선)
+        '''
+        if not cls.enabled(config): return
+        options = {
+            'pool_size': config.get('SQLITE_POOL_SIZE', 5),
+            'max_overflow': config.get('SQLITE_MAX_OVERFLOW', 5),
+            'pool_timeout': config.get('SQLITE_POOL_TIMEOUT', 30),
+            # sqlite3.connect timeout = 연결 시점 busy handler (pragma busy_timeout 과 같은 값)
+            'connect_args': {'timeout': cls.get_pragmas(config).get('busy_timeout', 5000) / 1000},
+        }
+        options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    @staticmethod
+    def get_pragmas(config):
+        return config.get('SQLITE_PRAGMAS') or {}
+
+    @classmethod
+    def apply(cls, engine, config):
+        '''
+        db.init_app 후, 첫 연결 전에 호출 = 연결마다 pragma + write lane 이벤트 등록
+        '''
+        pragmas = list(cls.get_pragmas(config).items())
+
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+
+        if config.get('SQLITE_WRITE_LANE', False):
+            cls.add_write_lane(engine, config.get('SQLITE_WRITE_LANE_TIMEOUT', 30))
+
+    @staticmethod
+    def is_write(statement):
+        words = statement.lstrip().split(None, 1)
+        return bool(words) and words[0].upper() not in READ_STATEMENTS
+
+    @classmethod
+    def add_write_lane(cls, engine, timeout):
+        lane = Lock()
+
+        def release(info):
+            if info.pop('write_lane', False): lane.release()
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def enter_lane(conn, cursor, statement, parameters, context, executemany):
+            # 트랜잭션의 첫 쓰기 = lane 대기 (이미 보유 중이면 그대로)
+            if 'write_lane' in conn.info or not cls.is_write(statement): return
+            conn.info['write_lane'] = lane.acquire(timeout=timeout)
+
+        # commit 이벤트 = 실제 COMMIT 직전, 다음 writer 는 COMMIT 이 끝날 때까지만 busy_timeout 으로 대기
+        @event.listens_for(engine, 'commit')
+        def leave_lane_on_commit(conn):
+            release(conn.info)
+
+        @event.listens_for(engine, 'rollback')
+        def leave_lane_on_rollback(conn):
+            release(conn.info)
+
+        # commit/rollback 없이 pool 로 돌아가거나 버려진 연결
+        @event.listens_for(engine, 'reset')
+        def leave_lane_on_reset(dbapi_connection, connection_record, reset_state):
+            release(connection_record.info)
+
+        @event.listens_for(engine, 'invalidate')
+        def leave_lane_on_invalidate(dbapi_connection, connection_record, exception):
+            release(connection_record.info)
+
+        engine.write_lane = lane
+        return lane
@@ -0,0 +1,322 @@
+import os
+import shutil
+from base64 import b64encode
+from hashlib import sha256
+import time
+import unicodedata
+from urllib.parse import quote
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from collections import OrderedDict
+from abc import ABC, abstractmethod
+
+from flask import url_for, send_file, make_response
+from itsdangerous import URLSafeTimedSerializer, BadData
+
+S3_DELETE_BATCH_SIZE = 1000                                                         # delete_objects 1번 최대 key 수
+
+class Storage(ABC):
+    '''
+    첨부 파일 저장소 = mode 별로 STORAGE_BACKENDS 에 지정한 구현체 사용
+    key = file 테이블의 name (저장소별 경로, prefix 는 구현체가 붙임)
+    put, open(읽기), delete, presign(다운로드 url), presign_post(브라우저 직접 업로드), head(크기), list
+    '''
+    backend = None
+
+    @classmethod
+    def init_app(cls, app):
+        config = app.config
+        backend = config.get('STORAGE_BACKENDS', {}).get(config['mode'], 's3')
+        cls.backend = BACKENDS[backend](app)
+
+    @classmethod
+    def get(cls):
+        return cls.backend
+
+    def __init__(self, app):
+        config = app.config
+        self.url_cache = PresignedUrlCache(
+            expires_in=config.get('S3_URL_EXPIRATION_SECONDS', 300),
+            refresh_margin=config.get('PRESIGNED_URL_REFRESH_MARGIN', 90),
+            max_entries=config.get('PRESIGNED_URL_CACHE_MAX_ENTRIES', 5000),
+        )
+
+    def get_download_url(self, key, filename=None):
+        '''
+        다운로드 url = 만료 전까지 재사용 (PresignedUrlCache)
+        '''
+        return self.url_cache.get_or_sign(self, key, filename)
+
+    # ---------------------- 구현체 인터페이스 (전부 구현해야 인스턴스 생성 가능) ----------------------
+    prefix = ''
+
+    @abstractmethod
+    def put(self, key, file, transfer_config=None):
+        pass
+
+    @abstractmethod
+    def open(self, key):
+        pass
+
+    @abstractmethod
+    def delete(self, keys):
+        '''
+        여러 key 일괄 삭제, 예외 X
+        반환 = {실패한 key: 에러 메세지} (없는 key 는 성공)
+        '''
+
+    @abstractmethod
+    def presign(self, key, expires_in, filename=None):
+        '''
+        filename = 다운로드 시 파일 이름 (key 는 digest 이므로)
+        '''
+
+    @abstractmethod
+    def presign_post(self, key, max_size, expires_in, digest=None):
+        '''
+        반환 = {'url', 'fields'} => fields + file 을 multipart POST 하면 업로드
+        max_size 보다 크거나 SHA-256 이 digest 와 다르면 거절
+        '''
+
+    @abstractmethod
+    def head(self, key):
+        '''
+        저장된 객체 크기, 없으면 None
+        '''
+
+    @abstractmethod
+    def list(self, prefix=''):
+        pass
+
+class S3Storage(Storage):
+    '''
+    S3 저장소 (config 의 S3 client 사용), key 앞에 mode 별 S3_DEFAULT_DIRS 를 붙여서 저장
+    '''
+    def __init__(self, app):
+        super().__init__(app)
+        config = app.config
+        self.client = config['S3']
+        self.bucket = config['S3_BUCKET_NAME']
+        self.prefix = config['S3_DEFAULT_DIRS'][config['mode']]
+
+    def put(self, key, file, transfer_config=None):
+        self.client.upload_fileobj(file, self.bucket, self.prefix + key, Config=transfer_config)
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)['Body']
+
+    def delete(self, keys):
+        errors = {}
+        for i in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            batch = keys[i:i + S3_DELETE_BATCH_SIZE]
+            try:
+                # Quiet = 실패한 key 만 응답(Errors)에 포함
+                response = self.client.delete_objects(Bucket=self.bucket,
+                    Delete={'Objects': [{'Key': self.prefix + key} for key in batch], 'Quiet': True})
+            except Exception as e:
+                errors.update(dict.fromkeys(batch, str(e)))
+                continue
+            for error in response.get('Errors', []):
+                errors[error['Key'][len(self.prefix):]] = f"{error.get('Code')}: {error.get('Message')}"
+        return errors
+
+    def presign(self, key, expires_in, filename=None):
+        params = {'Bucket': self.bucket, 'Key': self.prefix + key}
+        if filename: params['ResponseContentDisposition'] = f'inline; filename="{filename}"'
+        return self.client.generate_presigned_url(
+            ClientMethod='get_object',
+            Params=params,
+            ExpiresIn=expires_in,
+        )
+
+    def presign_post(self, key, max_size, expires_in, digest=None):
+        fields, conditions = {}, [['content-length-range', 1, max_size]]
+        if digest:
+            # s3 가 받은 내용의 SHA-256 을 확인 = 다른 내용이 digest key 로 저장되지 않음
+            fields['x-amz-checksum-sha256'] = b64encode(bytes.fromhex(digest)).decode()
+            conditions.append({'x-amz-checksum-sha256': fields['x-amz-checksum-sha256']})
+        presigned = self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=self.prefix + key,
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=expires_in,
+        )
+        return {'url': presigned['url'], 'fields': presigned['fields']}
+
+    def head(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)['ContentLength']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'): return None
+            raise
+
+    def list(self, prefix=''):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            for item in page.get('Contents', []):
+                yield item['Key'][len(self.prefix):]
+
+class LocalStorage(Storage):
+    '''
+    로컬 디스크 저장소 (LOCAL_STORAGE_DIR/mode)
+    다운로드 = 서명된 url(views.file_download) => LOCAL_STORAGE_ACCEL_PREFIX 가 있으면 X-Accel-Redirect 로 nginx 가
+    sendfile + Range 처리 (app worker 는 헤더만 반환), 없으면(개발 서버) send_file 로 직접 전송
+    브라우저 직접 업로드 = 서명된 policy 로 views.file_upload_local 에 POST (S3 presigned POST 대체)
+    '''
+    def __init__(self, app):
+        super().__init__(app)
+        config = app.config
+        self.root = os.path.join(config['LOCAL_STORAGE_DIR'], config['mode'])
+        self.accel_prefix = config.get('LOCAL_STORAGE_ACCEL_PREFIX')
+        self.serializer = URLSafeTimedSerializer(app.secret_key, salt='local-storage')
+        os.makedirs(self.root, exist_ok=True)
+
+    def get_path(self, key):
+        # key 에 경로 구분자가 들어와도 root 밖으로 나가지 않도록
+        path = os.path.realpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.realpath(self.root) + os.sep): raise ValueError(f'잘못된 key: {key}')
+        return path
+
+    def put(self, key, file, transfer_config=None):
+        # 임시 파일에 복사 후 rename = 쓰는 도중 다른 요청이 반쯤 쓰인 파일을 보지 않음
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as temp:
+            shutil.copyfileobj(file, temp)
+        os.replace(temp.name, path)
+
+    def open(self, key):
+        return open(self.get_path(key), 'rb')
+
+    def delete(self, keys):
+        errors = {}
+        for key in keys:
+            try:
+                os.remove(self.get_path(key))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                errors[key] = str(e)
+        return errors
+
+    def presign(self, key, expires_in, filename=None):
+        token = self.serializer.dumps({'key': key, 'filename': filename, 'expires_in': expires_in})
+        return url_for('views.file_download', token=token)
+
+    def presign_post(self, key, max_size, expires_in, digest=None):
+        policy = self.serializer.dumps({'key': key, 'max_size': max_size, 'sha256': digest, 'expires_in': expires_in})
+        return {'url': url_for('views.file_upload_local'), 'fields': {'key': key, 'policy': policy}}
+
+    def head(self, key):
+        try:
+            return os.path.getsize(self.get_path(key))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def list(self, prefix=''):
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                key = os.path.relpath(os.path.join(directory, name), self.root)
+                if key.startswith(prefix): yield key
+
+    # ---------------------- 서명 확인 (views) ----------------------
+    def load_token(self, token):
+        '''
+        다운로드 url, 업로드 policy 확인 = 만료 시간 안에서만 유효, 실패 시 None
+        '''
+        try:
+            data = self.serializer.loads(token)
+            return self.serializer.loads(token, max_age=data['expires_in'])
+        except (BadData, KeyError, TypeError):
+            return None
+
+    def make_download_response(self, key, filename=None):
+        path = self.get_path(key)
+        if not os.path.exists(path): return None
+        if self.accel_prefix:
+            # nginx internal location 으로 넘김 = sendfile, Range 처리는 nginx
+            response = make_response('')
+            response.headers['X-Accel-Redirect'] = f'{self.accel_prefix}{os.path.basename(self.root)}/{key}'
+            response.headers['Content-Type'] = ''
+            response.headers.set('Content-Disposition', 'inline', **self.get_filename_options(filename or key))
+            return response
+        return send_file(path, conditional=True, download_name=filename or key)
+
+    @staticmethod
+    def get_filename_options(filename):
+        '''
+        send_file(download_name) 과 같은 Content-Disposition filename 옵션
+        ASCII 가 아닌 이름 = ASCII 로 바꾼 filename + RFC 5987 로 인코딩한 filename* (UTF-8 원래 이름)
+        '''
+        try:
+            filename.encode('ascii')
+            return {'filename': filename}
+        except UnicodeEncodeError:
+            simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+            return {'filename': simple, 'filename*': "UTF-8''" + quote(filename, safe="!#$&+-.^_`|~")}
+
+    def save_upload(self, key, file, max_size, digest=None):
+        '''
+        S3 content-length-range, checksum 과 같게 max_size 보다 크거나 SHA-256 이 다른 파일은 저장 X
+        '''
+        size = file.seek(0, 2)
+        file.seek(0)
+        if size < 1 or size > max_size: return False
+        if digest and self.get_digest(file) != digest: return False
+        self.put(key, file)
+        return True
+
+    @staticmethod
+    def get_digest(file):
+        # 업로드 요청 본문을 읽으면서 계산한 digest 가 있으면 사용 (QuotaSpooledFile)
+        hasher = getattr(file, 'sha256', None)
+        if hasher is None:
+            hasher = sha256()
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                hasher.update(chunk)
+            file.seek(0)
+        return hasher.hexdigest()
+
+class PresignedUrlCache():
+    '''
+    (key, 파일 이름) -> 서명된 다운로드 url (worker 프로세스 단위, LRU)
+    key 는 내용 digest 이므로 같은 key 의 url 은 만료 전까지 계속 유효 => 무효화 X
+    남은 시간이 refresh_margin 보다 적으면 새로 서명 = 캐시된 페이지(PAGE_CACHE_TIMEOUT) 안의 url 도 만료되지 않음
+    '''
+    def __init__(self, expires_in, refresh_margin, max_entries):
+        self.expires_in = expires_in
+        self.refresh_margin = min(refresh_margin, expires_in // 2)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_sign(self, storage, key, filename=None):
+        cache_key = (key, filename)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry and entry[1] - now > self.refresh_margin:
+                self.entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        url = storage.presign(key, self.expires_in, filename)
+        with self.lock:
+            self.entries[cache_key] = (url, now + self.expires_in)
+            self.entries.move_to_end(cache_key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return url
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+BACKENDS = {
+    's3': S3Storage,
+    'local': LocalStorage,
+}
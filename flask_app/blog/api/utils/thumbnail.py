@@ -0,0 +1,152 @@
+from io import BytesIO
+from os.path import splitext
+from base64 import b64encode
+from threading import Lock
+from multiprocessing import get_context, get_all_start_methods
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageFilter, ImageOps
+except ImportError:                                                                 # Pillow 가 없으면 썸네일 생성 X (원본 다운로드만)
+    Image = None
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp'}
+
+def make_thumbnails(data, widths, quality, preview_size, max_pixels):
+    '''
+    process pool 에서 실행 (serving worker 의 GIL 밖)
+    반환 = {'width', 'height', 'thumbnails': {너비: jpeg bytes}, 'preview': 흐린 미리보기 data uri}
+    '''
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    image = Image.open(BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # 투명 배경 = 흰 배경으로 합성 (jpeg)
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    else:
+        image = image.convert('RGB')
+
+    thumbnails = {}
+    for width in sorted(set(widths)):
+        if width >= image.width and thumbnails: break
+        resized = image.copy()
+        resized.thumbnail((min(width, image.width), image.height), Image.LANCZOS)
+        thumbnails[resized.width] = save_jpeg(resized, quality)
+
+    preview = image.copy()
+    preview.thumbnail((preview_size, preview_size))
+    preview = preview.filter(ImageFilter.GaussianBlur(1))
+    preview = 'data:image/jpeg;base64,' + b64encode(save_jpeg(preview, 50)).decode()
+    return {'width': image.width, 'height': image.height, 'thumbnails': thumbnails, 'preview': preview}
+
+def save_jpeg(image, quality):
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+class Thumbnail():
+    '''
+    이미지 첨부 파일 썸네일 + 흐린 미리보기 생성 (blob 당 1번)
+    1. 업로드 commit 후 새 이미지 blob = thumbnail_status 'pending' + 작업 등록 (요청은 기다리지 않음)
+    2. 작업 스레드 = 저장소에서 원본 읽기 => process pool 에서 리사이즈, 인코딩 => 저장소에 '<digest>_<너비>.jpg' 저장 => blob 갱신
+    3. worker 재시작 등으로 남은 'pending' 은 scheduler 가 다시 등록
+    '''
+    executor = None                                                                 # 저장소 I/O + DB 갱신 스레드 (worker 프로세스 당 1개)
+    process_pool = None                                                             # 이미지 처리 프로세스
+    in_progress = set()
+    lock = Lock()
+
+    @staticmethod
+    def enabled(config):
+        return Image is not None and config.get('THUMBNAIL_ENABLED', True)
+
+    @staticmethod
+    def is_image(filename):
+        return splitext(str(filename))[1].lower() in IMAGE_EXTENSIONS
+
+    @staticmethod
+    def get_key(digest, width):
+        return f'{digest}_{width}.jpg'
+
+    @classmethod
+    def get_executors(cls, config):
+        with cls.lock:
+            if cls.executor is None:
+                cls.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thumbnail')
+            if cls.process_pool is None:
+                cls.process_pool = ProcessPoolExecutor(
+                    max_workers=config.get('THUMBNAIL_WORKERS', 2), mp_context=cls.get_mp_context(config))
+            return cls.executor, cls.process_pool
+
+    @staticmethod
+    def get_mp_context(config):
+        '''
+        이미지 처리 프로세스 시작 방식, fork X
+        (scheduler, 업로드, drain 스레드가 있는 worker 를 fork 하면 다른 스레드가 잡고 있던 lock 이 잠긴 채로 복사될 수 있음)
+        forkserver = 스레드 없는 서버 프로세스에서 fork, 서버는 이 모듈(PIL)만 미리 import / 지원하지 않는 OS 는 spawn
+        '''
+        method = config.get('THUMBNAIL_START_METHOD', 'forkserver')
+        if method not in get_all_start_methods(): method = 'spawn'
+        context = get_context(method)
+        if method == 'forkserver': context.set_forkserver_preload([__name__])
+        return context
+
+    @classmethod
+    def enqueue(cls, app, digests):
+        if not digests or not cls.enabled(app.config): return
+        executor, _ = cls.get_executors(app.config)
+        for digest in digests:
+            with cls.lock:
+                if digest in cls.in_progress: continue
+                cls.in_progress.add(digest)
+            executor.submit(cls.process, app, digest)
+
+    @classmethod
+    def process(cls, app, digest):
+        from blog.api.utils.storage import Storage
+        from blog.api.models import get_db
+        from blog.api.models.get import get_model
+        Blob, db = get_model('blob'), get_db()
+        config = app.config
+        try:
+            with app.app_context():
+                try:
+                    storage = Storage.get()
+                    body = storage.open(digest)
+                    try:
+                        data = body.read()
+                    finally:
+                        body.close()
+                    _, process_pool = cls.get_executors(config)
+                    result = process_pool.submit(make_thumbnails, data,
+                        config.get('THUMBNAIL_WIDTHS', (480, 1200)),
+                        config.get('THUMBNAIL_QUALITY', 80),
+                        config.get('THUMBNAIL_PREVIEW_SIZE', 16),
+                        config.get('THUMBNAIL_MAX_PIXELS', 50 * 1000 * 1000),
+                    ).result(timeout=config.get('THUMBNAIL_TIMEOUT', 60))
+                    for width, thumbnail in result['thumbnails'].items():
+                        storage.put(cls.get_key(digest, width), BytesIO(thumbnail))
+                except Exception as e:
+                    app.logger.exception(f'썸네일 생성 실패 ({digest})')
+                    if isinstance(e, BrokenProcessPool):
+                        # 이미지 처리 중 자식 프로세스 비정상 종료 = 다음 작업은 새 pool 에서
+                        with cls.lock: cls.process_pool = None
+                    result = None
+                Blob.set_thumbnails(digest, result)
+                db.session.remove()
+        finally:
+            with cls.lock:
+                cls.in_progress.discard(digest)
+
+    @classmethod
+    def retry_pending(cls, app):
+        if not cls.enabled(app.config): return
+        from blog.api.models import get_db
+        from blog.api.models.get import get_model
+        with app.app_context():
+            cls.enqueue(app, get_model('blob').get_pending_thumbnails())
+            get_db().session.remove()
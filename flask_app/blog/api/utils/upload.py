@@ -0,0 +1,60 @@
+from hashlib import sha256
+from tempfile import SpooledTemporaryFile
+
+from flask import Request
+from flask_login import current_user
+
+from blog.api.utils.etc import Etc
+
+class QuotaSpooledFile(SpooledTemporaryFile):
+    '''
+    업로드 파일 저장용 임시 파일 = UPLOAD_SPOOL_MAX_MEMORY 까지만 메모리, 넘으면 디스크로
+    werkzeug 가 요청 본문을 읽으면서 write 할 때마다 요청 전체 파일 용량을 세고,
+    할당량을 넘은 뒤의 파일 바이트는 저장하지 않고 버림 (나머지 폼 필드는 그대로 파싱)
+    받는 동안 SHA-256 도 같이 계산 = 중복 확인(blob)을 위해 파일을 다시 읽지 않음
+    '''
+    def __init__(self, upload_request, max_size):
+        super().__init__(max_size=max_size, mode='rb+')
+        self.upload_request = upload_request
+        self.sha256 = sha256()
+
+    def write(self, data):
+        if not self.upload_request.add_upload_size(len(data)): return len(data)
+        self.sha256.update(data)
+        return super().write(data)
+
+class UploadRequest(Request):
+    '''
+    파일 업로드 요청 = request.files 파싱 단계에서 크기 제한
+    1. MAX_CONTENT_LENGTH = flask 가 Content-Length 보고 본문 읽기 전에 413
+    2. 사용자 남은 일일 할당량 = Content-Length 가 할당량 + 폼 여유분보다 크면 처음부터,
+       Content-Length 가 없어도(chunked) 파일 바이트가 할당량을 넘는 순간부터 파일 바이트를 버림 (디스크에 쓰지 않음)
+       => 요청 전체를 413 으로 끝내지 않고 upload_rejected 표시, view 는 작성한 폼 그대로 에러 표시
+    '''
+    upload_size = 0
+    upload_limit = None
+    upload_rejected = False
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = Etc.get_config()
+        limit = self.get_upload_limit()
+        if total_content_length is not None and total_content_length > limit + config.get('UPLOAD_FORM_MARGIN', 0):
+            self.upload_rejected = True
+        return QuotaSpooledFile(self, config.get('UPLOAD_SPOOL_MAX_MEMORY', 500 * 1024))
+
+    def add_upload_size(self, size):
+        # 반환 = 저장할 바이트인지 (할당량을 넘은 뒤 = False)
+        self.upload_size += size
+        if self.upload_size > self.get_upload_limit(): self.upload_rejected = True
+        return not self.upload_rejected
+
+    def get_upload_limit(self):
+        # 요청당 1번만 조회, 로그인하지 않은 사용자는 파일 업로드 X
+        # 로컬 저장소 직접 업로드 = 이미 할당량을 예약했고 파일 크기는 서명된 policy 로 확인하므로 MAX_CONTENT_LENGTH 만 적용
+        if self.upload_limit is None:
+            if self.endpoint == 'views.file_upload_local':
+                self.upload_limit = Etc.get_config().get('MAX_CONTENT_LENGTH') or float('inf')
+            else:
+                self.upload_limit = current_user.get_limit() if current_user.is_authenticated else 0
+        return self.upload_limit
+
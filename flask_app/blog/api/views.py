@@ -1,9 +1,11 @@
-from flask import Blueprint, url_for, redirect, request
+from flask import Blueprint, url_for, redirect, request, jsonify
 from flask_login import current_user
 
 from blog.api.utils.etc import Msg, HttpMethod, Etc
 from blog.api.utils.decorator import Deco
+from blog.api.utils.cache import PageCache
 from blog.api.utils.error import Error
+from blog.api.utils.storage import Storage
 from blog.api.forms import CategoryForm, CommentForm, ContactForm, PostForm
 from blog.api.models.get import get_model
 
@@ -17,49 +19,59 @@ def render_template_views(template_name_or_list, **context):
 # ------------------------------------------------------------ posts_list 출력 페이지 ------------------------------------------------------------
 @views.route('/')
 @views.route('/home')
+@Deco.query_budget(5)
+@PageCache.cached('post')
 def home():
-    # 쿼리 최대 4번 = posts 3번 + user 1번
-    posts = get_model('post').get_all_with('user', 'category')
+    # 쿼리 최대 5번 = posts 3번(1 페이지) + 전체 posts 개수(category 통계 합) 1번 + user 1번
+    posts = get_model('post').get_page_with('user', 'category', **Etc.get_page_args())
     return render_template_views(
         'posts_list.html', 
         posts=posts, 
+        posts_count=get_model('category').get_total_posts_count(),
         type='home',
         category_name='all',
     )
 
 @views.route('/user_posts/<int:user_id>')
+@Deco.query_budget(4)
+@PageCache.cached('post')
 def user_posts(user_id):
-    # 쿼리 최대 4번 = selected_user 1번 + user_posts 2번 + user 1번
+    # 쿼리 최대 4번 = selected_user 1번 + user_posts 2번(1 페이지) + user 1번
     selected_user = get_model('user').get_instance_by_id_with(user_id)
     if not selected_user: return Error.error(404)
 
-    user_posts = get_model('post').get_all_with('category', author_id=user_id)
+    user_posts = get_model('post').get_page_with('category', author_id=user_id, **Etc.get_page_args())
     return render_template_views(
         'posts_list.html', 
         posts=user_posts, 
+        posts_count=selected_user.posts_count,
         type='user_posts',
         selected_user=selected_user,
     )
 
 @views.route('/posts-list/<int:category_id>')
+@Deco.query_budget(5)
+@PageCache.cached('post')
 def posts_list(category_id):
-    # 쿼리 최대 4번 = selected_category 1번 + category_posts 2번 + user 1번
+    # 쿼리 최대 5번 = selected_category 1번 + category_posts 3번(1 페이지) + user 1번
     selected_category = get_model('category').get_instance_by_id_with(category_id)
     if not selected_category: return Error.error(404)
 
-    category_posts = get_model('post').get_all_with('user', 'category', category_id=category_id)
+    category_posts = get_model('post').get_page_with('user', 'category', category_id=category_id, **Etc.get_page_args())
     return render_template_views(
         'posts_list.html', 
         posts=category_posts, 
+        posts_count=selected_category.posts_count,
         type='category_posts',
         category_name=selected_category.name,
     )
 
 @views.route('/category')
+@Deco.query_budget(2)
 def category():
     form = CategoryForm()
 
-    # 쿼리 최대 2번 = category 1번 + user 1번
+    # 쿼리 최대 2번 = category(통계 포함) 1번 + user 1번
     categories = get_model('category').get_all()
     return render_template_views(
         'category.html', 
@@ -68,6 +80,7 @@ def category():
     )
 
 @views.route('/category-make', methods=['POST'])
+@Deco.query_budget(5)
 @Deco.login_and_admin_required
 def category_make():
     form = CategoryForm()
@@ -81,19 +94,39 @@ def category_make():
     return redirect(url_for('views.category'))
 
 @views.route('/category-delete', methods=['DELETE'])
+@Deco.query_budget(24)
 @Deco.login_and_admin_required
 def category_delete():
     ids = request.json.get('ids', [])
     categories = get_model('category').get_all_by_ids(ids)
     if not categories: return Msg.delete_error('카테고리를 선택해주세요.')
 
-    delete_category = ''
-    for category in categories:
-        delete_category += str(category) + '\n'
-        category.delete_instance()
+    # 선택한 카테고리 + 하위 post, comment, file 을 한 트랜잭션에서 일괄 삭제
+    delete_category = ''.join(str(category) + '\n' for category in categories)
+    get_model('category').delete_all_by_ids([category.id for category in categories])
 
     return Msg.delete_success(f'삭제 완료: {delete_category}')
 
+# ------------------------------------------------------------ 검색 페이지 ------------------------------------------------------------
+@views.route('/search')
+@Deco.query_budget(5)
+def search():
+    # 쿼리 최대 5번 = 검색 인덱스 1번 + posts 3번 + user 1번
+    q = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    results, has_next = get_model('search').search(q, page=page)
+
+    posts = get_model('post').get_all_by_ids({result['post_id'] for result in results}, 'user', 'category')
+    posts = {post.id: post for post in posts}
+    results = [dict(result, post=posts[result['post_id']]) for result in results if result['post_id'] in posts]
+    return render_template_views(
+        'search.html',
+        q=q,
+        results=results,
+        page=page,
+        has_next=has_next,
+    )
+
 # ------------------------------------------------------------ about-me & contact 페이지 ------------------------------------------------------------
 @views.route('/about-me')
 def about_me():
@@ -116,32 +149,43 @@ def contact():
     
 # ------------------------------------------------------------ post 관련 페이지 ------------------------------------------------------------
 @views.route('/post/<int:post_id>')
+@Deco.query_budget(3)
+@PageCache.cached()
 def post(post_id):
     form = CommentForm()
 
-    # 쿼리 최대 6번 = post 3번 + post_comments 2번 + user 1번
-    post = get_model('post').get_instance_by_id_with(post_id, 'user', 'category')
+    # 쿼리 최대 3번 = post(+ user, category, 첨부 파일, blob JOIN) 1번 + post_comments 1번 + user 1번
+    post = get_model('post').get_instance_by_id_with(post_id, 'user', 'category', 'attachments')
     if not post: return Error.error(404)
     
-    download_urls = Etc.generate_download_urls(post.files.all())
+    attachments = Etc.generate_attachments(post.attachments)
     post_comments = get_model('comment').get_all_with('user', post_id=post_id)
     return render_template_views(
         'post_read.html', 
         post=post,
         form=form,
         comments=post_comments,
-        download_urls=download_urls,
+        attachments=attachments,
+        # 썸네일이 없는 파일 = 기존처럼 원본을 받아서 표시
+        download_urls=[attachment['url'] for attachment in attachments if not attachment['thumbnails']],
     )
 
 @views.route('/post-create', methods=['GET', 'POST'])
+@Deco.query_budget(34)
 @Deco.login_and_create_permission_required
 def post_create():
     form = PostForm()
 
-    # GET 요청 = 쿼리 최대 2번 = user 1번 + category 1번  
-    # POST 요청 = 쿼리 최대 3번 = user 1번 + category 1번 + post 추가(user_posts 업데이트) 1번
-    # home 돌아옴 = 쿼리 최대 4번 = posts 3번 + user 1번
-    if HttpMethod.get() or form.invalid():
+    # GET 요청 = 쿼리 최대 4번 = user 2번(로그인 + 권한 확인) + category 1번 + 업로드 할당량 1번
+    # POST 요청 = 쿼리 최대 34번 (파일 수와 무관) = GET 4번
+    #             + post 추가 5번(캐시 태그, post, user, category 카운터, 검색 인덱스) + commit 후 post, user 다시 로드 2번
+    #             + 파일 업로드 11번 = 할당량 예약 1번 + 참조(blob 참조, 저장된 내용 조회, 삭제 예약 취소 + 삭제 중 확인) 4번
+    #               + file 추가, blob 저장 완료 2번 + 썸네일(대기 표시, 대기 목록) 2번 + 캐시 태그 1번 + 할당량 정산 1번
+    #             + 직접 업로드 확인 12번 = 토큰 사용 처리(UPDATE + 조회) 2번 + 참조 4번 + file, blob 2번 + 썸네일 2번 + 캐시 태그 1번 + 할당량 정산 1번
+    # home 돌아옴 = views.home 예산 (쿼리 최대 5번)
+    # 할당량을 넘은 파일 = 본문 파싱 단계에서 버려짐 => post 를 만들지 않고 작성한 내용 그대로 다시 작성 화면
+    if request.upload_rejected: Msg.error_msg('업로드 용량이 남은 일일 할당량을 초과하였습니다. 파일을 다시 선택해주세요.')
+    if HttpMethod.get() or form.invalid() or request.upload_rejected:
         return render_template_views(
             'post_write.html', 
             form=form, 
@@ -155,14 +199,76 @@ def post_create():
         author_id=current_user.id,
         user=current_user,
     ).add_instance()
+    # commit 후 만료된 post, user 다시 로드 = 1번씩만 (이후 commit 마다 다시 로드 X)
+    post_id, user_id = post.id, current_user.id
 
     files = request.files.getlist('files')
-    current_user.upload_files(files, post.id)
+    current_user.upload_files(files, post_id)
+    # 브라우저에서 s3 로 직접 올린 파일 확인
+    upload_token = request.form.get('upload_token')
+    if upload_token: confirm_uploads(upload_token, post_id, user_id)
 
     Msg.success_msg('Post 작성 완료!')
     return redirect(url_for('views.home'))
 
+# ------------------------------------------------------------ 파일 직접 업로드 (presigned POST) ------------------------------------------------------------
+@views.route('/file-upload-url', methods=['POST'])
+@Deco.login_and_create_permission_required
+def file_upload_url():
+    # 요청 = {'files': [{'name', 'size', 'sha256'}], 'post_id'(선택)} => 파일마다 s3 presigned POST 발급 (app 서버는 파일 내용을 받지 않음)
+    # post_id 지정 = 토큰은 해당 post 에만 confirm 가능, 작성 중(post 없음)이면 처음 confirm 한 post 에 묶임
+    data = request.get_json(silent=True) or {}
+    post_id = data.get('post_id')
+    if post_id is not None and not isinstance(post_id, int): return jsonify(message='잘못된 요청입니다.'), 400
+    result = get_model('file').create_upload_urls(current_user.id, data.get('files'), post_id)
+    if isinstance(result, str): return jsonify(message=result), 400
+    return jsonify(result), 200
+
+@views.route('/file-upload-confirm/<int:post_id>', methods=['POST'])
+@Deco.login_and_create_permission_required
+def file_upload_confirm(post_id):
+    # 요청 = {'token'} => s3 에 올라간 파일을 post 에 추가
+    post = get_model('post').get_instance_by_id_with(post_id)
+    if not post: return Msg.delete_error()
+    if not Etc.is_owner(post.author_id): return Msg.delete_error('권한이 없습니다.', 403)
+
+    result = confirm_uploads((request.get_json(silent=True) or {}).get('token', ''), post_id, current_user.id)
+    if result is None: return jsonify(message='error'), 400
+    upload_size, failures = result
+    return jsonify(message='success', size=upload_size, failures=[name for name, _ in failures]), 200
+
+def confirm_uploads(token, post_id, user_id):
+    result = get_model('file').confirm_uploads(token, post_id, user_id)
+    if result is None:
+        Msg.error_msg('파일 업로드 확인에 실패하였습니다.')
+        return None
+    for name, error in result[1]:
+        Msg.error_msg(f'{name} upload 실패: {error}')
+    return result
+
+# ------------------------------------------------------------ 로컬 저장소 (LocalStorage) ------------------------------------------------------------
+@views.route('/files/<token>')
+def file_download(token):
+    # 서명된 다운로드 url 확인 => nginx(X-Accel-Redirect) 또는 send_file 로 전송 (Range 요청 지원)
+    storage = Storage.get()
+    data = storage.load_token(token) if hasattr(storage, 'load_token') else None
+    if not data or 'key' not in data: return Error.error(404)
+    response = storage.make_download_response(data['key'], data.get('filename'))
+    return response if response else Error.error(404)
+
+@views.route('/file-upload-local', methods=['POST'])
+def file_upload_local():
+    # presigned POST 와 같은 형식(fields + file)의 로컬 업로드, 서명된 policy 의 key, 최대 크기만 허용
+    storage = Storage.get()
+    policy = storage.load_token(request.form.get('policy', '')) if hasattr(storage, 'load_token') else None
+    file = request.files.get('file')
+    if not policy or not file or policy.get('key') != request.form.get('key'): return jsonify(message='error'), 403
+    if request.upload_rejected: return jsonify(message='error'), 413
+    if not storage.save_upload(policy['key'], file.stream, policy['max_size'], policy.get('sha256')): return jsonify(message='error'), 400
+    return '', 204
+
 @views.route('/post-edit/<int:post_id>', methods=['GET', 'POST'])
+@Deco.query_budget(12)
 @Deco.login_and_create_permission_required
 def post_edit(post_id):
     form = PostForm()
@@ -172,9 +278,9 @@ def post_edit(post_id):
         'post_id':post_id,
     }
 
-    # GET 요청 = 쿼리 최대 3번 = user 1번 + post 1번 + category 1번
-    # POST 요청 = 쿼리 최대 3번 = user 1번 + category 1번 + post 추가(user_posts 업데이트) 1번
-    # post 읽기 돌아옴 = 쿼리 최대 6번 = post 3번 + post_comments 2번 + user 1번
+    # GET 요청 = 쿼리 최대 5번 = user 2번(로그인 + 권한 확인) + category 1번 + post 1번 + 업로드 할당량 1번
+    # POST 요청 = 쿼리 최대 12번 = user 2번 + category 1번 + post 1번 + post 수정 7번(캐시 태그, post, 이전/새 category 카운터 4번, 검색 인덱스) + commit 후 post 다시 로드 1번
+    # post 읽기 돌아옴 = views.post 예산 (쿼리 최대 3번)
     post = get_model('post').get_instance_by_id_with(post_id)
     if not post: return Error.error(404)
     if not Etc.is_owner(post.author_id): return Error.error(403)
@@ -194,26 +300,29 @@ def post_edit(post_id):
     return redirect(url_for('views.post', post_id=post_id))
 
 @views.route('/post-delete/<int:post_id>', methods=['DELETE'])
+@Deco.query_budget(24)
 @Deco.login_and_create_permission_required
 def post_delete(post_id):
-    # 쿼리 최대 4번 = user 1번 + post 삭제 1번 + user의 posts_count update 1번 + comments 삭제 1번
-    # + comments 관련 user update N번
-    # home 돌아옴 = 쿼리 최대 4번 = posts 3번 + user 1번
+    # 쿼리 최대 24번 = user 2번 + post 1번 + 일괄 삭제(대상, 집계 6번 + 테이블별 DELETE + 카운터 UPDATE + blob, 삭제 예약 + 캐시 태그 각 1번)
+    # 댓글, 파일 수와 무관하게 일정
+    # home 돌아옴 = views.home 예산 (쿼리 최대 5번)
     post = get_model('post').get_instance_by_id_with(post_id)
     if not post: return Msg.delete_error()
     if not Etc.is_owner(post.author_id): return Msg.delete_error('권한이 없습니다.', 403)
 
-    post.delete_instance()
+    get_model('post').delete_all_by_ids([post.id])
     return Msg.delete_success('게시물이 성공적으로 삭제되었습니다')
 
 # ------------------------------------------------------------ comment 관련 기능들 ------------------------------------------------------------
 @views.route('/comment-create/<int:post_id>', methods=['POST'])
+@Deco.query_budget(8)
 @Deco.login_and_create_permission_required
 def comment_create(post_id): 
     form = CommentForm()
 
-    # POST 요청 = 쿼리 최대 4번 = user 1번 + comment 추가(post조회 + post_comments + user_comments update 3번)
-    # post 읽기 돌아옴 = 쿼리 최대 6번 = post 3번 + post_comments 2번 + user 1번
+    # POST 요청 = 쿼리 최대 8번 = user 2번(로그인 + 권한 확인)
+    #             + comment 추가 6번(캐시 태그, comment, post/user comments_count 2번, 알림 이벤트 INSERT ... SELECT, 검색 인덱스) (post 조회 X)
+    # post 읽기 돌아옴 = views.post 예산 (쿼리 최대 3번)
     if form.invalid(): return redirect(url_for('views.post', post_id=post_id))
     
     get_model('comment')(
@@ -226,12 +335,13 @@ def comment_create(post_id):
     return redirect(url_for('views.post', post_id=post_id))
 
 @views.route('/comment-edit/<int:comment_id>', methods=['POST'])
+@Deco.query_budget(7)
 @Deco.login_and_create_permission_required
 def comment_edit(comment_id):
     form = CommentForm()
     
-    # POST 요청 = 쿼리 최대 4번 = user 1번 + comment update 1번
-    # post 읽기 돌아옴 = 쿼리 최대 6번 = post 3번 + post_comments 2번 + user 1번
+    # POST 요청 = 쿼리 최대 7번 = user 2번 + comment 1번 + 캐시 태그 1번 + comment update 1번 + 검색 인덱스 1번 + commit 후 comment 다시 로드 1번
+    # post 읽기 돌아옴 = views.post 예산 (쿼리 최대 3번)
     comment = get_model('comment').get_instance_by_id_with(comment_id)
     if not comment: return Error.error(404)
     if not Etc.is_owner(comment.author_id): return Error.error(403)
@@ -244,10 +354,11 @@ def comment_edit(comment_id):
     
 
 @views.route('/comment-delete/<int:comment_id>', methods=['DELETE'])
+@Deco.query_budget(8)
 @Deco.login_and_create_permission_required
 def comment_delete(comment_id):
-    # POST 요청 = 쿼리 최대 5번 = user 1번 + comment, post 로드 2번 + comment 관련 업데이트(post + user) 2번 
-    # post 읽기 돌아옴 = 쿼리 최대 6번 = post 3번 + post_comments 2번 + user 1번
+    # DELETE 요청 = 쿼리 최대 8번 = user 2번 + comment 로드 1번 + 캐시 태그 1번 + comment 삭제 1번 + comment 관련 업데이트(post + user) 2번 + 검색 인덱스 1번
+    # post 읽기 돌아옴 = views.post 예산 (쿼리 최대 3번)
     comment = get_model('comment').get_instance_by_id_with(comment_id)
     if not comment: return Msg.delete_error()
     if not Etc.is_owner(comment.author_id): return Msg.delete_error('권한이 없습니다.', 403)
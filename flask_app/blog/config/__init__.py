@@ -12,6 +12,27 @@ class Config():
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     WTF_CSRF_ENABLED = True
 
+    # 여러 worker 가 같은 SQLite 파일 사용 = 연결마다 pragma + pool 설정 (SqliteProfile)
+    SQLITE_PROFILE_ENABLED = True
+    SQLITE_PRAGMAS = {                                      # 순서대로 실행 (busy_timeout 먼저 = journal_mode 변경도 대기)
+        'busy_timeout': 5000,                               # 쓰기 lock 대기 ms ('database is locked' 대신)
+        'journal_mode': 'WAL',                              # 읽기와 쓰기가 서로 막지 않음
+        'synchronous': 'NORMAL',                            # WAL 에서 안전, commit 마다 fsync X
+        'cache_size': -32000,                               # 연결 당 page cache (음수 = KiB)
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    }
+    SQLITE_POOL_SIZE = 5                                    # worker 당 유지할 연결 수 (요청 + 백그라운드 스레드)
+    SQLITE_MAX_OVERFLOW = 5
+    SQLITE_POOL_TIMEOUT = 30
+    SQLITE_WRITE_LANE = True                                # 같은 worker 의 쓰기 트랜잭션은 순서대로 (lock 대기)
+    SQLITE_WRITE_LANE_TIMEOUT = 30                          # lane 대기 최대 시간, 넘으면 lane 없이 진행
+
+    # 요청 당 SQL 통계(X-SQL-* 응답 헤더 + 로그) 를 남길 mode, 쿼리 예산(Deco.query_budget) 초과 시 에러를 낼 mode
+    SQL_STATS_MODES = ('DEVELOPMENT', 'TEST')
+    QUERY_BUDGET_RAISE_MODES = ('DEVELOPMENT',)
+    STRICT_LOADING_MODES = ('DEVELOPMENT', 'TEST')          # 템플릿 렌더링 중 relationship lazy load = 에러 (N+1 방지)
+
     from .development import DEVELOPMENT_SECRET_KEY
     from .production import PRODUCTION_SECRET_KEY, MAIL_PASSWORD
     SECRET_KEYS = {
@@ -32,11 +53,33 @@ class Config():
     MAIL_PASSWORD = MAIL_PASSWORD
     MAIL_PORT = 587
     MAIL_LIMIT_TIME = 180
+    MAIL_USE_TLS = True
+    MAIL_TIMEOUT = 10                                       # SMTP 연결, 응답 대기 시간
+    MAIL_SENDER_ENABLED = True                              # outbox 전송 스레드 사용 여부
+    MAIL_SENDER_THREADS = 2                                 # 전송 스레드 수 = 유지하는 SMTP 연결 수 (worker 프로세스 당)
+    MAIL_SENDER_POLL_SECONDS = 30                           # 보낼 메세지가 없을 때 outbox 확인 주기
+    MAIL_BATCH_SIZE = 50                                    # 1번에 claim 해서 같은 연결로 보낼 메세지 수
+    MAIL_CLAIM_LEASE_SECONDS = 300                          # claim 후 이 시간 안에 결과가 없으면 다시 전송 (worker 종료 등)
+    MAIL_MAX_ATTEMPTS = 5                                   # 이 횟수만큼 실패하면 failed
+    MAIL_SMTP_NOOP_AFTER_SECONDS = 10                       # 이보다 오래 쉰 연결은 NOOP 으로 확인 후 사용
+    MAIL_SMTP_IDLE_SECONDS = 60                             # 이보다 오래 쉰 연결은 닫기
+    EMAIL_OUTBOX_RETENTION_SECONDS = 7 * 24 * 60 * 60       # 전송이 끝난 outbox 행 보관 기간
+    EMAIL_OUTBOX_PURGE_INTERVAL_SECONDS = 60 * 60           # outbox 정리 주기
+
+    '''
+    새 댓글 알림 관련 config
+    '''
+    COMMENT_NOTIFICATION_ENABLED = True
+    COMMENT_DIGEST_WINDOW_SECONDS = 10 * 60                 # 첫 댓글 후 이 시간 동안 들어온 댓글을 digest 1개로
+    COMMENT_DIGEST_CHECK_SECONDS = 60                       # window 가 지난 작성자 확인 주기
+    COMMENT_DIGEST_MAX_COMMENTS = 20                        # digest 에 게시글 당 표시할 최대 댓글 수
+    SITE_URL = os.environ.get('SITE_URL')                   # digest 에 넣을 게시글 링크 주소 (없으면 링크 X)
 
     '''
     AWS 관련 config
     '''
     from boto3 import client
+    from botocore.config import Config as BotoConfig
     from .production import AWS_ACCESS_KEY, AWS_SECRET_KEY
     S3_BUCKET_NAME = 'myblog-file-server'
     S3_DEFAULT_DIRS = {
@@ -45,11 +88,73 @@ class Config():
         'TEST': 'TEST/'
     }
     S3_BUCKET_REGION = 'ap-northeast-2'
+    S3_UPLOAD_WORKERS = 4                                   # 파일 동시 업로드 스레드 수 (worker 프로세스 당)
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')     # 로컬 S3 호환 서버(moto, minio 등) 주소, 없으면 AWS
     S3 = client('s3', region_name = S3_BUCKET_REGION,
+                endpoint_url=S3_ENDPOINT_URL,
                 aws_access_key_id=AWS_ACCESS_KEY,
-                aws_secret_access_key=AWS_SECRET_KEY)
-    S3_URL_EXPIRATION_SECONDS = 300
+                aws_secret_access_key=AWS_SECRET_KEY,
+                # 업로드 스레드 + 다운로드 url 생성 등이 연결을 기다리지 않도록 pool 크기 지정
+                config=BotoConfig(
+                    max_pool_connections=S3_UPLOAD_WORKERS * 2,
+                    connect_timeout=5,
+                    read_timeout=30,
+                    retries={'max_attempts': 3, 'mode': 'standard'},
+                    tcp_keepalive=True,
+                ))
+    S3_URL_EXPIRATION_SECONDS = 300                         # presigned url(다운로드, 직접 업로드) 유효 시간
+    PRESIGNED_URL_REFRESH_MARGIN = 90                       # 다운로드 url 남은 시간이 이보다 적으면 새로 서명 (> PAGE_CACHE_TIMEOUT)
+    PRESIGNED_URL_CACHE_MAX_ENTRIES = 5000
+    S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024                # 이보다 큰 파일은 multipart 업로드
+    S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+    '''
+    첨부 파일 저장소 관련 config
+    '''
+    STORAGE_BACKENDS = {                                    # mode 별 저장소 = 's3' 또는 'local'
+        'DEVELOPMENT': 'local',
+        'PRODUCTION': 's3',
+        'TEST': 'local'
+    }
+    LOCAL_STORAGE_DIR = os.path.join(BASE_DIR, 'storage')   # 로컬 저장소 경로 (하위에 mode 별 디렉토리)
+    # nginx internal location 경로, 설정하면 다운로드는 X-Accel-Redirect 로 nginx 가 전송 (없으면 flask send_file)
+    LOCAL_STORAGE_ACCEL_PREFIX = os.environ.get('LOCAL_STORAGE_ACCEL_PREFIX')
+    STORAGE_DRAIN_AFTER_COMMIT = True                       # 삭제 commit 직후 백그라운드에서 저장소 객체 정리
+    STORAGE_DRAIN_INTERVAL_SECONDS = 60                     # 남은(재시도) 삭제 예약 정리 주기
+    UPLOAD_TICKET_EXPIRE_INTERVAL_SECONDS = 60 * 60         # confirm 되지 않은 직접 업로드(만료된 토큰) 정리 주기
+
+    '''
+    이미지 썸네일 관련 config (Pillow 필요)
+    '''
+    THUMBNAIL_ENABLED = True
+    THUMBNAIL_WIDTHS = (480, 1200)                          # 생성할 썸네일 너비 (원본보다 큰 너비는 생성 X)
+    THUMBNAIL_QUALITY = 80
+    THUMBNAIL_PREVIEW_SIZE = 16                             # 흐린 미리보기 최대 가로, 세로
+    THUMBNAIL_WORKERS = 2                                   # 이미지 처리 프로세스 수 (worker 프로세스 당)
+    THUMBNAIL_START_METHOD = 'forkserver'                   # 이미지 처리 프로세스 시작 방식 (fork X, 지원하지 않으면 spawn)
+    THUMBNAIL_MAX_PIXELS = 50 * 1000 * 1000                 # 이보다 큰 이미지는 처리 X (decompression bomb)
+
+    '''
+    업로드 요청 크기 관련 config
+    '''
+    MAX_CONTENT_LENGTH = 6 * 1024 * 1024                    # 요청 본문 최대 크기 = 일일 할당량(5MB) + 폼 여유분
+    UPLOAD_FORM_MARGIN = 1 * 1024 * 1024                    # Content-Length 중 파일 외(제목, 본문 등) 허용 크기
+    UPLOAD_SPOOL_MAX_MEMORY = 256 * 1024                    # 업로드 파일당 메모리 보관 최대 크기, 넘으면 디스크 임시 파일
     
+    '''
+    page cache 관련 config
+    '''
+    PAGE_CACHE_ENABLED = True
+    PAGE_CACHE_TIMEOUT = 60
+    PAGE_CACHE_MAX_ENTRIES = 500
+
+    '''
+    object cache 관련 config
+    '''
+    OBJECT_CACHE_ENABLED = True
+    OBJECT_CACHE_TIMEOUT = 30
+    OBJECT_CACHE_MAX_ENTRIES = 1000
+
     '''
     third-party 관련 config
     '''    
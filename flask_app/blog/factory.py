@@ -1,3 +1,4 @@
+from multiprocessing import parent_process
 from flask import Flask
 
 from blog.api.models.get import get_all_admin_models, get_model
@@ -9,6 +10,9 @@ def create_app(config, mode):
     즉, 순환 참조 방지
     '''
     app = Flask(__name__)
+    # 파일 업로드 요청 크기 제한 + 디스크 spool (request.files 파싱 단계)
+    from blog.api.utils.upload import UploadRequest
+    app.request_class = UploadRequest
     app.config.from_object(config) # 환경변수 설정 코드
     app.secret_key = config.SECRET_KEYS[f'{mode}_SECRET_KEY']
     app.config['mode'] = mode.upper()
@@ -19,6 +23,10 @@ def create_app(config, mode):
     Email.init_app(app, session)
     from blog.api.utils.etc import Etc
     Etc.init_app(app)
+    from blog.api.utils.cache import PageCache
+    PageCache.init_app(app)
+    from blog.api.utils.storage import Storage
+    Storage.init_app(app)
 
     if mode != 'TEST':
         # third-party 관련 환경 변수 셋팅
@@ -31,6 +39,13 @@ def create_app(config, mode):
     from blog.api.models import db_migrate_setup
     db_migrate_setup(app)
 
+    # 요청 당 SQL 실행 수, 시간 측정 + view 쿼리 예산 (Deco.query_budget) + 템플릿 lazy load 금지 (strict 모드)
+    from blog.api.models import db
+    from blog.api.utils.query import QueryCounter, StrictLoading
+    with app.app_context():
+        QueryCounter.init_app(app, db.engine)
+    StrictLoading.init_app(app, db.session)
+
     # admin 페이지에 모델뷰 추가
     add_admin_view(app)
 
@@ -47,7 +62,7 @@ def create_app(config, mode):
     # login_manager 설정 코드
     set_login_manager(app)
 
-    # create_user, update_all_model_instances 명령어 추가
+    # create_user, update_all_model_instances, rebuild_search_index 명령어 추가
     add_cli(app)
 
     # sqlalchemy 쿼리 로깅 확인용 
@@ -55,8 +70,8 @@ def create_app(config, mode):
     # logging.basicConfig()
     # logging.getLogger('sqlalchemy.engine').setLevel(logging.DEBUG)
     
-    # 스케줄러 등록
-    set_scheduler(app)
+    # 스케줄러 등록 (썸네일 처리 프로세스처럼 multiprocessing 자식 프로세스가 app 모듈을 다시 import 한 경우 X)
+    if parent_process() is None: set_scheduler(app)
 
     return app
 
@@ -81,10 +96,10 @@ def set_login_manager(app):
     login_manager.init_app(app) # app 연결
     login_manager.login_view = 'auth.login' # 로그인을 꼭 해야하는 페이지 접근 시 auth.login으로 리다이렉트 설정 
 
-    # login_required 실행 전 사용자 정보 조회 메소드
+    # login_required 실행 전 사용자 정보 조회 메소드 (캐시된 스냅샷 사용)
     @login_manager.user_loader
     def user_loader(user_id):
-        return get_model('user').get_instance_by_id_with(int(user_id))
+        return get_model('user').get_session_user(int(user_id))
     
 def add_cli(app):
     from click import command               # 커맨드 라인 인터페이스 작성
@@ -119,18 +134,23 @@ def add_cli(app):
     @command(name="update_all_model_instances")
     @with_appcontext
     def update_all_model_instances():
+        # NULL 채우기 + 카운터 재계산 = 인스턴스 로드 없이 GROUP BY 집계 + chunk 단위 일괄 UPDATE
+        # category = 최신 post(latest_post_*)도 chunk 마다 다시 계산 => 통계 컬럼이 추가된 기존 DB 채우기 (run_docker.sh)
         for _, model in get_all_admin_models():
-            instances = model.get_all()
-            for instance in instances:
-                instance.fill_none_fields()
-                if hasattr(instance, 'update_count'):
-                    instance.update_count()
-            model.commit()
-            print(f"Model {model.__name__} update finished!")
+            model.fill_none_columns()
+            changed = model.recount()
+            print(f"Model {model.__name__} update finished! {changed} rows recounted")
+
+    @command(name="rebuild_search_index")
+    @with_appcontext
+    def rebuild_search_index():
+        count = get_model('search').rebuild()
+        print(f"Search index rebuilt! {count} documents")
 
     # app에 등록
     app.cli.add_command(create_user)
     app.cli.add_command(update_all_model_instances)
+    app.cli.add_command(rebuild_search_index)
 
 def set_scheduler(app):
     from flask_apscheduler import APScheduler
@@ -140,18 +160,6 @@ def set_scheduler(app):
     scheduler.init_app(app)
     scheduler.start()
 
-    def reset_upload_limit(app):
-        with app.app_context():
-            get_model('user').reset_all_limit()
-            print('파일 업로드 할당량 초기화 완료!')
-    
-    scheduler.add_job(
-        id='reset_upload_limit', 
-        func=reset_upload_limit, 
-        args=(app,),
-        trigger=CronTrigger(hour=0),
-    )
-
     # 쌓인 오류 메세지 삭제
     from .api.utils.email import Email
     scheduler.add_job(
@@ -160,5 +168,65 @@ def set_scheduler(app):
         args=(app,), 
         trigger=CronTrigger(hour=12),
     )
+
+    # 삭제 예약된 저장소 객체 정리 (commit 직후 drain 에서 실패, 재시도 대기 중인 key)
+    from .api.models.storage_tombstone import StorageTombstone
+    scheduler.add_job(
+        id='drain_storage_tombstones',
+        func=StorageTombstone.run_drain,
+        args=(app,),
+        trigger='interval',
+        seconds=app.config.get('STORAGE_DRAIN_INTERVAL_SECONDS', 60),
+    )
+
+    # confirm 되지 않고 만료된 직접 업로드 = 할당량 예약 해제 + 올라간 저장소 객체 삭제 예약
+    from .api.models.upload_ticket import UploadTicket
+    scheduler.add_job(
+        id='expire_upload_tickets',
+        func=UploadTicket.run_expire,
+        args=(app,),
+        trigger='interval',
+        seconds=app.config.get('UPLOAD_TICKET_EXPIRE_INTERVAL_SECONDS', 60 * 60),
+    )
+
+    # 처리되지 않은 썸네일 작업 다시 등록 (worker 재시작 등)
+    from .api.utils.thumbnail import Thumbnail
+    scheduler.add_job(
+        id='retry_pending_thumbnails',
+        func=Thumbnail.retry_pending,
+        args=(app,),
+        trigger='interval',
+        minutes=10,
+    )
+
+    # email outbox 전송 스레드 시작 + 재시도 대기 중인 메세지 확인 (스레드가 죽었으면 다시 시작)
+    from .api.utils.email import MailSender
+    scheduler.add_job(
+        id='send_email_outbox',
+        func=MailSender.wake,
+        args=(app,),
+        trigger='interval',
+        seconds=app.config.get('MAIL_SENDER_POLL_SECONDS', 30),
+    )
+
+    # 전송이 끝나고 보관 기간이 지난 outbox 행 삭제 (otp 본문 포함)
+    from .api.models.email_outbox import EmailOutbox
+    scheduler.add_job(
+        id='purge_email_outbox',
+        func=EmailOutbox.run_purge,
+        args=(app,),
+        trigger='interval',
+        seconds=app.config.get('EMAIL_OUTBOX_PURGE_INTERVAL_SECONDS', 60 * 60),
+    )
+
+    # window 가 지난 새 댓글 알림 = 작성자 당 digest 이메일 1개
+    from .api.models.comment_notification import CommentNotification
+    scheduler.add_job(
+        id='send_comment_digests',
+        func=CommentNotification.run_digests,
+        args=(app,),
+        trigger='interval',
+        seconds=app.config.get('COMMENT_DIGEST_CHECK_SECONDS', 60),
+    )
     
 
@@ -0,0 +1,592 @@
+import os
+import sys
+# 현재 스크립트의 부모 디렉터리를 상위로 추가
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import json
+import shutil
+import sqlite3
+import platform
+import argparse
+from hashlib import sha1, sha256
+from random import Random
+from datetime import datetime, timedelta
+from statistics import mean, median
+from time import perf_counter
+from tempfile import TemporaryDirectory, gettempdir
+
+import sqlalchemy
+from sqlalchemy import insert, text
+from werkzeug.security import generate_password_hash
+
+from blog.factory import create_app
+from blog.api.models import db
+from blog.api.models.get import get_model, get_all_admin_models
+from blog.api.utils.query import QueryCounter
+from tests.local_smtp import LocalSmtpServer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BASE_DIR, 'benchmark_baseline.json')
+PASSWORD = 'benchmark'
+ADMIN_EMAIL = 'bench0@example.com'
+
+class BenchmarkError(Exception):
+    pass
+
+class BenchConfig():
+    '''
+    benchmark 용 config = 외부 서비스 없이 실행 (S3 => LocalStorage, SMTP => LocalSmtpServer)
+    SQLite 파일, pragma, pool, write lane, 객체 캐시는 배포(Config)와 같게
+    DB 경로, SMTP 포트, 저장소 경로는 실행할 때 지정 (make_config)
+    '''
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    WTF_CSRF_ENABLED = False
+    SECRET_KEYS = {
+        'TEST_SECRET_KEY': 'benchmark',
+    }
+
+    SQLITE_PROFILE_ENABLED = True
+    SQLITE_PRAGMAS = {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -32000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    }
+    SQLITE_WRITE_LANE = True
+    SQL_STATS_MODES = ('TEST',)                             # X-SQL-Count 헤더 = 요청 당 쿼리 수 기록
+    QUERY_BUDGET_RAISE_MODES = ()                           # 예산 초과는 경고 로그만 (측정은 계속)
+
+    PAGE_CACHE_ENABLED = False                              # 캐시 hit 이 아니라 view 자체를 측정 (--page-cache 로 켜기)
+    OBJECT_CACHE_ENABLED = True
+
+    MAIL_SERVER = '127.0.0.1'
+    MAIL_USERNAME = 'benchmark@example.com'
+    MAIL_PASSWORD = ''                                      # 로컬 SMTP 서버 = 로그인 X
+    MAIL_USE_TLS = False
+    MAIL_LIMIT_TIME = 180
+
+    STORAGE_BACKENDS = {
+        'TEST': 'local'
+    }
+    S3_URL_EXPIRATION_SECONDS = 300
+    STORAGE_DRAIN_AFTER_COMMIT = False
+    THUMBNAIL_ENABLED = False
+
+class Seeder():
+    '''
+    benchmark 데이터 = ORM hook 없이 Core executemany 로 CHUNK_SIZE 행씩 INSERT (1M post 도 분 단위)
+    INSERT 후 파생 데이터는 repo 의 정리 작업으로 맞춤
+    = fill_none_columns + recount (update_all_model_instances 명령어), 카테고리 최신 post, 검색 인덱스 rebuild
+    user 1 = 관리자 (ADMIN_EMAIL), 모든 user 는 글 작성 권한 있음
+    '''
+    CHUNK_SIZE = 10000
+    WORDS = ('flask', 'sqlite', 'python', 'cache', 'query', 'index', 'blog', 'benchmark',
+        'keyset', 'session', 'template', 'upload', 'storage', 'comment', 'category', 'search')
+
+    def __init__(self, posts, users=None, categories=10, comments_per_post=2, seed=0):
+        self.posts = posts
+        self.users = users or max(10, posts // 100)
+        self.categories = categories
+        self.comments_per_post = comments_per_post
+        self.seed_value = seed
+        self.start = datetime(2024, 1, 1)
+
+    def get_meta(self):
+        return {
+            'posts': self.posts,
+            'users': self.users,
+            'categories': self.categories,
+            'comments_per_post': self.comments_per_post,
+        }
+
+    @staticmethod
+    def get_schema_hash():
+        # 모델(테이블, 컬럼)이 바뀌면 저장해 둔 seed DB 를 다시 만듦
+        tables = [(table.name, sorted(column.name for column in table.columns)) for table in db.metadata.sorted_tables]
+        return sha1(json.dumps(tables).encode()).hexdigest()[:10]
+
+    def get_seed_name(self):
+        return 'seed_{posts}_{users}_{categories}_{comments_per_post}_{schema}.db'.format(
+            schema=self.get_schema_hash(), **self.get_meta())
+
+    def make_content(self, random, words):
+        return ' '.join(random.choice(self.WORDS) for _ in range(words))
+
+    def seed(self):
+        random = Random(self.seed_value)
+        password = generate_password_hash(PASSWORD)
+        User, Category, Post, Comment = (get_model(name) for name in ('user', 'category', 'post', 'comment'))
+
+        self.insert(User, ({
+            'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': password,
+            'create_permission': True, 'admin_check': i == 0, 'auth_type': 0, 'date_created': self.start,
+        } for i in range(self.users)))
+        self.insert(Category, ({'name': f'category {i + 1}', 'date_created': self.start} for i in range(self.categories)))
+
+        def make_post(i):
+            content = self.make_content(random, random.randint(20, 40))
+            return {
+                'title': f'{self.make_content(random, 2)} post {i + 1}', 'content': content, 'excerpt': Post.make_excerpt(content),
+                'author_id': i % self.users + 1, 'category_id': i % self.categories + 1,
+                'date_created': self.start + timedelta(seconds=i),
+            }
+        self.insert(Post, (make_post(i) for i in range(self.posts)))
+
+        def make_comments():
+            for i in range(self.posts):
+                for j in range(self.comments_per_post):
+                    yield {
+                        'content': self.make_content(random, random.randint(5, 15)),
+                        'post_id': i + 1, 'author_id': (i + j + 1) % self.users + 1,
+                        'date_created': self.start + timedelta(seconds=i, milliseconds=j + 1),
+                    }
+        self.insert(Comment, make_comments())
+
+        # 카운터, 통계, 검색 인덱스
+        for _, model in get_all_admin_models():
+            model.fill_none_columns()
+            model.recount()
+        Category.update_latest_posts(db.session, list(range(1, self.categories + 1)))
+        db.session.commit()
+        get_model('search').rebuild()
+
+    def insert(self, model, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) < self.CHUNK_SIZE: continue
+            self.insert_chunk(model, chunk)
+            chunk = []
+        if chunk: self.insert_chunk(model, chunk)
+
+    @staticmethod
+    def insert_chunk(model, rows):
+        db.session.execute(insert(model.__table__), rows)
+        db.session.commit()
+
+class RouteCase():
+    '''
+    views, auth blueprint 요청 1개
+    user = 'anon'(로그인 X), 'admin'(관리자, 같은 클라이언트), 'guest'(매번 새 클라이언트, 로그인 X),
+           'new'(매번 새 user 로 로그인, 글 작성 권한 X)
+    path = 문자열 또는 함수(bench), prepare(bench) = 측정 전에 실행, path, data, json 덮어쓰기 (업로드 준비 등)
+    '''
+    def __init__(self, endpoint, method, path=None, user='anon', data=None, json=None, prepare=None, status=(200,)):
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.user = user
+        self.data = data
+        self.json = json
+        self.prepare = prepare
+        self.status = status
+
+    @property
+    def name(self):
+        return f'{self.method} {self.endpoint}'
+
+    def make_request(self, bench):
+        request = {
+            'path': self.path(bench) if callable(self.path) else self.path,
+            'data': self.data(bench) if callable(self.data) else self.data,
+            'json': self.json,
+        }
+        if self.prepare: request.update(self.prepare(bench))
+        return {key: value for key, value in request.items() if value is not None}
+
+class ModelCase():
+    '''
+    BaseModel 헬퍼 호출 1개 = 매번 빈 세션(identity map X)에서 실행, 객체 캐시(ObjectCache)는 그대로
+    '''
+    def __init__(self, name, run):
+        self.name = name
+        self.run = run
+
+# 외부 서비스가 필요한 route = 측정 X (이유)
+SKIPPED_ENDPOINTS = {
+    'auth.auth_page': 'third-party(구글, 카카오) 인증 페이지로 redirect',
+    'auth.callback': 'third-party 토큰, 사용자 정보 요청',
+}
+
+def get_route_cases():
+    return [
+        # ---------------------- 목록, 읽기 ----------------------
+        RouteCase('views.home', 'GET', '/home'),
+        RouteCase('views.user_posts', 'GET', '/user_posts/2'),
+        RouteCase('views.posts_list', 'GET', '/posts-list/1'),
+        RouteCase('views.category', 'GET', '/category'),
+        RouteCase('views.search', 'GET', '/search?q=flask'),
+        RouteCase('views.about_me', 'GET', '/about-me'),
+        RouteCase('views.post', 'GET', lambda bench: f'/post/{bench.post_id}'),
+
+        # ---------------------- 카테고리 ----------------------
+        RouteCase('views.category_make', 'POST', '/category-make', user='admin',
+            data=lambda bench: {'name': bench.unique('cat')}, status=(302,)),
+        RouteCase('views.category_delete', 'DELETE', '/category-delete', user='admin',
+            prepare=lambda bench: {'json': {'ids': [bench.add_category()]}}),
+
+        # ---------------------- contact ----------------------
+        RouteCase('views.contact', 'GET', '/contact', user='admin'),
+        RouteCase('views.contact', 'POST', '/contact', user='admin', data={'content': 'benchmark message'}),
+
+        # ---------------------- post ----------------------
+        RouteCase('views.post_create', 'GET', '/post-create', user='admin'),
+        RouteCase('views.post_create', 'POST', '/post-create', user='admin',
+            data=lambda bench: dict(bench.post_form(), files=[bench.make_file()]), status=(302,)),
+        RouteCase('views.post_edit', 'GET', lambda bench: f'/post-edit/{bench.own_post_id}', user='admin'),
+        RouteCase('views.post_edit', 'POST', lambda bench: f'/post-edit/{bench.own_post_id}', user='admin',
+            data=lambda bench: bench.post_form(category_id=bench.own_post_category_id), status=(302,)),
+        RouteCase('views.post_delete', 'DELETE', user='admin',
+            prepare=lambda bench: {'path': f'/post-delete/{bench.add_post()}'}),
+
+        # ---------------------- 파일 (브라우저 직접 업로드, 로컬 저장소) ----------------------
+        RouteCase('views.file_upload_url', 'POST', '/file-upload-url', user='admin',
+            prepare=lambda bench: {'json': {'files': [bench.make_file_info()[0]]}}),
+        RouteCase('views.file_upload_local', 'POST', prepare=lambda bench: bench.prepare_local_upload(), status=(204,)),
+        RouteCase('views.file_upload_confirm', 'POST', lambda bench: f'/file-upload-confirm/{bench.own_post_id}', user='admin',
+            prepare=lambda bench: {'json': {'token': bench.upload_file()[0]}}),
+        RouteCase('views.file_download', 'GET', lambda bench: bench.download_url),
+
+        # ---------------------- 댓글 ----------------------
+        RouteCase('views.comment_create', 'POST', lambda bench: f'/comment-create/{bench.post_id}', user='admin',
+            data={'content': 'benchmark comment'}, status=(302,)),
+        RouteCase('views.comment_edit', 'POST', lambda bench: f'/comment-edit/{bench.own_comment_id}', user='admin',
+            data={'content': 'benchmark comment edit'}, status=(302,)),
+        RouteCase('views.comment_delete', 'DELETE', user='admin',
+            prepare=lambda bench: {'path': f'/comment-delete/{bench.add_comment()}'}),
+
+        # ---------------------- auth ----------------------
+        RouteCase('auth.login', 'GET', '/auth/login'),
+        RouteCase('auth.login', 'POST', '/auth/login', user='guest',
+            data={'email': ADMIN_EMAIL, 'password': PASSWORD}, status=(302,)),
+        RouteCase('auth.logout', 'GET', '/auth/logout', user='new', status=(302,)),
+        RouteCase('auth.signup', 'GET', '/auth/signup'),
+        RouteCase('auth.signup', 'POST', '/auth/signup', user='guest', data=lambda bench: bench.signup_form(), status=(302,)),
+        RouteCase('auth.user_delete', 'DELETE', '/auth/user-delete', user='new'),
+        RouteCase('auth.mypage', 'GET', '/auth/mypage', user='admin'),
+        RouteCase('auth.mypage', 'POST', '/auth/mypage', user='admin', data={'otp': '000000'}),
+        RouteCase('auth.send_mail_otp', 'GET', '/auth/send-mail-otp', user='new', status=(302,)),
+        RouteCase('auth.user_info_edit', 'POST', '/auth/user-info-edit', user='admin',
+            data=lambda bench: {'username': bench.unique('admin')}, status=(302,)),
+    ]
+
+def get_model_cases():
+    Post, Comment, User, Category, Search = (get_model(name) for name in ('post', 'comment', 'user', 'category', 'search'))
+    return [
+        ModelCase('post.get_instance_by_id_with', lambda bench: Post.get_instance_by_id_with(bench.post_id)),
+        ModelCase('post.get_instance_by_id_with(user, category, attachments)',
+            lambda bench: Post.get_instance_by_id_with(bench.post_id, 'user', 'category', 'attachments')),
+        ModelCase('user.get_instance_by_id_with', lambda bench: User.get_instance_by_id_with(2)),
+        ModelCase('comment.get_all_with(user, post_id)', lambda bench: Comment.get_all_with('user', post_id=bench.post_id)),
+        ModelCase('post.get_all_with(category, author_id)', lambda bench: Post.get_all_with('category', author_id=2)),
+        ModelCase('category.get_all_with', lambda bench: Category.get_all_with()),
+        ModelCase('post.get_page_with(user, category)', lambda bench: Post.get_page_with('user', 'category')),
+        ModelCase('user.duplicate_check(email, username)',
+            lambda bench: User.duplicate_check(email=ADMIN_EMAIL.upper(), username='no such user')),
+        ModelCase('category.duplicate_check(name)', lambda bench: Category.duplicate_check(name='no such category')),
+        ModelCase('post.count_all', lambda bench: Post.count_all()),
+        ModelCase('post.count_all(category_id)', lambda bench: Post.count_all(category_id=1)),
+        ModelCase('comment.count_all(post_id)', lambda bench: Comment.count_all(post_id=bench.post_id)),
+        ModelCase('search.search', lambda bench: Search.search('flask')),
+    ]
+
+class Benchmark():
+    '''
+    seed DB 에서 route(views, auth blueprint), BaseModel 헬퍼 측정
+    1. route = Flask test client, 요청마다 새 app context (배포처럼 요청 간 identity map 공유 X)
+       측정 = 응답 시간 + X-SQL-Count, 준비(로그인, 대상 생성 등)는 측정 X
+    2. 모든 route 에 RouteCase 가 있는지 확인 (SKIPPED_ENDPOINTS 제외) = 새 route 를 추가하면 case 도 추가
+    3. 결과 = 이름별 median, p95, min, mean(ms) + 쿼리 수
+    '''
+    def __init__(self, app, seeder, repeat=20, warmup=2):
+        self.app = app
+        self.seeder = seeder
+        self.repeat = repeat
+        self.warmup = warmup
+        self.counter = 0
+        self.random = Random(1)
+
+        users, posts = seeder.users, seeder.posts
+        self.post_id = posts // 2 + 1
+        # 관리자(user 1)가 작성한 post = id % users == 1 (Seeder), 가운데 근처
+        self.own_post_id = (posts // 2) // users * users + 1
+        self.own_post_category_id = (self.own_post_id - 1) % seeder.categories + 1
+        self.own_comment_id = None
+        self.download_url = None
+
+        self.anon = app.test_client()
+        self.admin = self.login_client(ADMIN_EMAIL)
+
+    def prepare(self):
+        self.own_comment_id = self.add_comment()
+        # 다운로드 = 로컬 저장소에 올린 파일(key = digest)의 서명된 url
+        from blog.api.utils.storage import Storage
+        _, key = self.upload_file()
+        with self.app.test_request_context():
+            self.download_url = Storage.get().presign(key, 3600, 'benchmark.bin')
+
+    # ---------------------- 준비 (측정 X) ----------------------
+    def unique(self, prefix):
+        self.counter += 1
+        return f'{prefix}{self.counter}'
+
+    def login_client(self, email):
+        client = self.app.test_client()
+        response = client.post('/auth/login', data={'email': email, 'password': PASSWORD})
+        if response.status_code != 302: raise BenchmarkError(f'{email} 로그인 실패')
+        return client
+
+    def get_client(self, user):
+        if user == 'anon': return self.anon
+        if user == 'admin': return self.admin
+        if user == 'guest': return self.app.test_client()
+        return self.login_client(self.add_user())
+
+    def add_user(self):
+        name = self.unique('user')
+        with self.app.app_context():
+            get_model('user')(username=name, email=f'{name}@example.com', password=PASSWORD).add_instance()
+        return f'{name}@example.com'
+
+    def add_category(self):
+        with self.app.app_context():
+            return get_model('category')(name=self.unique('category')).add_instance().id
+
+    def add_post(self):
+        with self.app.app_context():
+            return get_model('post')(title=self.unique('post'), content='benchmark post', category_id=1, author_id=1).add_instance().id
+
+    def add_comment(self):
+        with self.app.app_context():
+            return get_model('comment')(content='benchmark comment', post_id=self.own_post_id, author_id=1).add_instance().id
+
+    def post_form(self, category_id=1):
+        return {'title': self.unique('title'), 'content': 'benchmark content ' * 20, 'category_id': category_id}
+
+    def signup_form(self):
+        name = self.unique('signup')
+        return {'username': name, 'email': f'{name}@example.com', 'password': PASSWORD, 'password_check': PASSWORD}
+
+    def make_content(self):
+        # 매번 다른 내용 = 중복 blob 으로 업로드가 생략되지 않도록
+        return self.random.getrandbits(8 * 4096).to_bytes(4096, 'big')
+
+    def make_file(self):
+        return (io.BytesIO(self.make_content()), f'{self.unique("file")}.bin')
+
+    def make_file_info(self):
+        content = self.make_content()
+        return {'name': f'{self.unique("file")}.bin', 'size': len(content), 'sha256': sha256(content).hexdigest()}, content
+
+    def prepare_local_upload(self):
+        info, content = self.make_file_info()
+        response = self.admin.post('/file-upload-url', json={'files': [info]})
+        upload = response.get_json()['uploads'][0]
+        return {'path': upload['url'], 'data': dict(upload['fields'], file=(io.BytesIO(content), info['name']))}
+
+    def upload_file(self):
+        # 직접 업로드 url 발급 + 로컬 저장소 업로드 => (confirm 토큰, 저장소 key)
+        info, content = self.make_file_info()
+        result = self.admin.post('/file-upload-url', json={'files': [info]}).get_json()
+        upload = result['uploads'][0]
+        response = self.anon.post(upload['url'], data=dict(upload['fields'], file=(io.BytesIO(content), info['name'])))
+        if response.status_code != 204: raise BenchmarkError('로컬 저장소 업로드 실패')
+        return result['token'], info['sha256']
+
+    # ---------------------- 측정 ----------------------
+    def check_coverage(self, cases):
+        endpoints = {rule.endpoint for rule in self.app.url_map.iter_rules() if rule.endpoint.split('.')[0] in ('views', 'auth')}
+        missing = endpoints - {case.endpoint for case in cases} - set(SKIPPED_ENDPOINTS)
+        if missing: raise BenchmarkError(f'RouteCase 가 없는 route: {", ".join(sorted(missing))}')
+
+    def run_route(self, case):
+        samples, sql_counts = [], []
+        for i in range(self.warmup + self.repeat):
+            client = self.get_client(case.user)
+            request = case.make_request(self)
+            start = perf_counter()
+            response = client.open(method=case.method, **request)
+            elapsed = perf_counter() - start
+            if response.status_code not in case.status:
+                raise BenchmarkError(f'{case.name} {request["path"]}: 응답 {response.status_code} (예상 {case.status})')
+            if i < self.warmup: continue
+            samples.append(elapsed)
+            if 'X-SQL-Count' in response.headers: sql_counts.append(int(response.headers['X-SQL-Count']))
+        return self.make_result('route', samples, sql_counts)
+
+    def run_model(self, case):
+        samples, sql_counts = [], []
+        with self.app.test_request_context():
+            for i in range(self.warmup + self.repeat):
+                db.session.remove()
+                with QueryCounter.measure() as stats:
+                    start = perf_counter()
+                    case.run(self)
+                    elapsed = perf_counter() - start
+                if i < self.warmup: continue
+                samples.append(elapsed)
+                sql_counts.append(stats.count)
+            db.session.remove()
+        return self.make_result('model', samples, sql_counts)
+
+    @staticmethod
+    def make_result(kind, samples, sql_counts):
+        samples = sorted(sample * 1000 for sample in samples)
+        return {
+            'kind': kind,
+            'median_ms': round(median(samples), 3),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+            'min_ms': round(samples[0], 3),
+            'mean_ms': round(mean(samples), 3),
+            'sql_count': max(sql_counts) if sql_counts else None,
+        }
+
+    def run(self, only=None, log=print):
+        route_cases, model_cases = get_route_cases(), get_model_cases()
+        self.check_coverage(route_cases)
+        self.prepare()
+        results = {}
+        for case, run in [*((case, self.run_route) for case in route_cases), *((case, self.run_model) for case in model_cases)]:
+            if only and not any(word in case.name for word in only): continue
+            results[case.name] = run(case)
+            log(f'{case.name:60s} {results[case.name]["median_ms"]:9.3f} ms  sql={results[case.name]["sql_count"]}')
+        return results
+
+# ------------------------------------------ 결과 비교 ------------------------------------------
+def compare(results, baseline, threshold=0.5, min_ms=2.0):
+    '''
+    baseline 과 비교한 회귀 목록 [(이름, 이유)]
+    1. 쿼리 수 증가 = 항상 회귀 (실행 환경과 무관)
+    2. median 이 threshold 비율보다 느려지고, 차이가 min_ms 이상 (짧은 요청의 측정 잡음 제외)
+    '''
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base: continue
+        if result['sql_count'] is not None and base.get('sql_count') is not None and result['sql_count'] > base['sql_count']:
+            regressions.append((name, f'쿼리 {base["sql_count"]}번 -> {result["sql_count"]}번'))
+        limit = base['median_ms'] * (1 + threshold)
+        if result['median_ms'] > limit and result['median_ms'] - base['median_ms'] >= min_ms:
+            regressions.append((name, f'median {base["median_ms"]:.3f} ms -> {result["median_ms"]:.3f} ms '
+                f'(+{(result["median_ms"] / base["median_ms"] - 1) * 100:.0f}%)'))
+    return regressions
+
+def load_baseline(path):
+    if not os.path.exists(path): return {}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+def save_json(path, data):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2, ensure_ascii=False, sort_keys=True)
+        file.write('\n')
+
+def parse_scale(value):
+    # 10000, 10k, 1M
+    value = value.strip().lower()
+    units = {'k': 1000, 'm': 1000 * 1000}
+    if value[-1:] in units: return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+def make_config(workdir, db_path, smtp_port, page_cache):
+    class RunConfig(BenchConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+        LOCAL_STORAGE_DIR = os.path.join(workdir, 'storage')
+        MAIL_PORT = smtp_port
+        PAGE_CACHE_ENABLED = page_cache
+    return RunConfig
+
+def run_benchmark(seeder, seed_dir, repeat, warmup, only=None, page_cache=False, log=print):
+    '''
+    seed DB (seed_dir 에 scale, 스키마별로 저장해 두고 복사해서 사용) => 측정 => (결과, meta)
+    '''
+    smtp = LocalSmtpServer().start()
+    try:
+        with TemporaryDirectory() as workdir:
+            db_path = os.path.join(workdir, 'benchmark.db')
+            seed_path = os.path.join(seed_dir, seeder.get_seed_name())
+            seeded = os.path.exists(seed_path)
+            if seeded: shutil.copyfile(seed_path, db_path)
+
+            app = create_app(config=make_config(workdir, db_path, smtp.port, page_cache), mode='TEST')
+            # scheduler 작업(outbox, digest, 정리 등)이 측정에 섞이지 않도록
+            app.apscheduler.shutdown(wait=False)
+            with app.app_context():
+                if not seeded:
+                    log(f'seed {seeder.get_meta()} ...')
+                    start = perf_counter()
+                    seeder.seed()
+                    db.session.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+                    os.makedirs(seed_dir, exist_ok=True)
+                    shutil.copyfile(db_path, seed_path + '.tmp')
+                    os.replace(seed_path + '.tmp', seed_path)
+                    log(f'seed 완료 {perf_counter() - start:.1f}s => {seed_path}')
+
+            results = Benchmark(app, seeder, repeat=repeat, warmup=warmup).run(only=only, log=log)
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+    finally:
+        smtp.stop()
+
+    meta = dict(seeder.get_meta(),
+        repeat=repeat,
+        warmup=warmup,
+        page_cache=page_cache,
+        date=datetime.now().isoformat(timespec='seconds'),
+        python=platform.python_version(),
+        sqlalchemy=sqlalchemy.__version__,
+        sqlite=sqlite3.sqlite_version,
+        platform=platform.platform(),
+    )
+    return results, meta
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='route, BaseModel 헬퍼 benchmark (외부 서비스 X)')
+    parser.add_argument('--posts', type=parse_scale, default=parse_scale('10k'), help='post 수 (10k, 100k, 1M)')
+    parser.add_argument('--users', type=int, default=None, help='user 수 (기본 = post 100개 당 1명, 최소 10)')
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument('--comments-per-post', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=20, help='case 당 측정 횟수')
+    parser.add_argument('--warmup', type=int, default=2, help='case 당 측정 전 실행 횟수')
+    parser.add_argument('--only', nargs='*', help='이름에 포함된 case 만 (예: views.post search)')
+    parser.add_argument('--page-cache', action='store_true', help='페이지 캐시 켜고 측정')
+    parser.add_argument('--seed-dir', default=os.path.join(gettempdir(), 'myblog-benchmark'), help='seed DB 저장 경로')
+    parser.add_argument('--output', default='benchmark_result.json', help='결과 JSON')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='비교할 baseline JSON (scale 별)')
+    parser.add_argument('--save-baseline', action='store_true', help='결과를 baseline 으로 저장 (같은 scale 만 교체)')
+    parser.add_argument('--threshold', type=float, default=0.5, help='median 회귀 기준 비율 (실행 간 잡음 30~50%% 고려)')
+    parser.add_argument('--min-ms', type=float, default=2.0, help='회귀로 보는 최소 median 차이 (ms)')
+    args = parser.parse_args(argv)
+
+    seeder = Seeder(args.posts, args.users, args.categories, args.comments_per_post)
+    results, meta = run_benchmark(seeder, args.seed_dir, args.repeat, args.warmup, args.only, args.page_cache)
+    save_json(args.output, {'meta': meta, 'results': results})
+    print(f'결과 저장 => {args.output}')
+
+    # baseline = {scale(post 수): {'meta', 'results'}}, 같은 scale 끼리만 비교
+    scale = str(seeder.posts)
+    baselines = load_baseline(args.baseline)
+    baseline = baselines.get(scale)
+    if args.save_baseline:
+        saved = dict(baseline['results']) if baseline and args.only else {}
+        saved.update(results)
+        baselines[scale] = {'meta': meta, 'results': saved}
+        save_json(args.baseline, baselines)
+        print(f'baseline 저장 => {args.baseline} (posts={scale})')
+        return 0
+    if not baseline:
+        print(f'posts={scale} baseline 없음 (--save-baseline 으로 저장)')
+        return 0
+
+    regressions = compare(results, baseline['results'], args.threshold, args.min_ms)
+    for name, reason in regressions:
+        print(f'회귀: {name}: {reason}')
+    print(f'baseline 비교: case {len(results)}개, 회귀 {len(regressions)}개')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
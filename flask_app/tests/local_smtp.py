@@ -0,0 +1,85 @@
+from socket import SHUT_RDWR
+from threading import Thread, Lock
+from socketserver import ThreadingTCPServer, StreamRequestHandler
+
+class LocalSmtpServer(ThreadingTCPServer):
+    '''
+    테스트용 로컬 SMTP 서버 (외부 네트워크 X, TLS, 로그인 X)
+    받은 메세지 = messages [(보낸 사람, [받는 사람], 본문)], 연결 수 = connections
+    reject_prefix 로 시작하는 받는 사람 = 550 거부
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, reject_prefix='reject'):
+        super().__init__((host, port), LocalSmtpHandler)
+        self.reject_prefix = reject_prefix
+        self.messages = []
+        self.connections = 0
+        self.clients = set()
+        self.lock = Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        # 서버 중단 = 새 연결 거부 + 열린 연결도 끊기
+        self.shutdown()
+        self.server_close()
+        with self.lock:
+            for client in self.clients:
+                try:
+                    client.shutdown(SHUT_RDWR)
+                except OSError:
+                    pass
+            self.clients.clear()
+
+class LocalSmtpHandler(StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            server.clients.add(self.connection)
+        self.reply('220 localhost ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line: return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip().strip('<>'), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipient = command.split(':', 1)[1].strip().strip('<>')
+                if recipient.startswith(server.reject_prefix):
+                    self.reply('550 No such user')
+                    continue
+                recipients.append(recipient)
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b'.\r\n', b'.\n'): break
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                with server.lock: server.messages.append((sender, recipients, b''.join(data).decode()))
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
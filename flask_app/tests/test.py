@@ -17,4 +17,10 @@ if __name__ == '__main__':
     # comment_test = unittest.TestLoader().loadTestsFromTestCase(CommentTest)
     # unittest.TextTestRunner(verbosity=2).run(comment_test)
 
+    # SQLite engine 설정(pragma, write lane) 확인
+    from test_4_sqlite import SqliteProfileTest
+
+    # 페이지 캐시, 객체 캐시(session user 포함) 확인
+    from test_5_cache import PageCacheTest, ObjectCacheTest
+
     unittest.main(argv=[''], verbosity=2, exit=False) # 전체 테스트 실행
\ No newline at end of file
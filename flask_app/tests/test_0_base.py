@@ -4,12 +4,45 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import unittest
+from contextlib import contextmanager
+from flask.testing import FlaskClient
 from flask_login import login_user, logout_user
+from sqlalchemy import event
 
 from blog.factory import create_app
 from blog.api.models import db, get_model
+from blog.api.utils.query import QueryCounter
 from tests.test_config import TestConfig
 
+class GuardClient(FlaskClient):
+    '''
+    모든 테스트 요청에서 확인 = 실패하면 요청한 테스트가 실패
+    1. view 쿼리 예산 (Deco.query_budget = X-SQL-Budget, X-SQL-Budget-Count 헤더)
+    2. 템플릿 렌더링 중 relationship lazy load (StrictLoading = X-Strict-Loading-Error 헤더)
+    '''
+    def open(self, *args, **kwargs):
+        response = super().open(*args, **kwargs)
+        if 'X-Strict-Loading-Error' in response.headers:
+            raise AssertionError(response.get_data(as_text=True))
+        budget, count = response.headers.get('X-SQL-Budget'), response.headers.get('X-SQL-Budget-Count')
+        if budget and int(count) > int(budget):
+            raise AssertionError(f'{response.request.method} {response.request.path}: 쿼리 {count}번 > 예산 {budget}번')
+        return response
+
+def use_old_sqlite(engine):
+    '''
+    배포 이미지(python:3.8.8 = SQLite 3.27) 와 같은 조건으로 테스트
+    SQLite 3.35 미만 = RETURNING 없음 => ORM 도 RETURNING 을 쓰지 않도록 + 직접 쓴 .returning() 은 실행 전에 에러
+    '''
+    dialect = engine.dialect
+    dialect.insert_returning = dialect.update_returning = dialect.delete_returning = False
+    if not event.contains(engine, 'before_cursor_execute', reject_returning):
+        event.listen(engine, 'before_cursor_execute', reject_returning)
+
+def reject_returning(conn, cursor, statement, parameters, context, executemany):
+    if ' RETURNING ' in f' {statement} '.replace('\n', ' '):
+        raise AssertionError(f'SQLite 3.35 미만에서 실행 불가 (RETURNING): {statement}')
+
 class TestBase(unittest.TestCase):
     name = 'BASE'
     
@@ -18,7 +51,10 @@ class TestBase(unittest.TestCase):
     def setUpClass(cls) -> None:
         cls.app = create_app(config=TestConfig, mode='TEST') # Flask app 생성
         cls.app_context = cls.app.app_context() # app context 
+        with cls.app_context:
+            use_old_sqlite(db.engine)
         cls.app_test_request_context = cls.app.test_request_context() # test request context
+        cls.app.test_client_class = GuardClient # 요청마다 쿼리 예산, lazy load 확인
         cls.test_client = cls.app.test_client() # test client 생성
         return print(f'{cls.name} Test Start')
 
@@ -75,4 +111,17 @@ class TestBase(unittest.TestCase):
         login_user(getattr(self, f'user{user_num}'), remember=True)
 
     def logout(self):
-        logout_user()
\ No newline at end of file
+        logout_user()
+
+    @contextmanager
+    def assert_max_queries(self, max_queries):
+        # view 밖의 코드(모델 메소드 등) 쿼리 수 확인
+        with QueryCounter.measure() as stats:
+            yield stats
+        self.assertLessEqual(stats.count, max_queries,
+            f'쿼리 {stats.count}번 > {max_queries}번 (가장 느린 쿼리: {stats.slowest_statement})')
+
+    def assert_query_budget(self, response):
+        # 응답한 view 에 쿼리 예산이 있고, 예산 이하로 실행됐는지 확인
+        self.assertIn('X-SQL-Budget', response.headers, f'{response.request.path}: query_budget 이 없는 view')
+        self.assertLessEqual(int(response.headers['X-SQL-Budget-Count']), int(response.headers['X-SQL-Budget']))
@@ -4,9 +4,12 @@ import sys
 # 현재 스크립트의 부모 디렉터리를 상위로 추가
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from bs4 import BeautifulSoup
+from email import message_from_string
 
 from blog.api.models import get_model
+from blog.api.utils.email import Email, MailSender, SmtpConnection
 from tests.test_0_base import TestBase
+from tests.local_smtp import LocalSmtpServer
 
 class AuthTest(TestBase):
     name = 'AUTH'
@@ -118,4 +121,65 @@ class AuthTest(TestBase):
             email=self.user1.email,
             password=self.password,
         ))
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(response.status_code, 200)
+
+    '''
+    5. 이메일 outbox 전송 확인 (로컬 SMTP 서버)
+        otp 요청 = outbox 에 저장만 (요청 중 전송 X)
+        sender = 연결 1개로 batch 전송, 수신 거부 = 바로 failed
+        서버 중단 = 재시도 예약 (attempts, next_attempt_at), 재시도 시간 전에는 다시 가져가지 않음
+        전송된 otp = 본문(인증번호) 삭제, 보관 기간이 지난 끝난 행 = 삭제
+    '''
+    def test_5_email_outbox(self):
+        EmailOutbox = get_model('email_outbox')
+        server = LocalSmtpServer().start()
+        config = self.app.config
+        backup = {key: config.get(key) for key in ('MAIL_SERVER', 'MAIL_PORT', 'MAIL_USE_TLS', 'MAIL_PASSWORD')}
+        config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=server.port, MAIL_USE_TLS=False, MAIL_PASSWORD=None)
+        connection = SmtpConnection(config)
+        try:
+            # 1. otp 요청 = pending 행 1개, 서버는 받은 메세지 없음
+            self.test_client.get('/auth/send-mail-otp')
+            rows = EmailOutbox.query.all()
+            self.assertEqual([(row.kind, row.recipient, row.status) for row in rows], [('otp', self.user1.email, 'pending')])
+            self.assertEqual(server.messages, [])
+
+            # 2. batch 전송 = 연결 1개, 수신 거부 = failed
+            Email.enqueue([
+                {'kind': 'test', 'recipient': 'reject@example.com', 'subject': 'reject', 'body': 'reject'},
+                {'kind': 'test', 'recipient': self.user2.email, 'subject': 'hello', 'body': 'hello'},
+            ])
+            self.assertEqual(MailSender.send_batch(self.app, connection), 3)
+            self.assertEqual(MailSender.send_batch(self.app, connection), 0)
+            status = {row.recipient: (row.status, row.attempts) for row in EmailOutbox.query.all()}
+            self.assertEqual(status, {
+                self.user1.email: ('sent', 1), self.user2.email: ('sent', 1), 'reject@example.com': ('failed', 1),
+            })
+            self.assertEqual(server.connections, 1)
+            self.assertEqual([recipients for _, recipients, _ in server.messages], [[self.user1.email], [self.user2.email]])
+            with self.test_client.session_transaction() as session:
+                otp = session[f'otp_{self.user1.email}']
+            body = message_from_string(server.messages[0][2]).get_payload(decode=True).decode()
+            self.assertIn(otp, body)
+            self.assertEqual(EmailOutbox.query.filter_by(kind='otp').one().body, '')       # 전송 후 인증번호 삭제
+            self.assertEqual(EmailOutbox.query.filter_by(subject='hello').one().body, 'hello')
+
+            # 3. 서버 중단 = 재시도 예약
+            server.stop()
+            Email.enqueue([{'kind': 'test', 'recipient': self.user2.email, 'subject': 'retry', 'body': 'retry'}])
+            connection.last_used = 0                                                # NOOP 확인 => 연결 끊김 => 다시 연결 실패
+            self.assertEqual(MailSender.send_batch(self.app, connection), 1)
+            row = EmailOutbox.query.filter_by(subject='retry').one()
+            self.assertEqual((row.status, row.attempts), ('pending', 1))
+            self.assertIsNotNone(row.last_error)
+            self.assertGreater(row.next_attempt_at, EmailOutbox.now())
+            self.assertEqual(MailSender.send_batch(self.app, connection), 0)
+
+            # 4. 보관 기간 정리 = 끝난 행(sent, failed)만 삭제, 재시도 대기 중인 행은 유지
+            self.assertEqual(EmailOutbox.purge(max_age=3600), 0)
+            self.assertEqual(EmailOutbox.purge(max_age=0), 3)
+            self.assertEqual([row.subject for row in EmailOutbox.query.all()], ['retry'])
+        finally:
+            connection.close()
+            config.update(backup)
+            server.stop()
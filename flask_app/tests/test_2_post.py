@@ -1,10 +1,25 @@
 import os
 import sys
+import io
+import time
+from unittest import skipUnless
+from hashlib import sha256
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 # 현재 스크립트의 부모 디렉터리를 상위로 추가
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from bs4 import BeautifulSoup
+from botocore.stub import Stubber
+from alembic.migration import MigrationContext
+from alembic.autogenerate import compare_metadata
+from werkzeug.datastructures import FileStorage
 
 from blog.api.models import get_model
+from blog.api.models import db
+from blog.api.utils.storage import Storage, LocalStorage
+from blog.api.utils.thumbnail import Image
+from blog.api.utils.decorator import Deco
+from blog.api.utils.query import QueryBudgetExceeded, StrictLoadingError
 from tests.test_0_base import TestBase
 
 class PostTest(TestBase):
@@ -115,4 +130,733 @@ class PostTest(TestBase):
 
         # 2. 삭제 포스트 접근 확인(Not Found = redirect 302)
         response = self.test_client.get('/post/1')
-        self.assertEqual(response.status_code, 302)
\ No newline at end of file
+        self.assertEqual(response.status_code, 302)
+
+        # 3. home 전체 개수(category 통계 합)에서도 빠졌는지 확인
+        response = self.test_client.get('/home')
+        source = BeautifulSoup(response.data, 'html.parser')
+        self.assertIn('총 0개', source.find(id='posts_count').text)
+    '''
+    4. post 목록 페이지네이션
+        한 페이지 개수 초과하도록 post 생성 후 home 접근
+        다음 페이지 커서로 이동 후 이전 페이지 커서 확인
+    '''
+    def test_4_posts_pagination(self):
+        from blog.api.models.base import PER_PAGE
+
+        # 1. 1페이지 + 1개가 되도록 post 추가 (setUp에서 1개 생성됨)
+        for i in range(PER_PAGE):
+            get_model('post')(
+                title=f'page title {i}',
+                content='page content',
+                category_id=2,
+                author_id=1,
+                user=self.user1,
+            ).add_instance()
+
+        # 2. 첫 페이지 = 최신 post부터 PER_PAGE개, 다음 페이지 버튼만 존재
+        response = self.test_client.get('/home')
+        source = BeautifulSoup(response.data, 'html.parser')
+        self.assertEqual(len(source.find_all(id='post_title')), PER_PAGE)
+        self.assertIn(f'총 {PER_PAGE + 1}개', source.find(id='posts_count').text)
+        self.assertIsNone(source.find(id='prev_page'))
+        next_page = source.find(id='next_page')
+        self.assertIsNotNone(next_page)
+
+        # 3. 다음 페이지 = 가장 오래된 post 1개, 이전 페이지 버튼만 존재
+        response = self.test_client.get(next_page['href'])
+        source = BeautifulSoup(response.data, 'html.parser')
+        titles = source.find_all(id='post_title')
+        self.assertEqual(len(titles), 1)
+        self.assertIn(self.post.title, titles[0].text)
+        self.assertIsNone(source.find(id='next_page'))
+        self.assertIsNotNone(source.find(id='prev_page'))
+
+    '''
+    5. post 검색
+        제목, 본문 검색 후 결과 + 하이라이트 확인
+        post 삭제 후 검색 결과에서 빠지는지 확인
+        migration autogenerate 가 search_index 테이블을 DROP 하지 않는지 확인
+    '''
+    def test_5_search_post(self):
+        # 1. 제목 검색 = 결과 1개 + 하이라이트
+        response = self.test_client.get('/search?q=title')
+        source = BeautifulSoup(response.data, 'html.parser')
+        self.assertIn(self.post.title, source.find(id='search_title').text)
+        self.assertIsNotNone(source.find(id='search_snippet').find('mark'))
+
+        # 2. 없는 단어 검색
+        response = self.test_client.get('/search?q=nothing')
+        source = BeautifulSoup(response.data, 'html.parser')
+        self.assertIsNotNone(source.find(id='empty_search'))
+
+        # 3. post 삭제 후 검색 결과 없음
+        self.test_client.delete('/post-delete/1')
+        response = self.test_client.get('/search?q=content')
+        source = BeautifulSoup(response.data, 'html.parser')
+        self.assertIsNone(source.find(id='search_title'))
+
+        # 4. autogenerate 비교 = 모델과 실제 DB 차이 중 search_index* 테이블 없음
+        with db.engine.connect() as connection:
+            context = MigrationContext.configure(connection, opts=self.app.extensions['migrate'].configure_args)
+            diffs = compare_metadata(context, db.metadata)
+        self.assertFalse([diff for diff in diffs if diff[0] == 'remove_table' and diff[1].name.startswith('search_index')])
+
+    '''
+    6. 일일 업로드 할당량 예약
+        할당량 초과 예약 실패, 해제 후 다시 예약 가능한지 확인
+    '''
+    def test_6_upload_quota(self):
+        quota = get_model('upload_quota')
+        day = quota.reserve(1, 3 * 1024 * 1024)
+        self.assertIsNotNone(day)
+        self.assertIsNone(quota.reserve(1, 3 * 1024 * 1024))
+
+        quota.release(1, day, 3 * 1024 * 1024)
+        self.assertIsNotNone(quota.reserve(1, 3 * 1024 * 1024))
+        self.assertEqual(quota.get_remaining(1), 2 * 1024 * 1024)
+
+    '''
+    7. 브라우저 직접 업로드 (presigned POST)
+        발급 후 s3 head_object 응답은 Stubber 로 대체 => 네트워크 없이 confirm 확인
+        같은 토큰 재사용 불가 (같은 post, 다른 post 모두 할당량 정산 X), post 를 지정한 토큰은 다른 post 에 사용 불가
+    '''
+    def test_7_direct_upload(self):
+        digest = sha256(b'x' * 1000).hexdigest()
+        response = self.test_client.post('/file-upload-url', json={'files': [{'name': 'image.png', 'size': 1000, 'sha256': digest}]})
+        self.assertEqual(response.status_code, 200)
+        upload, token = response.json['uploads'][0], response.json['token']
+        self.assertIn('policy', upload['fields'])
+        self.assertEqual(upload['fields']['key'], self.app.config['S3_DEFAULT_DIRS']['TEST'] + digest)
+
+        s3 = self.app.config['S3']
+        with Stubber(s3) as stubber:
+            stubber.add_response('head_object', {'ContentLength': 1000},
+                {'Bucket': self.app.config['S3_BUCKET_NAME'], 'Key': upload['fields']['key']})
+            response = self.test_client.post('/file-upload-confirm/1', json={'token': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['size'], 1000)
+        self.assertEqual(get_model('file').count_all(post_id=1), 1)
+        self.assertEqual(get_model('upload_quota').get_remaining(1), 5 * 1024 * 1024 - 1000)
+
+        # 이미 사용한 토큰 (같은 post, 다른 post), 잘못된 토큰
+        post = get_model('post')(title='title 2', content='content 2', category_id=2, author_id=1).add_instance()
+        for post_id in (1, post.id):
+            response = self.test_client.post(f'/file-upload-confirm/{post_id}', json={'token': token})
+            self.assertEqual(response.status_code, 400)
+        response = self.test_client.post('/file-upload-confirm/1', json={'token': 'wrong token'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(get_model('file').count_all(), 1)
+        self.assertEqual(get_model('upload_quota').get_remaining(1), 5 * 1024 * 1024 - 1000)
+
+        # post 를 지정한 토큰 = 다른 post 에 사용 X (사용 처리도 X)
+        response = self.test_client.post('/file-upload-url', json={'post_id': 1, 'files': [{'name': 'image.png', 'size': 1000, 'sha256': digest}]})
+        token = response.json['token']
+        response = self.test_client.post(f'/file-upload-confirm/{post.id}', json={'token': token})
+        self.assertEqual(response.status_code, 400)
+        response = self.test_client.post('/file-upload-confirm/1', json={'token': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_model('upload_ticket').count_all(confirmed_at=None), 0)
+
+    '''
+    8. 로컬 저장소 (LocalStorage) + 같은 내용 중복 저장 X (blob)
+        로컬 업로드 url 로 직접 업로드 => confirm => 서명된 다운로드 url 로 전체, Range 요청, nginx 전송 헤더 확인
+        policy 크기보다 크거나 digest 가 다른 파일은 저장 X
+        같은 내용 다시 업로드 = 업로드 url 발급 X, 할당량 사용 X, 마지막 참조가 삭제될 때만 저장소 객체 삭제
+    '''
+    def test_8_local_storage(self):
+        backend = Storage.backend
+        content = b'0123456789'
+        digest = sha256(content).hexdigest()
+        files = [{'name': 'a.txt', 'size': 10, 'sha256': digest}]
+        with TemporaryDirectory() as storage_dir:
+            self.app.config['LOCAL_STORAGE_DIR'] = storage_dir
+            with self.app.app_context():
+                Storage.backend = LocalStorage(self.app)
+            try:
+                response = self.test_client.post('/file-upload-url', json={'files': files})
+                upload, token = response.json['uploads'][0], response.json['token']
+
+                for wrong in [b'0123456789abc', b'9876543210']:
+                    data = dict(upload['fields'], file=(io.BytesIO(wrong), 'a.txt'))
+                    response = self.test_client.post(upload['url'], data=data, content_type='multipart/form-data')
+                    self.assertEqual(response.status_code, 400)
+                data = dict(upload['fields'], file=(io.BytesIO(content), 'a.txt'))
+                response = self.test_client.post(upload['url'], data=data, content_type='multipart/form-data')
+                self.assertEqual(response.status_code, 204)
+
+                response = self.test_client.post('/file-upload-confirm/1', json={'token': token})
+                self.assertEqual(response.json['size'], 10)
+
+                with self.app.test_request_context():
+                    url = Storage.get().presign(digest, 60, 'a.txt')
+                response = self.test_client.get(url)
+                self.assertEqual(response.data, content)
+                response.close()
+                response = self.test_client.get(url, headers={'Range': 'bytes=2-4'})
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response.data, b'234')
+                response.close()
+                response = self.test_client.get(url + 'x')
+                self.assertNotEqual(response.status_code, 200)
+
+                # nginx(X-Accel-Redirect) 전송 = send_file 과 같은 Content-Disposition (RFC 5987 파일 이름)
+                Storage.get().accel_prefix = '/internal/'
+                with self.app.test_request_context():
+                    url = Storage.get().presign(digest, 60, '첨부 파일.txt')
+                response = self.test_client.get(url)
+                self.assertTrue(response.headers['X-Accel-Redirect'].endswith('/' + digest))
+                self.assertIn("filename*=UTF-8''%EC%B2%A8%EB%B6%80%20%ED%8C%8C%EC%9D%BC.txt", response.headers['Content-Disposition'])
+                self.assertTrue(response.headers['Content-Disposition'].startswith('inline; filename='))
+                Storage.get().accel_prefix = None
+
+                # 같은 내용 = 업로드 생략, 할당량 그대로
+                post = get_model('post')(title='title 2', content='content 2', category_id=2, author_id=1).add_instance()
+                response = self.test_client.post('/file-upload-url', json={'files': files})
+                self.assertEqual(response.json['uploads'], [])
+                response = self.test_client.post(f'/file-upload-confirm/{post.id}', json={'token': response.json['token']})
+                self.assertEqual(response.json['size'], 0)
+                self.assertEqual(get_model('upload_quota').get_remaining(1), 5 * 1024 * 1024 - 10)
+                self.assertEqual(get_model('blob').get_instance_with(digest=digest).ref_count, 2)
+
+                get_model('post').delete_all_by_ids([1])
+                get_model('storage_tombstone').drain()
+                self.assertEqual(Storage.get().head(digest), 10)
+                get_model('post').delete_all_by_ids([post.id])
+                get_model('storage_tombstone').drain()
+                self.assertIsNone(Storage.get().head(digest))
+                self.assertEqual(get_model('blob').count_all(), 0)
+                self.assertEqual(get_model('storage_tombstone').count_all(), 0)
+            finally:
+                Storage.backend = backend
+
+    '''
+    9. 이미지 썸네일 (Pillow 필요)
+        업로드 요청은 썸네일 생성을 기다리지 않음 => 백그라운드 생성 후 post 페이지에 썸네일(srcset) 표시
+        이미지 처리 프로세스 = fork 로 시작 X, 생성 실패 = app.logger 에 기록
+    '''
+    @skipUnless(Image, 'Pillow 없음')
+    def test_9_thumbnail(self):
+        from blog.api.utils.thumbnail import Thumbnail
+        self.assertIn(Thumbnail.get_mp_context(self.app.config).get_start_method(), ('forkserver', 'spawn'))
+
+        backend = Storage.backend
+        image = io.BytesIO()
+        Image.new('RGB', (2000, 1000), (255, 0, 0)).save(image, 'PNG')
+        image.seek(0)
+        with TemporaryDirectory() as storage_dir:
+            self.app.config['LOCAL_STORAGE_DIR'] = storage_dir
+            with self.app.app_context():
+                Storage.backend = LocalStorage(self.app)
+            try:
+                response = self.test_client.post('/post-create', data={
+                    'title': 'image', 'content': 'image', 'category_id': 2, 'files': [(image, 'image.png')],
+                }, content_type='multipart/form-data')
+                self.assertEqual(response.status_code, 302)
+
+                blob = None
+                for _ in range(100):
+                    blob = get_model('blob').query.first()
+                    if blob.thumbnail_status != 'pending': break
+                    db.session.rollback()
+                    time.sleep(0.1)
+                self.assertEqual(blob.thumbnail_status, 'done')
+                self.assertEqual(blob.get_thumbnail_widths(), [480, 1200])
+                self.assertTrue(blob.preview.startswith('data:image/jpeg;base64,'))
+
+                response = self.test_client.get(f'/post/{get_model("file").query.first().post_id}')
+                self.assertIn('srcset', response.get_data(as_text=True))
+
+                # 다운로드 url = 만료 전까지 재사용
+                with self.app.test_request_context():
+                    storage = Storage.get()
+                    url = storage.get_download_url(blob.digest, 'image.png')
+                    self.assertEqual(storage.get_download_url(blob.digest, 'image.png'), url)
+
+                # 원본이 없는 경우 = 에러 로그(traceback) 남기고 실패 처리
+                with self.assertLogs(self.app.logger, 'ERROR') as logs:
+                    Thumbnail.process(self.app, 'missing')
+                self.assertIn('Traceback', logs.output[0])
+            finally:
+                Storage.backend = backend
+
+    '''
+    10. 저장소 삭제 예약 (tombstone)
+        삭제 실패한 key 는 남아서 backoff 후 재시도, 성공한 key 만 행 삭제
+    '''
+    def test_10_storage_tombstone(self):
+        tombstone = get_model('storage_tombstone')
+        tombstone.add(db.session, ['a', 'b'])
+        db.session.commit()
+
+        s3 = self.app.config['S3']
+        with Stubber(s3) as stubber:
+            stubber.add_response('delete_objects', {'Errors': [{'Key': 'TEST/b', 'Code': 'InternalError', 'Message': 'x'}]})
+            self.assertEqual(tombstone.drain(), (1, 1))
+        row = tombstone.get_instance_with(key='b')
+        self.assertEqual((row.attempts, row.last_error), (1, 'InternalError: x'))
+        # backoff 시간 전 = 시도 X
+        self.assertEqual(tombstone.drain(), (0, 0))
+
+    '''
+    11. 쿼리 예산 확인
+        post, comment 수와 무관하게 view 쿼리 수가 예산 이하
+        post 작성 최대 쿼리 = 이미지 파일 + 직접 업로드 토큰(이미지)을 같이 보낸 요청도 예산 이하
+        예산 초과 = 결과 기록 (개발 모드 = 에러)
+    '''
+    def test_11_query_budget(self):
+        for i in range(5):
+            get_model('post')(title=f'budget title {i}', content='budget content', category_id=i % 2 + 1, author_id=i % 2 + 1).add_instance()
+            get_model('comment')(content=f'budget comment {i}', post_id=1, author_id=i % 2 + 1).add_instance()
+
+        # 1. 목록, 읽기, 검색, 수정 페이지 = 예산 이하
+        for url in ('/home', '/user_posts/1', '/posts-list/1', '/category', '/search?q=budget', '/post/1', '/post-create', '/post-edit/1'):
+            response = self.test_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assert_query_budget(response)
+            self.assertIn('X-SQL-Time-Ms', response.headers)
+        self.assert_query_budget(self.test_client.post('/comment-create/1', data=dict(content='budget comment')))
+
+        # 1-1. post 작성 최대 쿼리 (파일 업로드 + 직접 업로드 확인 + 썸네일 등록)
+        backend = Storage.backend
+        with TemporaryDirectory() as storage_dir:
+            self.app.config['LOCAL_STORAGE_DIR'] = storage_dir
+            with self.app.app_context():
+                Storage.backend = LocalStorage(self.app)
+            try:
+                images = []
+                for color in ((255, 0, 0), (0, 0, 255)):
+                    image = io.BytesIO()
+                    Image.new('RGB', (600, 300), color).save(image, 'PNG')
+                    images.append(image.getvalue())
+                files = [{'name': 'direct.png', 'size': len(images[1]), 'sha256': sha256(images[1]).hexdigest()}]
+                response = self.test_client.post('/file-upload-url', json={'files': files})
+                upload, token = response.json['uploads'][0], response.json['token']
+                data = dict(upload['fields'], file=(io.BytesIO(images[1]), 'direct.png'))
+                self.assertEqual(self.test_client.post(upload['url'], data=data, content_type='multipart/form-data').status_code, 204)
+
+                response = self.test_client.post('/post-create', data={
+                    'title': 'budget files', 'content': 'budget files', 'category_id': 2, 'upload_token': token,
+                    'files': [(io.BytesIO(images[0]), 'form.png'), (io.BytesIO(b'budget text'), 'form.txt')],
+                }, content_type='multipart/form-data')
+                self.assertEqual(response.status_code, 302)
+                self.assert_query_budget(response)
+                self.assertEqual(get_model('file').count_all(), 3)
+
+                # 썸네일 생성이 끝난 뒤 저장소 원래대로
+                for _ in range(100):
+                    if not get_model('blob').get_pending_thumbnails(): break
+                    db.session.rollback()
+                    time.sleep(0.1)
+            finally:
+                Storage.backend = backend
+
+        # 2. 목록 조회 = post 수와 무관 (user, category 는 한 번에 로드)
+        with self.assert_max_queries(3):
+            posts = get_model('post').get_page_with('user', 'category')
+            [(post.user.username, post.category.name) for post in posts.items]
+
+        # 3. 예산 초과 = g 에 기록, 개발 모드 = 에러
+        @Deco.query_budget(1)
+        def over_budget():
+            get_model('post').count_all()
+            get_model('comment').count_all()
+
+        with self.app.test_request_context():
+            from flask import g
+            over_budget()
+            self.assertEqual(g.query_budget, (1, 2))
+            self.app.config['QUERY_BUDGET_RAISE_MODES'] = ('TEST',)
+            try:
+                with self.assertRaises(QueryBudgetExceeded):
+                    over_budget()
+            finally:
+                self.app.config['QUERY_BUDGET_RAISE_MODES'] = ()
+
+    '''
+    12. strict 모드 (N+1) 확인
+        템플릿 렌더링 중 relationship lazy load = 에러 (view, 템플릿, relationship 이름 포함)
+        로드 옵션으로 미리 로드하면 정상
+    '''
+    def test_12_strict_loading(self):
+        for i in range(3):
+            get_model('post')(title=f'strict title {i}', content='strict content', category_id=1, author_id=1).add_instance()
+
+        with self.app.test_request_context('/posts-list/1'):
+            db.session.expunge_all()
+            posts = get_model('post').get_page_with(category_id=1)
+            with self.assertRaises(StrictLoadingError) as context:
+                Deco.render_template_with_user(template_name_or_list='views/posts_list.html', posts=posts, posts_count=3, type='category_posts', category_name='category 1')
+            message = str(context.exception)
+            self.assertIn('views.posts_list', message)
+            self.assertIn('views/posts_list.html', message)
+            self.assertRegex(message, r'Post\.(user|category)')
+
+            db.session.expunge_all()
+            posts = get_model('post').get_page_with('user', 'category', category_id=1)
+            Deco.render_template_with_user(template_name_or_list='views/posts_list.html', posts=posts, posts_count=3, type='category_posts', category_name='category 1')
+
+        # 렌더링 밖의 lazy load = 허용
+        db.session.expunge_all()
+        self.assertEqual(get_model('post').get_all()[0].user.id, 1)
+
+    '''
+    13. 목록용 본문 요약 (excerpt)
+        저장된 excerpt = 공백 정리 + EXCERPT_LENGTH 글자 이하, 목록 페이지에 표시
+        NULL 인 excerpt (이전 데이터) = fill_none_columns 로 같은 값 채우기
+    '''
+    def test_13_excerpt(self):
+        from blog.api.models.post import EXCERPT_LENGTH
+
+        content = 'long\n\n content   ' * 30
+        post = get_model('post')(title='excerpt title', content=content, category_id=2, author_id=1).add_instance()
+        excerpt = get_model('post').make_excerpt(content)
+        self.assertEqual(post.excerpt, excerpt)
+        self.assertEqual(len(excerpt), EXCERPT_LENGTH)
+        self.assertTrue(excerpt.startswith('long content long'))
+        self.assertTrue(excerpt.endswith('...'))
+
+        response = self.test_client.get('/home')
+        source = BeautifulSoup(response.data, 'html.parser')
+        self.assertIn(excerpt, [tag.text for tag in source.find_all(id='post_excerpt')])
+
+        # excerpt NULL => fill_none_columns 로 채운 값 = 저장 시 만든 값
+        post_table = get_model('post').__table__
+        db.session.execute(post_table.update().values(excerpt=None))
+        db.session.commit()
+        get_model('post').fill_none_columns()
+        db.session.expire_all()
+        self.assertEqual(get_model('post').get_instance_by_id_with(post.id).excerpt, excerpt)
+        self.assertEqual(get_model('post').get_instance_by_id_with(1).excerpt, self.post.content)
+
+    '''
+    14. 카테고리 post 통계
+        post 추가, 카테고리 이동, 삭제 후 posts_count, latest_post_id, latest_post_date 확인
+        통계 컬럼이 없던 기존 DB(NULL) = update_all_model_instances 로 채우기
+    '''
+    def test_14_category_stats(self):
+        def get_stats(category_id):
+            db.session.expire_all()
+            category = get_model('category').get_instance_by_id_with(category_id)
+            return category.posts_count, category.latest_post_id, category.latest_post_date
+
+        # 1. 추가 = 새 post 가 최신 post
+        post = get_model('post')(title='stats title', content='stats content', category_id=2, author_id=1).add_instance()
+        self.assertEqual(get_stats(2), (2, post.id, post.date_created))
+        self.assertEqual(get_stats(1), (0, None, None))
+
+        # 2. 이동 = 이전 카테고리 최신 post 다시 찾기
+        post.update_instance(category_id=1)
+        self.assertEqual(get_stats(2), (1, self.post.id, self.post.date_created))
+        self.assertEqual(get_stats(1), (1, post.id, post.date_created))
+
+        # 3. 삭제 (인스턴스, 일괄)
+        post.delete_instance()
+        self.assertEqual(get_stats(1), (0, None, None))
+        get_model('post').delete_all_by_ids([self.post.id])
+        self.assertEqual(get_stats(2), (0, None, None))
+        self.assertEqual(get_model('category').get_total_posts_count(), 0)
+
+        # 4. 기존 DB = migration 으로 추가된 컬럼이 NULL => 명령어 실행 후 실제 post 기준으로 채워짐
+        post = get_model('post')(title='stats title', content='stats content', category_id=2, author_id=1).add_instance()
+        db.session.execute(get_model('category').__table__.update().values(posts_count=None, latest_post_id=None, latest_post_date=None))
+        db.session.commit()
+        result = self.app.test_cli_runner().invoke(args=['update_all_model_instances'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(get_stats(2), (1, post.id, post.date_created))
+        self.assertEqual(get_stats(1), (0, None, None))
+
+    '''
+    15. 카운터 원자적 갱신
+        세션에 불러온 값이 오래된 값이어도 UPDATE ... SET x = x + 1 로 갱신 = 다른 요청의 증가분 유실 X
+    '''
+    def test_15_atomic_counters(self):
+        from sqlalchemy import event
+
+        post = get_model('post').get_instance_by_id_with(1)
+        user = get_model('user').get_instance_by_id_with(1)
+        self.assertEqual((post.comments_count, user.comments_count), (0, 0))
+
+        # 1. 다른 worker 가 댓글 추가 (세션의 post, user 값은 그대로 0)
+        with db.engine.begin() as connection:
+            connection.execute(post.__table__.update().where(post.__table__.c.id == 1).values(comments_count=1))
+            connection.execute(user.__table__.update().where(user.__table__.c.id == 1).values(comments_count=1))
+
+        # 2. 현재 세션에서 댓글 추가 = 카운터는 SQL 로만 증가 (post, user 다시 조회 X)
+        statements = []
+        def before_execute(conn, cursor, statement, *args):
+            statements.append(' '.join(statement.split()))
+        event.listen(db.engine, 'before_cursor_execute', before_execute)
+        try:
+            get_model('comment')(content='atomic comment', post_id=1, author_id=1).add_instance()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_execute)
+        self.assertTrue(any(s.startswith('UPDATE post SET comments_count=(coalesce(post.comments_count') for s in statements))
+        self.assertTrue(any(s.startswith('UPDATE user SET comments_count=(coalesce(user.comments_count') for s in statements))
+
+        db.session.expire_all()
+        self.assertEqual(get_model('post').get_instance_by_id_with(1).comments_count, 2)
+        self.assertEqual(get_model('user').get_instance_by_id_with(1).comments_count, 2)
+
+    '''
+    16. 첨부 파일 동시 업로드
+        새 내용 파일들은 동시에 업로드 (순서대로 올리면 barrier 대기 시간 초과 = 실패)
+        같은 요청 안의 중복 파일 = 1번만 업로드, blob 참조 수만 증가 + 할당량은 새로 저장된 용량만
+    '''
+    def test_16_parallel_upload(self):
+        from threading import Barrier
+
+        backend = Storage.backend
+        contents = {'a.txt': b'a' * 100, 'b.txt': b'b' * 200, 'c.txt': b'a' * 100}
+        barrier = Barrier(2, timeout=5)
+        def upload_to_storage(storage, key, file, transfer_config):
+            barrier.wait()
+            storage.put(key, file, transfer_config)
+
+        with TemporaryDirectory() as storage_dir:
+            self.app.config['LOCAL_STORAGE_DIR'] = storage_dir
+            with self.app.app_context():
+                Storage.backend = LocalStorage(self.app)
+            try:
+                with patch.object(get_model('file'), 'upload_to_storage', staticmethod(upload_to_storage)):
+                    response = self.test_client.post('/post-create', data={
+                        'title': 'files', 'content': 'files', 'category_id': 2,
+                        'files': [(io.BytesIO(content), name) for name, content in contents.items()],
+                    }, content_type='multipart/form-data')
+                self.assertEqual(response.status_code, 302)
+
+                post_id = get_model('file').query.first().post_id
+                self.assertEqual(get_model('file').count_all(post_id=post_id), 3)
+                self.assertEqual(get_model('blob').count_all(), 2)
+                for content, ref_count in ((contents['a.txt'], 2), (contents['b.txt'], 1)):
+                    digest = sha256(content).hexdigest()
+                    self.assertEqual(get_model('blob').get_instance_with(digest=digest).ref_count, ref_count)
+                    self.assertEqual(Storage.get().head(digest), len(content))
+                self.assertEqual(get_model('upload_quota').get_remaining(1), 5 * 1024 * 1024 - 300)
+            finally:
+                Storage.backend = backend
+
+    '''
+    17. 업로드 크기 제한 (할당량)
+        Content-Length 가 남은 할당량보다 크면 파일 바이트를 처음부터 버림 (임시 파일에 쓰지 않음)
+        Content-Length 가 없어도(chunked) 할당량을 넘는 순간부터 버림
+        post 생성 X + 에러 메세지 + 작성한 제목, 본문 그대로 작성 화면
+    '''
+    def test_17_upload_too_large(self):
+        from tempfile import SpooledTemporaryFile
+        written = []
+        spool_write = SpooledTemporaryFile.write
+        def counting_write(file, data):
+            written.append(len(data))
+            return spool_write(file, data)
+
+        remaining = 1000
+        get_model('upload_quota').reserve(1, 5 * 1024 * 1024 - remaining)
+        boundary = 'quota-boundary'
+        body = ''.join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in (('title', 'big title'), ('content', 'big content'), ('category_id', '2'))
+        ).encode() + (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="big.bin"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode() + b'x' * 1024 * 1024 + f'\r\n--{boundary}--\r\n'.encode()
+        content_type = f'multipart/form-data; boundary={boundary}'
+
+        def assert_form_kept(response):
+            self.assertEqual(response.status_code, 200)
+            source = BeautifulSoup(response.data, 'html.parser')
+            self.assertIn('할당량', source.find(class_='alert-danger').text)
+            self.assertEqual(source.find(id='title')['value'], 'big title')
+            self.assertEqual(source.find(id='content').text.strip(), 'big content')
+
+        with patch.object(SpooledTemporaryFile, 'write', counting_write):
+            # 1. Content-Length 초과 = 파일 바이트 저장 X
+            response = self.test_client.post('/post-create', data=body, content_type=content_type, content_length=len(body))
+            assert_form_kept(response)
+            self.assertEqual(sum(written), 0)
+
+            # 2. chunked = 할당량까지만 저장, 나머지 파일 바이트는 버림
+            response = self.test_client.post('/post-create', input_stream=io.BytesIO(body), content_type=content_type,
+                environ_overrides={'wsgi.input_terminated': True})
+            assert_form_kept(response)
+            self.assertLessEqual(sum(written), remaining)
+        self.assertEqual(get_model('post').count_all(), 1)
+        self.assertEqual(get_model('upload_quota').get_remaining(1), remaining)
+
+    '''
+    18. confirm 되지 않은 직접 업로드 정리
+        토큰 만료 시간이 지난 발급 = 예약 해제 + 올라간 객체 삭제 예약 + 발급 기록 삭제
+        confirm 된 발급 = 기록만 삭제, 아직 대기 중인 다른 발급의 digest 는 삭제 예약 X
+    '''
+    def test_18_expire_upload_tickets(self):
+        from datetime import timedelta
+        from blog.api.models.upload_ticket import UPLOAD_TOKEN_MAX_AGE
+
+        ticket = get_model('upload_ticket')
+        files = [{'name': f'{name}.txt', 'size': 100, 'sha256': sha256(name.encode()).hexdigest()} for name in ('a', 'b')]
+        for file in files:
+            response = self.test_client.post('/file-upload-url', json={'files': [file]})
+            self.assertEqual(len(response.json['uploads']), 1)
+        self.assertEqual(get_model('upload_quota').get_remaining(1), 5 * 1024 * 1024 - 200)
+
+        # a 발급만 만료 + 다른 대기 중인 발급이 같은 b 를 올리는 중
+        response = self.test_client.post('/file-upload-url', json={'files': [files[1]]})
+        db.session.execute(ticket.__table__.update().where(ticket.__table__.c.id.in_([1, 2]))
+            .values(date_created=ticket.now() - timedelta(seconds=UPLOAD_TOKEN_MAX_AGE + 60)))
+        db.session.commit()
+
+        self.assertEqual(ticket.expire(), 2)
+        self.assertEqual(ticket.count_all(), 1)
+        self.assertEqual(get_model('upload_quota').get_remaining(1), 5 * 1024 * 1024 - 100)
+        self.assertEqual([row.key for row in get_model('storage_tombstone').query.all()], [files[0]['sha256']])
+        self.assertEqual(ticket.expire(), 0)
+
+    '''
+    19. 저장소 삭제 예약 drain 과 다시 올리는 요청
+        drain 이 대상을 고른 뒤(lease 전) 다른 요청이 예약을 취소(같은 내용 다시 업로드)하면 저장소 객체 유지
+        만료 전 직접 업로드 발급이 있는 내용 = 행 유지 + 객체 유지, 업로드 요청 = 올리기 전에 예약 취소
+        저장소 삭제 = 트랜잭션 없이, 삭제 중(lease) 같은 내용 업로드 = 삭제가 끝난 뒤 다시 올림
+    '''
+    def test_19_storage_drain_race(self):
+        from threading import Thread
+        from sqlalchemy import event
+
+        backend = Storage.backend
+        tombstone = get_model('storage_tombstone')
+        contents = [b'race content', b'ticket content', b'upload content']
+        digests = [sha256(content).hexdigest() for content in contents]
+        with TemporaryDirectory() as storage_dir:
+            self.app.config['LOCAL_STORAGE_DIR'] = storage_dir
+            with self.app.app_context():
+                Storage.backend = LocalStorage(self.app)
+            try:
+                for digest, content in zip(digests, contents):
+                    Storage.get().put(digest, io.BytesIO(content))
+
+                # 1. drain 이 대상을 고른 직후(lease 전) 다른 요청이 예약 취소
+                tombstone.add(db.session, [digests[0]])
+                db.session.commit()
+                def cancel():
+                    with self.app.app_context():
+                        tombstone.cancel(db.session, [digests[0]])
+                        db.session.commit()
+                cancelled = []
+                def before_execute(conn, cursor, statement, *args):
+                    if statement.startswith('UPDATE storage_tombstone') and not cancelled:
+                        cancelled.append(statement)
+                        thread = Thread(target=cancel)
+                        thread.start()
+                        thread.join(10)
+                event.listen(db.engine, 'before_cursor_execute', before_execute)
+                try:
+                    self.assertEqual(tombstone.drain(), (0, 0))
+                finally:
+                    event.remove(db.engine, 'before_cursor_execute', before_execute)
+                self.assertEqual(len(cancelled), 1)
+                self.assertEqual(tombstone.count_all(), 0)
+                self.assertEqual(Storage.get().head(digests[0]), len(contents[0]))
+
+                # 2. 만료 전 발급이 있는 내용 = 다음 drain 까지 유지
+                self.test_client.post('/file-upload-url', json={'files': [{'name': 'b.txt', 'size': len(contents[1]), 'sha256': digests[1]}]})
+                tombstone.add(db.session, [digests[1]])
+                db.session.commit()
+                self.assertEqual(tombstone.drain(), (0, 0))
+                self.assertEqual(tombstone.count_all(), 1)
+                self.assertEqual(Storage.get().head(digests[1]), len(contents[1]))
+
+                # 3. 업로드 요청 = 예약 취소 후 업로드, drain 후에도 유지
+                tombstone.add(db.session, [digests[2]])
+                db.session.commit()
+                response = self.test_client.post('/post-create', data={
+                    'title': 'again', 'content': 'again', 'category_id': 2, 'files': [(io.BytesIO(contents[2]), 'c.txt')],
+                }, content_type='multipart/form-data')
+                self.assertEqual(response.status_code, 302)
+                self.assertIsNone(tombstone.get_instance_with(key=digests[2]))
+                tombstone.drain()
+                self.assertEqual(Storage.get().head(digests[2]), len(contents[2]))
+
+                # 4. 저장소 삭제 중(lease) 같은 내용 업로드 = 삭제가 끝날 때까지 기다린 뒤 다시 올림
+                content = b'drain content'
+                digest = sha256(content).hexdigest()
+                storage = Storage.get()
+                storage.put(digest, io.BytesIO(content))
+                tombstone.add(db.session, [digest])
+                db.session.commit()
+                def upload():
+                    with self.app.app_context():
+                        get_model('file').upload_files([FileStorage(io.BytesIO(content), 'd.txt')], 1, 1)
+                        db.session.remove()
+                uploader = Thread(target=upload)
+                events = []
+                delete, put = storage.delete, storage.put
+                def slow_delete(keys):
+                    events.append(('delete', db.session().in_transaction()))
+                    uploader.start()
+                    time.sleep(0.5)
+                    return delete(keys)
+                def recording_put(key, *args):
+                    events.append(('put', key))
+                    return put(key, *args)
+                with patch.object(storage, 'delete', slow_delete), patch.object(storage, 'put', recording_put):
+                    self.assertEqual(tombstone.drain(), (1, 0))
+                    uploader.join(10)
+                self.assertEqual(events, [('delete', False), ('put', digest)])
+                self.assertEqual(storage.head(digest), len(content))
+                self.assertEqual(tombstone.count_all(), 1)                          # 2번의 대기 중인 발급
+            finally:
+                Storage.backend = backend
+
+    '''
+    20. 이미 있는 내용 업로드와 마지막 참조 삭제
+        참조를 먼저 잡은 뒤 전송 생략 여부 확인 => 그 뒤 다른 요청이 마지막 참조를 삭제 + drain 해도 저장소 객체 유지
+        전송 실패 = 잡아둔 참조 해제 (새로 추가된 blob 삭제 + 삭제 예약)
+    '''
+    def test_20_blob_refs(self):
+        from threading import Thread
+        from sqlalchemy import event
+
+        backend = Storage.backend
+        File, Blob, tombstone = get_model('file'), get_model('blob'), get_model('storage_tombstone')
+        content = b'shared content'
+        digest = sha256(content).hexdigest()
+        def upload(name, data=content):
+            return File.upload_files([FileStorage(io.BytesIO(data), name)], 1, 1)
+        with TemporaryDirectory() as storage_dir:
+            self.app.config['LOCAL_STORAGE_DIR'] = storage_dir
+            with self.app.app_context():
+                Storage.backend = LocalStorage(self.app)
+            try:
+                self.assertEqual(upload('a.txt'), (len(content), []))
+                file_id = File.get_instance_with(digest=digest).id
+
+                # 1. 전송 생략을 정한 뒤(file 행 추가 전) 다른 요청이 마지막 참조 삭제 + drain
+                def delete_last_ref():
+                    with self.app.app_context():
+                        db.session.get(File, file_id).delete_instance()
+                        tombstone.drain()
+                        db.session.remove()
+                deleter = Thread(target=delete_last_ref)
+                def before_execute(conn, cursor, statement, *args):
+                    if statement.startswith('INSERT INTO file') and deleter.ident is None:
+                        deleter.start()
+                        time.sleep(0.5)
+                event.listen(db.engine, 'before_cursor_execute', before_execute)
+                try:
+                    self.assertEqual(upload('b.txt'), (0, []))
+                finally:
+                    event.remove(db.engine, 'before_cursor_execute', before_execute)
+                deleter.join(10)
+                self.assertEqual(File.count_all(digest=digest), 1)
+                self.assertEqual(Blob.get_instance_with(digest=digest).ref_count, 1)
+                self.assertEqual(Storage.get().head(digest), len(content))
+
+                # 2. 전송 실패 = 참조 해제
+                failed = sha256(b'failed content').hexdigest()
+                def fail(storage, key, file, transfer_config):
+                    raise OSError('upload failed')
+                with patch.object(File, 'upload_to_storage', staticmethod(fail)):
+                    self.assertEqual(upload('c.txt', b'failed content'), (0, [('c.txt', 'upload failed')]))
+                self.assertIsNone(Blob.get_instance_with(digest=failed))
+                self.assertEqual([row.key for row in tombstone.query.all()], [failed])
+            finally:
+                Storage.backend = backend
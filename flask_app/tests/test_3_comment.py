@@ -2,9 +2,13 @@ import os
 import sys
 # 현재 스크립트의 부모 디렉터리를 상위로 추가
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+from threading import Thread
 from bs4 import BeautifulSoup
+from sqlalchemy import event
 
 from blog.api.models import get_model
+from blog.api.models import db
 from tests.test_0_base import TestBase
 
 class CommentTest(TestBase):
@@ -118,4 +122,95 @@ class CommentTest(TestBase):
         response = self.test_client.get('post/1')
         post_response = BeautifulSoup(response.data, 'html.parser')
         self.assertIsNotNone(post_response.find(id='commentList')) # commentList 있어야 함
-        self.assertIsNone(post_response.find(id='emptyComment')) # emptyComment 없어야 함
\ No newline at end of file
+        self.assertIsNone(post_response.find(id='emptyComment')) # emptyComment 없어야 함
+    '''
+    4. post 삭제 시 댓글 일괄 삭제 + 카운터 확인
+    '''
+    def test_4_post_delete_cascade(self):
+        get_model('comment')(content='second comment', post_id=1, author_id=1).add_instance()
+        response = self.test_client.delete('/post-delete/1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_model('comment').count_all(post_id=1), 0)
+
+        user = get_model('user').get_instance_by_id_with(1)
+        self.assertEqual(user.posts_count, 0)
+        self.assertEqual(user.comments_count, 0)
+        self.assertEqual(get_model('category').get_instance_by_id_with(2).posts_count, 0)
+
+    '''
+    5. 카운터 일괄 재계산 확인
+    '''
+    def test_5_recount(self):
+        user = get_model('user').get_instance_by_id_with(1)
+        user.update_instance(posts_count=10, comments_count=10)
+        self.assertEqual(get_model('user').recount(), 1)
+
+        user = get_model('user').get_instance_by_id_with(1)
+        self.assertEqual(user.posts_count, 1)
+        self.assertEqual(user.comments_count, 1)
+        self.assertEqual(get_model('user').recount(), 0)
+
+    '''
+    6. 새 댓글 알림 digest 확인
+        post 작성자 본인 댓글 = 이벤트 X
+        window 전 = digest X, window 후 = 작성자 당 이메일 1개 (outbox) + 이벤트 삭제
+    '''
+    def test_6_comment_digest(self):
+        CommentNotification, EmailOutbox = get_model('comment_notification'), get_model('email_outbox')
+        self.assertEqual(CommentNotification.count_all(), 0)
+
+        # 1. user2 = user1 게시글에 댓글 3개, user1 = user2 게시글에 댓글 1개
+        get_model('post')(title='second title', content='second content', category_id=2, author_id=2).add_instance()
+        self.test_client.post('/comment-create/2', data=dict(content='reply'))
+        self.logout()
+        self.login(2)
+        for i in range(3):
+            self.test_client.post('/comment-create/1', data=dict(content=f'comment {i}'))
+        self.assertEqual(CommentNotification.count_all(recipient_id=1), 3)
+        self.assertEqual(CommentNotification.count_all(recipient_id=2), 1)
+
+        # 2. window 전 = 전송 X
+        self.assertEqual(CommentNotification.send_digests(600), (0, 0))
+        self.assertEqual(EmailOutbox.count_all(), 0)
+
+        # 3. window 후 = 작성자 당 digest 1개
+        self.assertEqual(CommentNotification.send_digests(0, max_comments=2), (2, 4))
+        self.assertEqual(CommentNotification.count_all(), 0)
+        digests = {row.recipient: row for row in EmailOutbox.query.all()}
+        self.assertEqual(set(digests), {self.user1.email, self.user2.email})
+        body = digests[self.user1.email].body
+        self.assertIn('[test title] 새 댓글 3개', body)
+        self.assertIn(f'{self.user2.username}: comment 0', body)
+        self.assertNotIn('comment 2', body)
+        self.assertIn('외 1개', body)
+        self.assertIn('reply', digests[self.user2.email].body)
+
+    '''
+    7. 여러 worker 의 scheduler 가 동시에 digest 전송
+        먼저 시작한 쪽이 outbox 저장 ~ 이벤트 삭제 commit 전에 다른 쪽이 실행 = commit 뒤에 조회 => digest 중복 X
+    '''
+    def test_7_concurrent_digests(self):
+        CommentNotification, EmailOutbox = get_model('comment_notification'), get_model('email_outbox')
+        self.logout()
+        self.login(2)
+        self.test_client.post('/comment-create/1', data=dict(content='comment'))
+        self.assertEqual(CommentNotification.count_all(), 1)
+
+        result = {}
+        def send_in_other_worker():
+            with self.app.app_context():
+                result['other'] = CommentNotification.send_digests(0)
+                db.session.remove()
+        other = Thread(target=send_in_other_worker)
+        def before_execute(conn, cursor, statement, *args):
+            if statement.startswith('DELETE FROM comment_notification') and other.ident is None:
+                other.start()
+                time.sleep(0.5)
+        event.listen(db.engine, 'before_cursor_execute', before_execute)
+        try:
+            self.assertEqual(CommentNotification.send_digests(0), (1, 1))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_execute)
+        other.join(10)
+        self.assertEqual(result['other'], (0, 0))
+        self.assertEqual(EmailOutbox.count_all(), 1)
@@ -0,0 +1,90 @@
+import os
+import sys
+# 현재 스크립트의 부모 디렉터리를 상위로 추가
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import unittest
+from tempfile import TemporaryDirectory
+from threading import Thread, Event
+from sqlalchemy import create_engine, text
+
+from blog.api.utils.sqlite import SqliteProfile
+
+class SqliteProfileTest(unittest.TestCase):
+    name = 'SQLITE'
+
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.uri = 'sqlite:///{}'.format(os.path.join(self.dir.name, 'profile.db'))
+        self.config = {
+            'SQLALCHEMY_DATABASE_URI': self.uri,
+            'SQLITE_PROFILE_ENABLED': True,
+            'SQLITE_PRAGMAS': {'busy_timeout': 5000, 'journal_mode': 'WAL', 'synchronous': 'NORMAL'},
+            'SQLITE_POOL_SIZE': 3,
+            'SQLITE_WRITE_LANE': True,
+        }
+        SqliteProfile.set_engine_options(self.config)
+        self.engine = create_engine(self.uri, **self.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        SqliteProfile.apply(self.engine, self.config)
+        with self.engine.begin() as conn:
+            conn.execute(text('CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)'))
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.dir.cleanup()
+
+    '''
+    1. 파일 DB 에만 적용 + 연결마다 pragma 확인
+    '''
+    def test_1_pragmas(self):
+        self.assertFalse(SqliteProfile.enabled(dict(self.config, SQLALCHEMY_DATABASE_URI='sqlite://')))
+        self.assertFalse(SqliteProfile.enabled(dict(self.config, SQLALCHEMY_DATABASE_URI='sqlite:///:memory:')))
+        self.assertEqual(self.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size'], 3)
+
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(text('PRAGMA journal_mode')).scalar(), 'wal')
+            self.assertEqual(conn.execute(text('PRAGMA synchronous')).scalar(), 1)         # NORMAL
+            self.assertEqual(conn.execute(text('PRAGMA busy_timeout')).scalar(), 5000)
+
+    '''
+    2. write lane 확인
+        쓰기 트랜잭션이 열려 있으면 다른 스레드의 쓰기는 commit 까지 대기 (실패 X)
+        읽기는 대기하지 않음 (WAL)
+    '''
+    def test_2_write_lane(self):
+        written, release = Event(), Event()
+        order = []
+
+        def first_writer():
+            with self.engine.begin() as conn:
+                conn.execute(text("INSERT INTO item (name) VALUES ('first')"))
+                written.set()
+                release.wait(5)
+                order.append('first commit')
+
+        def second_writer():
+            with self.engine.begin() as conn:
+                conn.execute(text("INSERT INTO item (name) VALUES ('second')"))
+                order.append('second write')
+
+        first = Thread(target=first_writer)
+        first.start()
+        written.wait(5)
+        second = Thread(target=second_writer)
+        second.start()
+        time.sleep(0.2)
+        self.assertEqual(order, [])
+        self.assertTrue(self.engine.write_lane.locked())
+
+        # 쓰기 중에도 읽기 가능
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(text('SELECT count(*) FROM item')).scalar(), 0)
+
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(order, ['first commit', 'second write'])
+        self.assertFalse(self.engine.write_lane.locked())
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(text('SELECT count(*) FROM item')).scalar(), 2)
@@ -0,0 +1,309 @@
+import os
+import sys
+import time
+from threading import Thread, Lock
+# 현재 스크립트의 부모 디렉터리를 상위로 추가
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, update, delete
+from flask_login import login_user, current_user
+from werkzeug.exceptions import Unauthorized
+
+from blog.api.models import get_model
+from blog.api.models import db
+from blog.api.models.base import ObjectCache
+from blog.api.utils.cache import PageCache
+from tests.test_0_base import TestBase
+
+class PageCacheTest(TestBase):
+    name = 'PAGE_CACHE'
+
+    # 매 시작 전 카테고리 + 게시글 추가, 비로그인 + 페이지 캐시 사용
+    def setUp(self):
+        super().setUp()
+        self.signup(create_permission=True)
+        get_model('category')(name='category 1').add_instance()
+        self.post = get_model('post')(
+            title='test title',
+            content='test content',
+            category_id=1,
+            author_id=1,
+        )
+        self.post.add_instance()
+        self.logout()
+        self.app.config['PAGE_CACHE_ENABLED'] = True
+        PageCache.clear()
+        self.calls = 0
+
+    def tearDown(self):
+        self.app.config['PAGE_CACHE_ENABLED'] = False
+        PageCache.clear()
+        super().tearDown()
+
+    def render(self):
+        # 렌더링 횟수 확인용 view = post 1 인스턴스 태그
+        self.calls += 1
+        PageCache.add_tags(self.post.get_cache_tag())
+        return f'render {self.calls}'
+
+    def request(self, view, path='/page-cache-test'):
+        with self.app.test_request_context(path):
+            return view().get_data(as_text=True)
+
+    '''
+    1. 캐시 히트
+        같은 url 두 번째 요청 = 렌더링 X, 쿼리 1번(태그 버전 조회)
+        쿼리스트링이 다르면 다른 캐시
+    '''
+    def test_1_hit(self):
+        view = PageCache.cached()(self.render)
+        self.assertEqual(self.request(view), 'render 1')
+
+        with self.assert_max_queries(1):
+            self.assertEqual(self.request(view), 'render 1')
+        self.assertEqual(self.calls, 1)
+
+        self.assertEqual(self.request(view, '/page-cache-test?page=2'), 'render 2')
+
+    '''
+    2. 태그 무효화
+        렌더링 중 불러온 인스턴스가 수정되면 다시 렌더링
+        테이블 태그 = 해당 테이블에 행이 추가되면 다시 렌더링
+    '''
+    def test_2_invalidation(self):
+        view = PageCache.cached()(self.render)
+        self.request(view)
+        self.post.update_instance(title='updated title')
+        self.assertEqual(self.request(view), 'render 2')
+        self.assertEqual(self.request(view), 'render 2')
+
+        table_view = PageCache.cached('post')(self.render)
+        path = '/page-cache-test?table=post'
+        self.assertEqual(self.request(table_view, path), 'render 3')
+        get_model('post')(title='new title', content='new content', category_id=1, author_id=1).add_instance()
+        self.assertEqual(self.request(table_view, path), 'render 4')
+
+    '''
+    3. single-flight
+        같은 url 동시 요청 = 한 요청만 렌더링, 나머지는 기다렸다가 캐시 사용
+        캐시되지 않는 응답(200 X)이어도 같은 url 렌더링은 동시에 1개만 (먼저 끝난 요청이 lock 을 지우면 X)
+    '''
+    def run_concurrently(self, view, count=6):
+        threads = [Thread(target=self.request, args=(view,)) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join(10)
+
+    def test_3_single_flight(self):
+        def slow_render():
+            time.sleep(0.1)
+            return self.render()
+        self.run_concurrently(PageCache.cached()(slow_render))
+        self.assertEqual(self.calls, 1)
+
+        PageCache.clear()
+        state = {'running': 0, 'max_running': 0}
+        state_lock = Lock()
+        def slow_error():
+            with state_lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'], state['running'])
+            time.sleep(0.1)
+            with state_lock:
+                state['running'] -= 1
+            return 'busy', 503
+        self.run_concurrently(PageCache.cached()(slow_error))
+        self.assertEqual(state['max_running'], 1)
+        self.assertEqual(PageCache.key_locks, {})
+
+    '''
+    4. 페이지 캐시를 쓰는 view 의 쿼리 예산
+        태그 버전 조회(캐시 자체 쿼리) = 예산에서 제외, 요청 전체 쿼리 수(X-SQL-Count)에는 포함
+        렌더링 + 캐시 저장, 캐시 히트 모두 예산 이하 (예산 초과 = QUERY_BUDGET_RAISE_MODES 에서 에러)
+    '''
+    def test_4_query_budget(self):
+        config = self.app.config
+        backup = config.get('QUERY_BUDGET_RAISE_MODES')
+        config['QUERY_BUDGET_RAISE_MODES'] = (config['mode'],)
+        try:
+            for path in ('/home', '/user_posts/1', '/posts-list/1', '/post/1'):
+                db.session.expunge_all()                                            # 새 요청처럼 = 불러온 인스턴스 태그 저장
+                response = self.test_client.get(path)
+                self.assertEqual(response.status_code, 200, path)
+                self.assert_query_budget(response)
+                self.assertGreater(int(response.headers['X-SQL-Count']), int(response.headers['X-SQL-Budget-Count']), path)
+
+                response = self.test_client.get(path)
+                self.assert_query_budget(response)
+                self.assertEqual(response.headers['X-SQL-Budget-Count'], '0', path)
+                self.assertEqual(response.headers['X-SQL-Count'], '1', path)
+        finally:
+            config['QUERY_BUDGET_RAISE_MODES'] = backup
+
+class ObjectCacheTest(TestBase):
+    name = 'OBJECT_CACHE'
+
+    # 매 시작 전 객체 캐시 사용 + 사용자, 카테고리 추가
+    def setUp(self):
+        super().setUp()
+        self.app.config['OBJECT_CACHE_ENABLED'] = True
+        self.clear_cache()
+        self.signup()
+        self.category = get_model('category')(name='category 1').add_instance()
+        get_model('category')(name='category 2').add_instance()
+
+    def tearDown(self):
+        self.app.config['OBJECT_CACHE_ENABLED'] = False
+        self.app.config.pop('OBJECT_CACHE_TIMEOUT', None)
+        self.clear_cache()
+        super().tearDown()
+
+    def clear_cache(self):
+        ObjectCache.clear(get_model('user'))
+        ObjectCache.clear(get_model('category'))
+
+    def get_category(self, id=1):
+        # 새 요청처럼 세션을 비운 뒤 조회 = identity map X, 캐시 또는 DB
+        db.session.expunge_all()
+        return get_model('category').get_instance_by_id_with(id)
+
+    def get_in_thread(self, id=1):
+        # 다른 요청(다른 세션)에서 조회 + 캐시
+        result = {}
+        def load():
+            with self.app.app_context():
+                result['name'] = get_model('category').get_instance_by_id_with(id).name
+        thread = Thread(target=load)
+        thread.start()
+        thread.join(10)
+        return result['name']
+
+    '''
+    1. 캐시 히트
+        두 번째 조회 = 쿼리 X, 저장된 스냅샷은 detached 상태 + 조회 결과는 현재 세션에 붙은 다른 객체
+    '''
+    def test_1_hit(self):
+        with self.assert_max_queries(1):
+            self.get_category()
+        with self.assert_max_queries(0):
+            category = self.get_category()
+        self.assertEqual(category.name, 'category 1')
+
+        snapshot = ObjectCache.entries[get_model('category').get_cache_key(1)]['snapshot']
+        self.assertTrue(inspect(snapshot).detached)
+        self.assertIsNot(category, snapshot)
+        self.assertTrue(inspect(category).persistent)
+        self.assertIn(category, db.session)
+
+    '''
+    2. 수정, 삭제 시 무효화
+        update_instance, 세션에서 직접 수정 후 commit, delete_instance
+    '''
+    def test_2_invalidation(self):
+        self.get_category().update_instance(name='updated 1')
+        self.assertEqual(self.get_category().name, 'updated 1')
+
+        category = self.get_category()
+        category.name = 'updated 2'
+        db.session.commit()
+        self.assertEqual(self.get_category().name, 'updated 2')
+
+        self.get_category(2).delete_instance()
+        self.assertIsNone(self.get_category(2))
+
+    '''
+    3. commit 전 다른 요청이 읽은 값
+        flush ~ commit 사이에 다른 세션이 이전 값을 캐시해도 commit 시 다시 무효화
+        조회 도중 무효화되면 조회한 값은 캐시 X
+    '''
+    def test_3_stale_read(self):
+        category = self.get_category()
+        category.name = 'updated'
+        db.session.flush()
+        self.assertEqual(self.get_in_thread(), 'category 1')
+        db.session.commit()
+        self.assertEqual(self.get_in_thread(), 'updated')
+
+        model = get_model('category')
+        key = model.get_cache_key(1)
+        def load():
+            instance = db.session.get(model, 1)
+            ObjectCache.invalidate(instance.get_cache_tag())
+            return instance
+        ObjectCache.clear(model)
+        ObjectCache.get_or_load(model, key, load)
+        self.assertNotIn(key, ObjectCache.entries)
+
+    '''
+    4. TTL 만료
+        OBJECT_CACHE_TIMEOUT 이 지난 스냅샷 = 다시 조회
+    '''
+    def test_4_ttl(self):
+        self.app.config['OBJECT_CACHE_TIMEOUT'] = 0.1
+        self.get_category()
+        with self.assert_max_queries(0):
+            self.get_category()
+        time.sleep(0.2)
+        with self.assert_max_queries(1) as stats:
+            self.get_category()
+        self.assertEqual(stats.count, 1)
+
+    '''
+    5. session user (flask-login user_loader)
+        두 번째 조회 = user 쿼리 X, 사용자 수정 후에는 변경된 값
+        다른 worker 의 변경(DB, CacheTag 버전만 바뀜) = TTL 과 상관없이 다시 조회
+        스냅샷을 불러온 뒤 삭제된 사용자 = 권한 확인 시 로그아웃 + 401
+    '''
+    def test_5_session_user(self):
+        user = get_model('user')
+        db.session.expunge_all()
+        user.get_session_user(1)
+        db.session.expunge_all()
+        with self.assert_max_queries(1) as stats:
+            self.assertEqual(user.get_session_user(1).username, '11111')
+        self.assertIn('FROM cache_tag', stats.slowest_statement)
+
+        user.get_session_user(1).update_instance(username='changed')
+        db.session.expunge_all()
+        self.assertEqual(user.get_session_user(1).username, 'changed')
+
+        db.session.execute(update(user).where(user.id == 1).values(admin_check=True))
+        get_model('cache_tag').bump(db.session.connection(), ['user', 'user:1'])
+        db.session.commit()
+        db.session.expunge_all()
+        self.assertTrue(user.get_session_user(1).admin_check)
+
+        session_user = user.get_session_user(1)
+        db.session.execute(delete(user).where(user.id == 1))
+        db.session.commit()
+        with self.app.test_request_context('/admin'):
+            login_user(session_user)
+            with self.assertRaises(Unauthorized):
+                session_user.refresh_permission()
+            self.assertFalse(current_user.is_authenticated)
+        self.assertNotIn(user.get_cache_key(1), ObjectCache.entries)
+
+    '''
+    6. 페이지 캐시 렌더링
+        다른 worker 의 변경(DB, CacheTag 버전만 바뀌고 이 worker 의 스냅샷은 그대로)
+        일반 조회 = TTL 안에서는 스냅샷, 페이지 캐시 렌더링 = DB 최신 값으로 렌더링 후 캐시
+    '''
+    def test_6_page_cache_render(self):
+        self.get_category()
+        model = get_model('category')
+        db.session.execute(update(model).where(model.id == 1).values(name='other worker'))
+        get_model('cache_tag').bump(db.session.connection(), ['category', 'category:1'])
+        db.session.commit()
+        self.assertEqual(self.get_category().name, 'category 1')
+
+        self.app.config['PAGE_CACHE_ENABLED'] = True
+        try:
+            view = PageCache.cached()(lambda: self.get_category().name)
+            for _ in range(2):
+                with self.app.test_request_context('/object-cache-test'):
+                    self.assertEqual(view().get_data(as_text=True), 'other worker')
+        finally:
+            self.app.config['PAGE_CACHE_ENABLED'] = False
+            PageCache.clear()
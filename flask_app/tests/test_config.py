@@ -10,6 +10,8 @@ class TestConfig():
     SQLALCHEMY_DATABASE_URI = 'sqlite:///{}'.format(os.path.join(BASE_DIR, BASE_DB_NAME))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     WTF_CSRF_ENABLED = False
+    SQL_STATS_MODES = ('TEST',)                             # X-SQL-* 헤더로 쿼리 예산 확인
+    STRICT_LOADING_MODES = ('TEST',)                        # 템플릿 렌더링 중 lazy load = 테스트 실패
 
     SECRET_KEYS = {
         'TEST_SECRET_KEY': 'test',
@@ -24,6 +26,7 @@ class TestConfig():
     MAIL_PASSWORD = MAIL_PASSWORD
     MAIL_PORT = 587
     MAIL_LIMIT_TIME = 180
+    MAIL_SENDER_ENABLED = False                             # 테스트에서 직접 전송 (로컬 SMTP 서버)
 
     '''
     AWS 관련 config
@@ -35,7 +38,10 @@ class TestConfig():
         'TEST': 'TEST/'
     }
     S3_BUCKET_REGION = 'ap-northeast-2'
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
     S3 = client('s3', region_name = S3_BUCKET_REGION,
+                endpoint_url=S3_ENDPOINT_URL,
                 aws_access_key_id=AWS_ACCESS_KEY,
                 aws_secret_access_key=AWS_SECRET_KEY)
-    S3_URL_EXPIRATION_SECONDS = 300
\ No newline at end of file
+    S3_URL_EXPIRATION_SECONDS = 300
+    STORAGE_DRAIN_AFTER_COMMIT = False                      # 테스트에서 직접 drain
\ No newline at end of file
@@ -15,5 +15,13 @@ echo "Flask application container ID: $FLASK_CONTAINER_ID"
 docker exec $FLASK_CONTAINER_ID flask db migrate
 docker exec $FLASK_CONTAINER_ID flask db upgrade
 
-# echo "update all model instances"
-# docker exec $FLASK_CONTAINER_ID flask update_all_model_instances
+# migration 으로 추가된 통계 컬럼(category posts_count, latest_post_* 등) = 기존 행은 NULL
+# => NULL 채우기 + 실제 post, comment 기준으로 카운터, 최신 post 다시 계산 (이후 증감이 틀리지 않도록)
+echo "update all model instances"
+docker exec $FLASK_CONTAINER_ID flask update_all_model_instances
+
+# 검색 인덱스(search_index, FTS5 가상 테이블) = 모델이 아니라 migration 대상에서 제외됨 (models/__init__.py include_name)
+# => 기존 DB 에 인덱스가 없거나 비어있으면 post, comment 로 다시 채움
+echo "rebuild search index"
+docker exec $FLASK_CONTAINER_ID flask rebuild_search_index
+